@@ -42,7 +42,7 @@ export function RecentActivity() {
                   </div>
                   <div className="flex-1 min-w-0">
                     <p className="text-sm font-medium text-gray-900">{activity.message}</p>
-                    <p className="text-sm text-gray-600">Customer: {activity.customer}</p>
+                    <p className="text-sm text-gray-600">Task: {activity.task}</p>
                     <div className="flex items-center mt-1 space-x-2">
                       <Clock className="h-3 w-3 text-gray-400" />
                       <span className="text-xs text-gray-500">{activity.time}</span>
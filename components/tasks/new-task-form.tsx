@@ -10,7 +10,7 @@ import { Textarea } from '@/components/ui/core/textarea'
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/core/select'
 import { Tabs, TabsList, TabsTrigger } from "@/components/ui/layout/tabs";
 import { AlertTriangle, CheckCircle } from 'lucide-react'
-import { createTask, createCustomer } from '@/lib/api-client'
+import { createTask, createCustomer, resolveCustomers } from '@/lib/api-client'
 import { useAuth } from '@/lib/auth-context'
 import { Checkbox } from '@/components/ui/core/checkbox'
 import { AlertDialog, AlertDialogAction, AlertDialogContent, AlertDialogDescription, AlertDialogFooter, AlertDialogHeader, AlertDialogTitle } from "@/components/ui/feedback/alert-dialog";
@@ -127,6 +127,35 @@ export function NewTaskForm({}: NewTaskFormProps) {
     }
   }, [locations])
 
+  // Offer the existing customer as soon as a typed number matches one, in any format.
+  useEffect(() => {
+    if (formData.customer_id) return
+    const phoneNumbers = formData.customer_phone_numbers
+      .map((phone) => phone.phone_number)
+      .filter((number) => number.replace(/\D/g, '').length >= 9)
+    if (phoneNumbers.length === 0) return
+
+    const timeout = setTimeout(async () => {
+      try {
+        const response = await resolveCustomers(phoneNumbers)
+        const existing = response.data.customers[0]
+        if (existing) {
+          setFormData(prev => ({
+            ...prev,
+            customer_id: existing.id,
+            customer_name: existing.name,
+            customer_phone_numbers: existing.phone_numbers,
+            customer_type: existing.customer_type,
+          }))
+          toast({ title: 'Existing customer found', description: `${existing.name} already has this phone number.` })
+        }
+      } catch (error) {
+        console.error('Failed to resolve customer:', error)
+      }
+    }, 300)
+    return () => clearTimeout(timeout)
+  }, [formData.customer_id, formData.customer_phone_numbers])
+
   useEffect(() => {
     if (user?.role === 'Manager') {
         setFormData(prev => ({...prev, negotiated_by: user.id.toString()}))
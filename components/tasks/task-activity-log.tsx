@@ -3,8 +3,10 @@
 import { useState, useEffect } from "react"
 import { getMediaUrl } from "@/lib/config";
 import { apiClient } from "@/lib/api-client"
+import { useServerEvents } from "@/lib/websocket-context"
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/layout/card"
 import { Badge } from "@/components/ui/core/badge"
+import { Button } from "@/components/ui/core/button"
 import { ScrollArea } from "@/components/ui/layout/scroll-area"
 import { Avatar, AvatarFallback, AvatarImage } from "@/components/ui/avatar"
 import { format } from "date-fns"
@@ -36,6 +38,8 @@ export function TaskActivityLog({ taskId }: TaskActivityLogProps) {
   const [activities, setActivities] = useState<any[]>([])
   const [loading, setLoading] = useState(true)
   const [expanded, setExpanded] = useState<Record<string, boolean>>({})
+  const [olderUrl, setOlderUrl] = useState<string | null>(null)
+  const [loadingOlder, setLoadingOlder] = useState(false)
 
   useEffect(() => {
     const fetchActivities = async () => {
@@ -43,7 +47,8 @@ export function TaskActivityLog({ taskId }: TaskActivityLogProps) {
       try {
         const response = await apiClient.get(`/tasks/${taskId}/activities/`)
         if (response.data) {
-          setActivities(response.data)
+          setActivities(response.data.results)
+          setOlderUrl(response.data.next)
         }
       } catch (error) {
         console.error("Failed to fetch activities:", error)
@@ -57,6 +62,39 @@ export function TaskActivityLog({ taskId }: TaskActivityLogProps) {
     }
   }, [taskId])
 
+  // Fetch only the activities newer than the latest one shown.
+  useServerEvents(async (event) => {
+    if (event.type !== "activity.created" || event.task !== taskId) return
+    try {
+      const since = activities[0]?.timestamp
+      const response = await apiClient.get(`/tasks/${taskId}/activities/`, { params: since ? { since } : {} })
+      const newer = response.data.results
+      setActivities((current) => [
+        ...newer.filter((activity: any) => !current.some((shown) => shown.id === activity.id)),
+        ...current,
+      ])
+    } catch (error) {
+      console.error("Failed to fetch new activities:", error)
+    }
+  })
+
+  const loadOlder = async () => {
+    if (!olderUrl) return
+    setLoadingOlder(true)
+    try {
+      const response = await apiClient.get(olderUrl)
+      setActivities((current) => [
+        ...current,
+        ...response.data.results.filter((activity: any) => !current.some((shown) => shown.id === activity.id)),
+      ])
+      setOlderUrl(response.data.next)
+    } catch (error) {
+      console.error("Failed to fetch older activities:", error)
+    } finally {
+      setLoadingOlder(false)
+    }
+  }
+
   const toggleExpanded = (id: string) => {
     setExpanded((prev) => ({ ...prev, [id]: !prev[id] }))
   }
@@ -169,6 +207,13 @@ export function TaskActivityLog({ taskId }: TaskActivityLogProps) {
                   </div>
                 </div>
               ))}
+              {olderUrl && (
+                <div className="flex justify-center mt-4">
+                  <Button variant="outline" size="sm" onClick={loadOlder} disabled={loadingOlder}>
+                    {loadingOlder ? "Loading..." : "Load older activities"}
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </ScrollArea>
@@ -2,7 +2,7 @@
 
 import { useState, useEffect } from 'react'
 import { getMediaUrl } from "@/lib/config";
-import { apiClient } from '@/lib/api-client'
+import { apiClient, getTaskActivities } from '@/lib/api-client'
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/layout/card'
 import { Button } from '@/components/ui/core/button'
 import { Textarea } from '@/components/ui/core/textarea'
@@ -22,11 +22,7 @@ export function TaskNotes({ taskId }: TaskNotesProps) {
   const fetchNotes = async () => {
     setLoading(true)
     try {
-      const response = await apiClient.get(`/tasks/${taskId}/activities/`)
-      if (response.data) {
-        const filteredNotes = response.data.filter((activity: any) => activity.type === 'note')
-        setNotes(filteredNotes)
-      }
+      setNotes(await getTaskActivities(taskId, { type: 'note' }))
     } catch (error) {
       console.error('Error fetching notes:', error)
     }
@@ -92,6 +92,43 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "A_express.wsgi.application"
+ASGI_APPLICATION = "A_express.asgi.application"
+
+# Shared services. Caches are invalidated by bumping version keys
+# (common/lookups.py, reports/occupancy.py, customers/summary.py) and events
+# are pushed through the channel layer (common/events.py); both only reach
+# other processes through Redis. Set REDIS_URL wherever more than one
+# worker runs; the in-memory fallbacks are for development and tests.
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        },
+    }
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [REDIS_URL]},
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+        },
+    }
+
+# Seconds each process keeps lookup tables in memory before re-reading the
+# shared cache (common/lookups.py).
+LOOKUP_LOCAL_CACHE_TTL = 30
 
 
 # Database
@@ -159,6 +196,9 @@ LANGUAGE_CODE = "en-us"
 
 TIME_ZONE = "UTC"
 
+# Timezone used to display local times in reports (the shop runs on UTC+3)
+REPORT_TIME_ZONE = "Africa/Dar_es_Salaam"
+
 USE_I18N = True
 
 USE_TZ = True
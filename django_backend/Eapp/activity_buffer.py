@@ -0,0 +1,29 @@
+from django.db import transaction
+from common.events import broadcast_activities
+from .models import TaskActivity
+
+
+class ActivityBuffer:
+    """
+    Collects the TaskActivity rows of one request and writes them with a
+    single ``bulk_create`` when the surrounding transaction commits (at
+    once when there is none). Activities never outlive a rolled-back
+    change to their task.
+    """
+
+    def __init__(self):
+        self.pending = []
+
+    def add(self, task, user, type, message):
+        self.pending.append(TaskActivity(task=task, user=user, type=type, message=message))
+        # Registered after the append: outside a transaction on_commit()
+        # runs the flush straight away.
+        if len(self.pending) == 1:
+            transaction.on_commit(self.flush)
+
+    def flush(self):
+        activities, self.pending = self.pending, []
+        if activities:
+            TaskActivity.objects.bulk_create(activities)
+            # bulk_create() sends no post_save.
+            broadcast_activities(activities)
@@ -0,0 +1,130 @@
+from django.db import transaction
+from django.utils import timezone
+from common.events import ASSIGNEE_FIELDS, broadcast_activities, broadcast_task
+from customers.counters import refresh_customer_counters
+from customers.summary import invalidate_customer_summaries
+from reports.occupancy import invalidate_occupancy_cache
+from .models import Task, TaskActivity
+from .status_transitions import STATUS_ACTIVITIES, can_transition
+
+
+class BulkOperationError(Exception):
+    """Raised with per-task reasons when any task cannot take the operation."""
+
+    def __init__(self, message, errors):
+        super().__init__(message)
+        self.message = message
+        self.errors = errors
+
+
+def _assign(task, user, now, assigned_to=None):
+    new_status = Task.Status.IN_PROGRESS if assigned_to else Task.Status.PENDING
+    if new_status != task.status and not can_transition(user, task, new_status):
+        return f"As a {user.role}, you cannot change status from '{task.status}' to '{new_status}'.", None
+
+    message = None
+    if assigned_to and task.assigned_to_id != assigned_to.id:
+        old_technician_name = task.assigned_to.get_full_name() if task.assigned_to else "unassigned"
+        message = f"Task reassigned from {old_technician_name} to {assigned_to.get_full_name()} by {user.get_full_name()}."
+    elif not assigned_to and task.assigned_to:
+        message = f"Task unassigned from {task.assigned_to.get_full_name()} by {user.get_full_name()}."
+
+    task.assigned_to = assigned_to
+    task.status = new_status
+    if message is None:
+        return None, None
+    return None, TaskActivity(task=task, user=user, type=TaskActivity.ActivityType.ASSIGNMENT, message=message)
+
+
+def _transition(task, user, now, status=None):
+    if not can_transition(user, task, status):
+        return f"As a {user.role}, you cannot change status from '{task.status}' to '{status}'.", None
+
+    task.status = status
+    if status == Task.Status.PICKED_UP:
+        task.sent_out_by = user
+        task.date_out = now
+    activity = None
+    if status in STATUS_ACTIVITIES:
+        activity_type, message = STATUS_ACTIVITIES[status]
+        activity = TaskActivity(task=task, user=user, type=activity_type, message=message)
+    return None, activity
+
+
+def _send_to_workshop(task, user, now, workshop_location=None, workshop_technician=None):
+    if task.workshop_status == Task.WorkshopStatus.IN_WORKSHOP:
+        return "Task is already in the workshop.", None
+
+    task.original_location = task.current_location
+    task.workshop_status = Task.WorkshopStatus.IN_WORKSHOP
+    task.original_technician = user
+    task.workshop_sent_at = now
+    task.current_location = workshop_location.name
+    task.workshop_location = workshop_location
+    task.workshop_technician = workshop_technician
+    message = f"Task sent to workshop technician {workshop_technician.get_full_name()} at {workshop_location.name}."
+    return None, TaskActivity(task=task, user=user, type=TaskActivity.ActivityType.WORKSHOP, message=message)
+
+
+# operation -> (apply function, fields it changes)
+BULK_OPERATIONS = {
+    'assign': (_assign, ['assigned_to', 'status']),
+    'transition': (_transition, ['status', 'sent_out_by', 'date_out']),
+    'send_to_workshop': (_send_to_workshop, [
+        'original_location', 'workshop_status', 'original_technician', 'workshop_sent_at',
+        'current_location', 'workshop_location', 'workshop_technician',
+    ]),
+}
+
+
+def apply_bulk_operation(user, task_ids, operation, **params):
+    """
+    Apply ``operation`` to every task in ``task_ids`` (task titles), or to
+    none of them: every task is checked first, and a ``BulkOperationError``
+    lists the ones that are missing or cannot take the operation. Tasks are
+    saved with one ``bulk_update`` and their activities with one
+    ``bulk_create``. Returns the updated tasks.
+    """
+    apply, fields = BULK_OPERATIONS[operation]
+    with transaction.atomic():
+        tasks = list(
+            Task.objects.select_for_update(of=('self',))
+            .select_related('assigned_to')
+            .filter(title__in=task_ids)
+            .order_by('pk')
+        )
+        found = {task.title for task in tasks}
+        missing = [task_id for task_id in task_ids if task_id not in found]
+        if missing:
+            raise BulkOperationError("Some tasks were not found.", {task_id: "Not found." for task_id in missing})
+
+        # Technicians a task is taken from are told too (see task_groups).
+        previous = {task.pk: {field: getattr(task, field) for field in ASSIGNEE_FIELDS} for task in tasks}
+        now = timezone.now()
+        errors, activities = {}, []
+        for task in tasks:
+            error, activity = apply(task, user, now, **params)
+            if error:
+                errors[task.title] = error
+            elif activity:
+                activities.append(activity)
+        if errors:
+            raise BulkOperationError("Some tasks cannot take this operation.", errors)
+
+        # bulk_update() skips auto_now, so updated_at is set by hand.
+        for task in tasks:
+            task.updated_at = now
+        Task.objects.bulk_update(tasks, fields + ['updated_at'])
+        if 'status' in fields:
+            refresh_customer_counters({task.customer_id for task in tasks})
+        TaskActivity.objects.bulk_create(activities)
+        # bulk_update() and bulk_create() send no post_save, which is what
+        # normally clears this cache, keeps customer counters and pushes the
+        # changes to clients.
+        transaction.on_commit(invalidate_occupancy_cache)
+        customer_ids = {task.customer_id for task in tasks}
+        transaction.on_commit(lambda: invalidate_customer_summaries(customer_ids))
+        for task in tasks:
+            broadcast_task(task, 'updated', previous=previous[task.pk])
+        broadcast_activities(activities)
+    return tasks
@@ -4,9 +4,15 @@ from financials.models import Payment
 from django.utils import timezone
 
 class TaskFilter(django_filters.FilterSet):
+    # Each filter here is backed by an index on Task (see Task.Meta.indexes).
     created_at = django_filters.DateFromToRangeFilter()
     updated_at = django_filters.DateFromToRangeFilter()
+    date_in = django_filters.DateFromToRangeFilter()
     status = django_filters.CharFilter(method='filter_status')
+    payment_status = django_filters.CharFilter(method='filter_any_of')
+    urgency = django_filters.CharFilter(method='filter_any_of')
+    current_location = django_filters.CharFilter(method='filter_any_of')
+    workshop_status = django_filters.CharFilter(method='filter_any_of')
 
     class Meta:
         model = Task
@@ -21,6 +27,9 @@ class TaskFilter(django_filters.FilterSet):
         statuses = value.split(',')
         return queryset.filter(status__in=statuses)
 
+    def filter_any_of(self, queryset, name, value):
+        return queryset.filter(**{f'{name}__in': value.split(',')})
+
 
 class PaymentFilter(django_filters.FilterSet):
     task__title = django_filters.CharFilter(lookup_expr='icontains')
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Eapp', '0007_alter_taskactivity_type'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskactivity',
+            name='type',
+            field=models.CharField(choices=[('status_update', 'Status Update'), ('note', 'Note'), ('diagnosis', 'Diagnosis'), ('customer_contact', 'Customer Contact'), ('intake', 'Intake'), ('workshop', 'Workshop'), ('rejected', 'Rejected'), ('ready', 'Ready'), ('returned', 'Returned'), ('picked_up', 'Picked Up'), ('device_note', 'Device Note'), ('assignment', 'Assignment')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='TaskSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('prefix', models.CharField(max_length=10)),
+                ('last_value', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('year', 'month'), name='unique_task_sequence_month')],
+            },
+        ),
+    ]
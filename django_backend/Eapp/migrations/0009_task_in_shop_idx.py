@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Eapp', '0008_tasksequence'),
+        ('common', '0001_initial'),
+        ('customers', '0004_customer_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status__in', ['Picked Up', 'Terminated']), _negated=True), fields=['current_location', 'workshop_location', 'status', 'urgency'], name='task_in_shop_idx'),
+        ),
+    ]
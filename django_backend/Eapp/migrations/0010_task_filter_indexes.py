@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Eapp', '0009_task_in_shop_idx'),
+        ('common', '0002_search_indexes'),
+        ('customers', '0004_customer_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['assigned_to', 'status'], name='task_assignee_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 'Picked Up'), models.Q(('payment_status', 'Fully Paid'), _negated=True)), fields=['-created_at'], name='task_unpaid_pickup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['date_in'], name='task_date_in_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_debt', True)), fields=['customer'], name='task_customer_debt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['urgency', '-created_at'], name='task_urgency_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['current_location', '-created_at'], name='task_location_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('workshop_status__isnull', False)), fields=['workshop_status', '-created_at'], name='task_workshop_status_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Eapp', '0010_task_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='taskactivity',
+            index=models.Index(fields=['task', '-timestamp', '-id'], name='task_activity_timeline_idx'),
+        ),
+    ]
@@ -131,12 +131,47 @@ class Task(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Devices still in the shop, for the occupancy report.
+            models.Index(
+                fields=['current_location', 'workshop_location', 'status', 'urgency'],
+                name='task_in_shop_idx',
+                condition=~models.Q(status__in=['Picked Up', 'Terminated']),
+            ),
+            # Technician workload: assigned_to + status.
+            models.Index(fields=['assigned_to', 'status'], name='task_assignee_status_idx'),
+            # The debts list: picked up but not fully paid, newest first.
+            models.Index(
+                fields=['-created_at'],
+                name='task_unpaid_pickup_idx',
+                condition=models.Q(status='Picked Up') & ~models.Q(payment_status='Fully Paid'),
+            ),
+            # Outstanding payments and date_in range filters.
+            models.Index(fields=['date_in'], name='task_date_in_idx'),
+            # Customers with debt (customer stats, has_debt).
+            models.Index(fields=['customer'], name='task_customer_debt_idx', condition=models.Q(is_debt=True)),
+            # TaskFilter filters, with the list's ordering after the filtered column.
+            models.Index(fields=['urgency', '-created_at'], name='task_urgency_idx'),
+            models.Index(fields=['current_location', '-created_at'], name='task_location_idx'),
+            models.Index(
+                fields=['workshop_status', '-created_at'],
+                name='task_workshop_status_idx',
+                condition=models.Q(workshop_status__isnull=False),
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if self.pk:
             pass
         super().save(*args, **kwargs)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so signals can apply deltas to the customer counters.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def _calculate_total_cost(self):
         estimated_cost = self.estimated_cost or Decimal('0.00')
         additive_costs = sum(item.amount for item in self.cost_breakdowns.filter(cost_type='Additive'))
@@ -181,3 +216,23 @@ class TaskActivity(models.Model):
     class Meta:
         ordering = ['-timestamp']
         verbose_name_plural = 'Task Activities'
+        indexes = [
+            # A task's timeline, newest first (see ActivityTimelinePagination).
+            models.Index(fields=['task', '-timestamp', '-id'], name='task_activity_timeline_idx'),
+        ]
+
+
+class TaskSequence(models.Model):
+    """Per-month counter backing the human-readable task IDs (e.g. ``A10-001``)."""
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    prefix = models.CharField(max_length=10)
+    last_value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.prefix}: {self.last_value}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'month'], name='unique_task_sequence_month'),
+        ]
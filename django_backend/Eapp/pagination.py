@@ -1,6 +1,142 @@
+from django.core.exceptions import ValidationError
+from django.db import connection
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from common.cursors import decode_cursor, encode_cursor, keyset_filter
 
-class StandardResultsSetPagination(PageNumberPagination):
+
+def estimated_count(model):
+    """The planner's row estimate for ``model``'s table, or ``None`` if there is none."""
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [connection.ops.quote_name(model._meta.db_table)])
+        row = cursor.fetchone()
+    # reltuples is -1 until the table has been vacuumed or analyzed.
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class KeysetPaginationMixin:
+    """
+    Opt-in keyset pagination for page-number paginators. Sending ``cursor``
+    (empty for the first page) switches to pages ordered by the view's
+    ``cursor_ordering``, which must end with a unique field; the response
+    then carries ``next``/``previous`` links built from opaque cursors
+    instead of page numbers, so deep pages cost the same as the first one.
+
+    Unfiltered lists report the table's estimated row count once it is
+    larger than ``estimate_count_above``, flagged by ``count_is_estimate``.
+    """
+    cursor_query_param = 'cursor'
+    # Set on paginators that always page by cursor, in their own ordering.
+    cursor_ordering = None
+    cursor_by_default = False
+    estimate_count_above = 10000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = self.cursor_ordering or getattr(view, 'cursor_ordering', None)
+        self.use_cursor = bool(ordering) and (
+            self.cursor_by_default or self.cursor_query_param in request.query_params
+        )
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = tuple(ordering)
+        self.page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param, '')
+        try:
+            values, reverse = decode_cursor(cursor) if cursor else ([], False)
+        except ValueError:
+            raise NotFound('Invalid cursor.')
+        if values and len(values) != len(self.ordering):
+            raise NotFound('Invalid cursor.')
+
+        self.count, self.count_is_estimate = self.get_count(queryset)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+        page = queryset.order_by(*ordering)
+        if values:
+            try:
+                page = page.filter(keyset_filter(ordering, values))
+            except (ValueError, ValidationError):
+                raise NotFound('Invalid cursor.')
+
+        # One extra row tells us whether there is another page in this direction.
+        rows = list(page[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, bool(values)
+        self.first_row, self.last_row = (rows[0], rows[-1]) if rows else (None, None)
+        return rows
+
+    def get_count(self, queryset):
+        """Return ``(count, is_estimate)``."""
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model)
+            if estimate is not None and estimate > self.estimate_count_above:
+                return estimate, True
+        return queryset.count(), False
+
+    def _cursor_link(self, row, reverse):
+        values = [getattr(row, field.lstrip('-')) for field in self.ordering]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encode_cursor(values, reverse))
+
+    def get_next_link(self):
+        if not getattr(self, 'use_cursor', False):
+            return super().get_next_link()
+        if not self.has_next or self.last_row is None:
+            return None
+        return self._cursor_link(self.last_row, reverse=False)
+
+    def get_previous_link(self):
+        if not getattr(self, 'use_cursor', False):
+            return super().get_previous_link()
+        if not self.has_previous or self.first_row is None:
+            return None
+        return self._cursor_link(self.first_row, reverse=True)
+
+    def get_paginated_response(self, data):
+        if not getattr(self, 'use_cursor', False):
+            return super().get_paginated_response(data)
+        return Response({
+            'count': self.count,
+            'count_is_estimate': self.count_is_estimate,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class StandardResultsSetPagination(KeysetPaginationMixin, PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ActivityTimelinePagination(KeysetPaginationMixin, PageNumberPagination):
+    """Task activity timelines: newest first, always by cursor."""
+    cursor_ordering = ('-timestamp', '-id')
+    cursor_by_default = True
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class CustomerTaskHistoryPagination(KeysetPaginationMixin, PageNumberPagination):
+    """A customer's tasks: newest first, always by cursor."""
+    cursor_ordering = ('-created_at', '-id')
+    cursor_by_default = True
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
@@ -1,25 +1,150 @@
 from rest_framework import serializers
+from django.core.exceptions import FieldDoesNotExist
 from django.core.validators import MinValueValidator
+from django.db.models import Prefetch
 from decimal import Decimal
 from common.serializers import BrandSerializer, LocationSerializer
 from customers.serializers import CustomerSerializer, ReferrerSerializer, CustomerListSerializer
+from common.models import Location
 from .models import Task, TaskActivity
-from users.serializers import UserSerializer, UserListSerializer
+from users.serializers import UserSerializer, UserListSerializer, UserReferenceSerializer
 from users.models import User
+from financials.models import Payment
 from financials.serializers import CostBreakdownSerializer, PaymentSerializer
 
+
+class SparseFieldsMixin:
+    """
+    Renders only the fields named in ``context['fields']`` and shapes the
+    queryset to match (see ``select_fields`` and ``shape_queryset``).
+
+    ``field_queries`` maps fields that are not plain model columns to what
+    they need loaded: ``only`` columns, ``select`` relations to join and
+    ``prefetch`` lookups (strings or ``Prefetch`` objects).
+    """
+    field_queries = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.context.get('fields')
+        if selected is not None:
+            for name in set(self.fields) - set(selected):
+                self.fields.pop(name)
+
+    @classmethod
+    def expandable_fields(cls):
+        """Fields rendered by a nested serializer."""
+        return {
+            name for name, field in cls().fields.items()
+            if isinstance(field, serializers.BaseSerializer)
+        }
+
+    @classmethod
+    def select_fields(cls, fields=None, expand=None):
+        """
+        Resolve ``?fields=`` and ``?expand=`` into the field names to render.
+        ``fields`` limits the output to the named fields. Passing ``expand``
+        (even empty) drops every nested field that is not named in it or in
+        ``fields``.
+        """
+        names = list(cls.Meta.fields)
+        if fields is not None:
+            unknown = set(fields) - set(names)
+            if unknown:
+                raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+            names = [name for name in names if name in fields]
+        if expand is not None:
+            expandable = cls.expandable_fields()
+            unknown = set(expand) - expandable
+            if unknown:
+                raise serializers.ValidationError({'expand': f"Unknown fields: {', '.join(sorted(unknown))}"})
+            requested = set(expand) | set(fields or ())
+            names = [name for name in names if name not in expandable or name in requested]
+        return names
+
+    @classmethod
+    def shape_queryset(cls, queryset, fields, extra_columns=()):
+        """
+        Join, prefetch and load only what ``fields`` need. Columns are only
+        restricted when every field is accounted for, so an undeclared
+        computed field never triggers a lazy load per row.
+        """
+        model = queryset.model
+        only, select, prefetch = set(extra_columns), set(), {}
+        restrict = True
+        for name in fields:
+            if name in cls.field_queries:
+                query = cls.field_queries[name]
+            else:
+                try:
+                    model_field = model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    restrict = False
+                    continue
+                if not model_field.concrete or model_field.many_to_many:
+                    restrict = False
+                    continue
+                query = {'only': [name]}
+            only.update(query.get('only', ()))
+            select.update(query.get('select', ()))
+            for lookup in query.get('prefetch', ()):
+                key = lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+                # A Prefetch with its own queryset wins over a plain lookup.
+                if key not in prefetch or isinstance(lookup, Prefetch):
+                    prefetch[key] = lookup
+
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch.values())
+        if restrict:
+            # Joined relations have to be loaded to be traversed.
+            queryset = queryset.only(*sorted(only | select))
+        return queryset
+
+
+# How many of the latest activities the task detail embeds; older ones come
+# from the paginated /tasks/<id>/activities/ timeline.
+TASK_DETAIL_ACTIVITY_LIMIT = 20
+
+
 class TaskActivitySerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+    user = UserReferenceSerializer(read_only=True)
 
     class Meta:
         model = TaskActivity
         fields = ("id", "user", "timestamp", "type", "message")
 
-class TaskListSerializer(serializers.ModelSerializer):
+
+def latest_activities_prefetch():
+    # Django only slices a prefetch per task when it lands in a to_attr.
+    return Prefetch(
+        'activities',
+        queryset=TaskActivity.objects.select_related('user').order_by('-timestamp', '-id')[:TASK_DETAIL_ACTIVITY_LIMIT],
+        to_attr='latest_activities',
+    )
+
+
+class LatestActivitiesSerializer(serializers.ListSerializer):
+    """Renders only the latest ``TASK_DETAIL_ACTIVITY_LIMIT`` activities."""
+
+    def get_attribute(self, instance):
+        if hasattr(instance, 'latest_activities'):
+            return instance.latest_activities
+        return instance.activities.select_related('user').order_by('-timestamp', '-id')[:TASK_DETAIL_ACTIVITY_LIMIT]
+
+
+class TaskListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     customer_details = CustomerListSerializer(source='customer', read_only=True)
     assigned_to_details = UserListSerializer(source='assigned_to', read_only=True)
     outstanding_balance = serializers.SerializerMethodField()
 
+    field_queries = {
+        'customer_details': {'select': ['customer'], 'prefetch': ['customer__phone_numbers']},
+        'assigned_to_details': {'select': ['assigned_to']},
+        'outstanding_balance': {'only': ['total_cost', 'paid_amount']},
+    }
+
     class Meta:
         model = Task
         fields = (
@@ -41,7 +166,7 @@ class TaskListSerializer(serializers.ModelSerializer):
     def get_outstanding_balance(self, obj):
         return obj.total_cost - obj.paid_amount
 
-class TaskDetailSerializer(serializers.ModelSerializer):
+class TaskDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     negotiated_by = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.filter(is_active=True), allow_null=True, required=False
     )
@@ -56,7 +181,7 @@ class TaskDetailSerializer(serializers.ModelSerializer):
     )
     referred_by_details = ReferrerSerializer(source="referred_by", read_only=True)
     customer_details = CustomerSerializer(source="customer", read_only=True)
-    activities = TaskActivitySerializer(many=True, read_only=True)
+    activities = LatestActivitiesSerializer(child=TaskActivitySerializer(), read_only=True)
     payments = PaymentSerializer(many=True, read_only=True)
     outstanding_balance = serializers.SerializerMethodField()
     workshop_location_details = LocationSerializer(
@@ -70,6 +195,25 @@ class TaskDetailSerializer(serializers.ModelSerializer):
     )
     cost_breakdowns = CostBreakdownSerializer(many=True, read_only=True)
 
+    field_queries = {
+        'assigned_to_details': {'select': ['assigned_to']},
+        'created_by_details': {'select': ['created_by']},
+        'negotiated_by_details': {'select': ['negotiated_by']},
+        'approved_by_details': {'select': ['approved_by']},
+        'sent_out_by_details': {'select': ['sent_out_by']},
+        'brand_details': {'select': ['brand']},
+        'referred_by': {'select': ['referred_by']},
+        'referred_by_details': {'select': ['referred_by']},
+        'customer_details': {'select': ['customer'], 'prefetch': ['customer__phone_numbers']},
+        'activities': {'prefetch': [latest_activities_prefetch()]},
+        'payments': {'prefetch': [Prefetch('payments', queryset=Payment.objects.select_related('method', 'category'))]},
+        'outstanding_balance': {'only': ['estimated_cost'], 'prefetch': ['payments', 'cost_breakdowns']},
+        'workshop_location_details': {'select': ['workshop_location']},
+        'workshop_technician_details': {'select': ['workshop_technician']},
+        'original_technician_details': {'select': ['original_technician']},
+        'cost_breakdowns': {'prefetch': ['cost_breakdowns']},
+    }
+
     class Meta:
         model = Task
         fields = (
@@ -98,11 +242,13 @@ class TaskDetailSerializer(serializers.ModelSerializer):
 
     def get_total_cost(self, obj):
         estimated_cost = obj.estimated_cost or Decimal("0.00")
+        # Filter in Python so the prefetched cost breakdowns are reused.
+        cost_breakdowns = obj.cost_breakdowns.all()
         additive_costs = sum(
-            item.amount for item in obj.cost_breakdowns.filter(cost_type="Additive")
+            item.amount for item in cost_breakdowns if item.cost_type == "Additive"
         )
         subtractive_costs = sum(
-            item.amount for item in obj.cost_breakdowns.filter(cost_type="Subtractive")
+            item.amount for item in cost_breakdowns if item.cost_type == "Subtractive"
         )
         return estimated_cost + additive_costs - subtractive_costs
 
@@ -151,6 +297,43 @@ class TaskDetailSerializer(serializers.ModelSerializer):
 #         read_only_fields = ["created_by", "created_at"]
 
 
+class BulkTaskOperationSerializer(serializers.Serializer):
+    OPERATION_FIELDS = {
+        'assign': ['assigned_to'],
+        'transition': ['status'],
+        'send_to_workshop': ['workshop_location', 'workshop_technician'],
+    }
+
+    task_ids = serializers.ListField(
+        child=serializers.CharField(max_length=200), allow_empty=False, max_length=200
+    )
+    operation = serializers.ChoiceField(choices=list(OPERATION_FIELDS))
+    assigned_to = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.filter(is_active=True), allow_null=True, required=False
+    )
+    status = serializers.ChoiceField(choices=Task.Status.choices, required=False)
+    workshop_location = serializers.PrimaryKeyRelatedField(queryset=Location.objects.all(), required=False)
+    workshop_technician = serializers.PrimaryKeyRelatedField(
+        queryset=User.objects.filter(is_active=True), required=False
+    )
+
+    def validate(self, data):
+        missing = [
+            field for field in self.OPERATION_FIELDS[data['operation']]
+            if field not in data or (field != 'assigned_to' and data[field] is None)
+        ]
+        if missing:
+            raise serializers.ValidationError(
+                {field: f"This field is required for '{data['operation']}'." for field in missing}
+            )
+        # Keep the order the tasks were given in, without repeats.
+        data['task_ids'] = list(dict.fromkeys(data['task_ids']))
+        return data
+
+    def operation_params(self):
+        return {field: self.validated_data[field] for field in self.OPERATION_FIELDS[self.validated_data['operation']]}
+
+
 class ReportConfigSerializer(serializers.Serializer):
     reportName = serializers.CharField(max_length=255)
     selectedType = serializers.CharField()
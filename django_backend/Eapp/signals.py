@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from financials.models import Account, PaymentMethod, Payment
 from django.db.models import F
+from common.events import ASSIGNEE_FIELDS, broadcast_activities, broadcast_task
+from .models import Task, TaskActivity
 
 
 
@@ -19,3 +21,22 @@ def update_account_balance_on_payment(sender, instance, created, **kwargs):
             account = instance.method.account
             account.balance = F('balance') + instance.amount
             account.save()
+
+
+@receiver([post_save, post_delete], sender=Task)
+def broadcast_task_change(sender, instance, **kwargs):
+    if kwargs['signal'] is post_delete:
+        action = 'deleted'
+    else:
+        action = 'created' if kwargs['created'] else 'updated'
+    loaded = getattr(instance, '_loaded_values', None)
+    broadcast_task(instance, action, previous=loaded)
+    if loaded is not None:
+        # The next save should only notify whoever it takes the task from.
+        loaded.update({field: getattr(instance, field) for field in ASSIGNEE_FIELDS if field in loaded})
+
+
+@receiver(post_save, sender=TaskActivity)
+def broadcast_activity(sender, instance, created, **kwargs):
+    if created:
+        broadcast_activities([instance])
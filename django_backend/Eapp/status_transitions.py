@@ -1,5 +1,5 @@
 
-from .models import User, Task
+from .models import User, Task, TaskActivity
 
 ALLOWED_TRANSITIONS = {
     'Front Desk': {
@@ -19,6 +19,13 @@ ALLOWED_TRANSITIONS = {
     }
 }
 
+# Activity logged when a task moves into one of these statuses.
+STATUS_ACTIVITIES = {
+    'Picked Up': (TaskActivity.ActivityType.PICKED_UP, "Task has been picked up by the customer."),
+    'Completed': (TaskActivity.ActivityType.STATUS_UPDATE, "Task marked as Completed."),
+    'Ready for Pickup': (TaskActivity.ActivityType.READY, "Task has been approved and is ready for pickup."),
+}
+
 def can_transition(user: User, task: Task, new_status: str) -> bool:
     """
     Check if a user has permission to transition a task to a new status.
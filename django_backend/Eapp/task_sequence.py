@@ -0,0 +1,50 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Task, TaskSequence
+
+
+def _seed_sequence(year, month):
+    """
+    Create the counter row for a month. Runs once per month: works out the
+    year character from the oldest task and continues any numbering already
+    present in the tasks table so existing IDs are never handed out again.
+    """
+    first_task = Task.objects.order_by('created_at').only('created_at').first()
+    first_year = first_task.created_at.year if first_task else year
+    prefix = f"{chr(ord('A') + year - first_year)}{month}"
+
+    last_value = 0
+    for title in Task.objects.filter(title__startswith=f"{prefix}-").values_list('title', flat=True):
+        try:
+            last_value = max(last_value, int(title.split('-')[-1]))
+        except ValueError:
+            continue
+
+    return TaskSequence.objects.create(year=year, month=month, prefix=prefix, last_value=last_value)
+
+
+def generate_task_id(now=None):
+    """
+    Allocate the next task ID for the current month.
+
+    The counter row is bumped with a single ``UPDATE ... SET last_value =
+    last_value + 1``, which takes the row lock on PostgreSQL and the database
+    write lock on SQLite, so concurrent intakes are serialized on one small
+    row instead of scanning the tasks table. Numbers burned by a failed
+    intake are not reused.
+    """
+    now = now or timezone.now()
+    sequence = TaskSequence.objects.filter(year=now.year, month=now.month)
+
+    with transaction.atomic():
+        if not sequence.update(last_value=F('last_value') + 1):
+            try:
+                with transaction.atomic():
+                    _seed_sequence(now.year, now.month)
+            except IntegrityError:
+                pass  # Another intake created the row first.
+            sequence.update(last_value=F('last_value') + 1)
+        prefix, value = sequence.values_list('prefix', 'last_value').get()
+
+    return f"{prefix}-{value:03d}"
@@ -1,3 +1,551 @@
-from django.test import TestCase
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from common.models import Location
+from common.testing import QueryBudgetMixin
+from customers.models import Customer, PhoneNumber
+from financials.models import CostBreakdown, Payment, PaymentMethod
+from reports.occupancy import OCCUPANCY_CACHE_VERSION_KEY
+from users.models import User
+from .activity_buffer import ActivityBuffer
+from .filters import TaskFilter
+from .models import Task, TaskActivity, TaskSequence
+from .pagination import StandardResultsSetPagination
+from .task_sequence import generate_task_id
+
+
+def run_in_threads(target, thread_count):
+    """Run ``target`` from many threads at once, each on its own DB connection."""
+    barrier = threading.Barrier(thread_count)
+    errors = []
+
+    def worker():
+        try:
+            barrier.wait()
+            target()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+class TaskSequenceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='frontdesk', password='testpassword', email='fd@gmail.com', first_name='Front', last_name='Desk', role='Front Desk')
+        self.customer = Customer.objects.create(name='Test Customer')
+
+    def test_ids_are_sequential_within_a_month(self):
+        now = timezone.make_aware(datetime(2025, 10, 5))
+        self.assertEqual(generate_task_id(now), 'A10-001')
+        self.assertEqual(generate_task_id(now), 'A10-002')
+
+    def test_sequence_continues_existing_numbering(self):
+        Task.objects.create(title='A1-007', customer=self.customer, created_by=self.user, laptop_model='X1', current_location='Front')
+        # Titles of later months share the "A1" prefix and must not be mistaken for January's.
+        Task.objects.create(title='A10-050', customer=self.customer, created_by=self.user, laptop_model='X1', current_location='Front')
+        now = timezone.now().replace(month=1, day=15)
+        self.assertEqual(generate_task_id(now), 'A1-008')
+
+    def test_allocation_does_not_scan_tasks_once_seeded(self):
+        generate_task_id()
+        with self.assertNumQueries(4):  # savepoint, UPDATE, SELECT, release
+            generate_task_id()
+
+
+class TaskSequenceConcurrencyTests(TransactionTestCase):
+    thread_count = 12
+    ids_per_thread = 10
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='frontdesk', password='testpassword', email='fd@gmail.com', first_name='Front', last_name='Desk', role='Front Desk')
+        self.customer = Customer.objects.create(name='Test Customer')
+        PhoneNumber.objects.create(customer=self.customer, phone_number='0712345678')
+
+    def test_concurrent_allocation_has_no_collisions(self):
+        allocated = []
+        lock = threading.Lock()
+
+        def allocate():
+            ids = [generate_task_id() for _ in range(self.ids_per_thread)]
+            with lock:
+                allocated.extend(ids)
+
+        errors = run_in_threads(allocate, self.thread_count)
+
+        self.assertEqual(errors, [])
+        total = self.thread_count * self.ids_per_thread
+        self.assertEqual(len(set(allocated)), total)
+        self.assertEqual(TaskSequence.objects.get().last_value, total)
+
+    def test_concurrent_intake_creates_unique_titles(self):
+        def intake():
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            for _ in range(self.ids_per_thread):
+                response = client.post(reverse('task-list'), {
+                    'customer': {'name': 'Test Customer', 'phone_numbers': [{'phone_number': '0712345678'}]},
+                    'laptop_model': 'ThinkPad X1',
+                    'current_location': 'Front Desk',
+                    'description': 'Screen replacement',
+                }, format='json')
+                assert response.status_code == status.HTTP_201_CREATED, response.data
+
+        errors = run_in_threads(intake, self.thread_count)
+
+        self.assertEqual(errors, [])
+        titles = list(Task.objects.values_list('title', flat=True))
+        self.assertEqual(len(titles), self.thread_count * self.ids_per_thread)
+        self.assertEqual(len(set(titles)), len(titles))
+
+
+class TaskCursorPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        customer = Customer.objects.create(name='Test Customer')
+        self.tasks = [
+            Task.objects.create(title=f'A1-{i:03d}', customer=customer, created_by=self.user, laptop_model='X1', current_location='Front Desk')
+            for i in range(5)
+        ]
+        # Equal timestamps for some rows, so the id tie-breaker matters.
+        stamp = timezone.make_aware(datetime(2025, 10, 1, 9, 30, 0, 123456))
+        Task.objects.filter(pk__in=[task.pk for task in self.tasks[1:4]]).update(created_at=stamp)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('task-list')
+
+    def titles(self, response):
+        return [task['title'] for task in response.data['results']]
+
+    def test_cursor_pages_walk_the_whole_list_in_order(self):
+        expected = list(Task.objects.order_by('-created_at', '-id').values_list('title', flat=True))
+        response = self.client.get(self.url, {'cursor': '', 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 5)
+        self.assertFalse(response.data['count_is_estimate'])
+        self.assertIsNone(response.data['previous'])
+
+        seen = self.titles(response)
+        pages = [response]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append(response)
+            seen += self.titles(response)
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+
+        # Walking back from the last page returns the previous page unchanged.
+        previous = self.client.get(pages[-1].data['previous'])
+        self.assertEqual(self.titles(previous), self.titles(pages[1]))
+
+    def test_cursor_pages_respect_filters(self):
+        Task.objects.filter(pk=self.tasks[0].pk).update(is_debt=True)
+        response = self.client.get(self.url, {'cursor': '', 'is_debt': 'true'})
+        self.assertEqual(self.titles(response), ['A1-000'])
+        self.assertEqual(response.data['count'], 1)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_numbers_stay_the_default(self):
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual(response.data['count'], 5)
+        self.assertNotIn('count_is_estimate', response.data)
+        self.assertIn('page=2', response.data['next'])
+
+    def test_unfiltered_count_uses_the_table_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(Task._meta.db_table)}')
+        with patch.object(StandardResultsSetPagination, 'estimate_count_above', 0):
+            response = self.client.get(self.url, {'cursor': ''})
+            self.assertEqual(response.data['count'], 5)
+            self.assertTrue(response.data['count_is_estimate'])
+
+            response = self.client.get(self.url, {'cursor': '', 'is_debt': 'false'})
+            self.assertFalse(response.data['count_is_estimate'])
+
+
+class TaskSparseFieldsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        customer = Customer.objects.create(name='Test Customer')
+        PhoneNumber.objects.create(customer=customer, phone_number='0712345678')
+        for i in range(3):
+            task = Task.objects.create(title=f'A1-{i:03d}', customer=customer, created_by=self.user, assigned_to=self.user, laptop_model='X1', current_location='Front Desk')
+            task.activities.create(user=self.user, type='intake', message='Received')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_fields_limit_the_list_output_and_its_queries(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('task-list'), {'fields': 'title,status'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'title', 'status'})
+
+    def test_default_list_does_not_prefetch_payments(self):
+        # Count, tasks with customer and technician joined, customer phone numbers.
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('task-list'))
+        self.assertEqual(response.data['results'][0]['customer_details']['phone_numbers'][0]['phone_number'], '0712345678')
+        self.assertEqual(response.data['results'][0]['outstanding_balance'], 0)
+
+    def test_expand_picks_the_nested_fields_of_the_detail(self):
+        url = reverse('task-detail', args=['A1-001'])
+        response = self.client.get(url, {'expand': 'activities'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['activities'][0]['message'], 'Received')
+        self.assertNotIn('customer_details', response.data)
+        self.assertNotIn('payments', response.data)
+        self.assertIn('laptop_model', response.data)
+
+        full = self.client.get(url)
+        self.assertIn('customer_details', full.data)
+        self.assertIn('cost_breakdowns', full.data)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('task-list'), {'fields': 'title,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.data)
+
+
+class TaskQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        self.customer = Customer.objects.create(name='Test Customer')
+        PhoneNumber.objects.create(customer=self.customer, phone_number='0712345678')
+        self.method = PaymentMethod.objects.create(name='Cash')
+        self.task = self.create_task()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_task(self):
+        return Task.objects.create(
+            title=f'A1-{Task.objects.count():03d}', customer=self.customer, created_by=self.user,
+            assigned_to=self.user, laptop_model='X1', current_location='Front Desk', estimated_cost=Decimal('100.00'),
+        )
+
+    def add_task_rows(self, task, count):
+        for _ in range(count):
+            task.activities.create(user=self.user, type='note', message='Checked')
+            Payment.objects.create(task=task, amount=Decimal('1.00'), method=self.method)
+            CostBreakdown.objects.create(task=task, description='Part', amount=Decimal('5.00'), cost_type='Additive')
+
+    def test_task_list(self):
+        def add_rows(count):
+            for _ in range(count):
+                self.add_task_rows(self.create_task(), 1)
+
+        # Count, tasks with customer and technician, customer phone numbers.
+        self.assertQueryBudget(3, add_rows, reverse('task-list'), {'page_size': 100})
+
+    def test_task_detail(self):
+        # Task with its joins, phone numbers, activities, payments, cost
+        # breakdowns and the customer's has_debt.
+        self.assertQueryBudget(
+            6, lambda count: self.add_task_rows(self.task, count), reverse('task-detail', args=[self.task.title])
+        )
+
+    def test_task_activities(self):
+        # Task, activity count, then one page of activities with their users.
+        self.assertQueryBudget(
+            3, lambda count: self.add_task_rows(self.task, count), reverse('task-activities', args=[self.task.title]), {'page_size': 100}
+        )
+
+    def test_task_payments(self):
+        # Task, then its payments with method and category.
+        self.assertQueryBudget(
+            2, lambda count: self.add_task_rows(self.task, count), reverse('task-payments', args=[self.task.title])
+        )
+
+
+class TaskIndexTests(TestCase):
+    """The planner uses the filter indexes (sequential scans disabled, as the test tables are tiny)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        technicians = [
+            User.objects.create_user(username=f'tech{i}', password='testpassword', email=f'tech{i}@gmail.com', first_name='Tech', last_name=str(i), role='Technician')
+            for i in range(10)
+        ]
+        customer = Customer.objects.create(name='Test Customer')
+        statuses = ['Pending', 'In Progress', 'Completed', 'Ready for Pickup', 'Picked Up']
+        locations = ['Front Desk', 'Workshop A', 'Workshop B', 'Shelf 1', 'Shelf 2', 'Shelf 3']
+        # Varied values, so that no single-column index is as selective as the composite ones.
+        # Picked up tasks are mostly paid, so few of them are debts.
+        Task.objects.bulk_create([
+            Task(
+                title=f'A1-{i:03d}', customer=customer, created_by=cls.user, assigned_to=technicians[i % 10],
+                status=statuses[i % 5], laptop_model='X1', current_location=locations[i % 6],
+                payment_status=cls.payment_status_for(i, statuses[i % 5]),
+            )
+            for i in range(300)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(Task._meta.db_table)}')
+
+    @staticmethod
+    def payment_status_for(i, status):
+        if status == 'Picked Up':
+            return 'Unpaid' if i % 50 == 4 else 'Fully Paid'
+        return 'Unpaid' if i % 20 == 0 else 'Partially Paid'
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+
+    def filtered(self, **params):
+        return TaskFilter(params, queryset=Task.objects.all()).qs
+
+    def test_workload_uses_assignee_status_index(self):
+        self.assertUsesIndex(
+            Task.objects.filter(assigned_to__username='tech1', status='In Progress').order_by(), 'task_assignee_status_idx'
+        )
+
+    def test_debts_use_partial_index(self):
+        self.assertUsesIndex(
+            Task.objects.filter(status='Picked Up').exclude(payment_status='Fully Paid'), 'task_unpaid_pickup_idx'
+        )
+
+    def test_customer_debt_uses_partial_index(self):
+        self.assertUsesIndex(Task.objects.filter(customer_id=1, is_debt=True).order_by(), 'task_customer_debt_idx')
+
+    def test_filters_are_index_backed(self):
+        self.assertUsesIndex(self.filtered(date_in_after='2025-01-01', date_in_before='2025-01-31').order_by(), 'task_date_in_idx')
+        self.assertUsesIndex(self.filtered(urgency='Expedited,Ina Haraka'), 'task_urgency_idx')
+        self.assertUsesIndex(self.filtered(current_location='Shelf 1'), 'task_location_idx')
+        self.assertUsesIndex(self.filtered(workshop_status='In Workshop'), 'task_workshop_status_idx')
+        # payment_status is indexed by its db_index, named after the table and column; the
+        # planner may pick that index or its varchar_pattern_ops "_like" twin.
+        payment_status_index = connection.schema_editor()._create_index_name(Task._meta.db_table, ['payment_status'])
+        self.assertUsesIndex(self.filtered(payment_status='Unpaid').order_by(), payment_status_index)
+
+    def test_filters_narrow_the_list(self):
+        Task.objects.update(payment_status='Unpaid')
+        Task.objects.filter(title='A1-001').update(urgency='Expedited', payment_status='Fully Paid')
+        self.assertEqual(list(self.filtered(urgency='Expedited').values_list('title', flat=True)), ['A1-001'])
+        self.assertEqual(list(self.filtered(payment_status='Fully Paid,Refunded').values_list('title', flat=True)), ['A1-001'])
+
+
+class TaskBulkOperationTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        self.front_desk = User.objects.create_user(username='frontdesk', password='testpassword', email='frontdesk@gmail.com', first_name='Front', last_name='Desk', role='Front Desk')
+        self.technician = User.objects.create_user(username='tech', password='testpassword', email='tech@gmail.com', first_name='Jane', last_name='Tech', role='Technician')
+        customer = Customer.objects.create(name='Test Customer')
+        self.tasks = [
+            Task.objects.create(title=f'A1-{i:03d}', customer=customer, created_by=self.manager, laptop_model='X1', current_location='Front Desk', status='Ready for Pickup')
+            for i in range(5)
+        ]
+        self.titles = [task.title for task in self.tasks]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+        self.url = reverse('task-bulk')
+
+    def test_transition_updates_every_task_in_a_fixed_number_of_queries(self):
+        cache.set(OCCUPANCY_CACHE_VERSION_KEY, 5, timeout=None)
+        # Savepoint, locking select, bulk update, customer counters, activity insert, release.
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(6):
+                response = self.client.post(self.url, {'task_ids': self.titles, 'operation': 'transition', 'status': 'Picked Up'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(set(Task.objects.values_list('status', flat=True)), {'Picked Up'})
+        self.assertEqual(Task.objects.filter(sent_out_by=self.manager, date_out__isnull=False).count(), 5)
+        self.assertEqual(TaskActivity.objects.filter(type='picked_up').count(), 5)
+        # bulk_update() sends no signals, so the occupancy cache is cleared explicitly.
+        self.assertEqual(cache.get(OCCUPANCY_CACHE_VERSION_KEY), 6)
+
+    def test_nothing_changes_when_any_task_is_rejected(self):
+        Task.objects.filter(title='A1-003').update(status='Pending')
+        self.client.force_authenticate(user=self.front_desk)
+        response = self.client.post(self.url, {'task_ids': self.titles, 'operation': 'transition', 'status': 'Picked Up'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(response.data['tasks']), ['A1-003'])
+        self.assertFalse(Task.objects.filter(status='Picked Up').exists())
+        self.assertFalse(TaskActivity.objects.exists())
+
+    def test_unknown_tasks_are_reported(self):
+        response = self.client.post(self.url, {'task_ids': ['A1-000', 'Z9-999'], 'operation': 'transition', 'status': 'Picked Up'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['tasks'], {'Z9-999': 'Not found.'})
+
+    def test_assign(self):
+        response = self.client.post(self.url, {'task_ids': self.titles[:2], 'operation': 'assign', 'assigned_to': self.technician.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(Task.objects.filter(assigned_to=self.technician, status='In Progress').count(), 2)
+        self.assertEqual(
+            TaskActivity.objects.filter(type='assignment').first().message,
+            'Task reassigned from unassigned to Jane Tech by Test Manager.',
+        )
+
+    def test_send_to_workshop(self):
+        workshop = Location.objects.create(name='Workshop A', is_workshop=True)
+        response = self.client.post(self.url, {
+            'task_ids': self.titles[:2], 'operation': 'send_to_workshop',
+            'workshop_location': workshop.id, 'workshop_technician': self.technician.id,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        task = Task.objects.get(title='A1-000')
+        self.assertEqual((task.current_location, task.original_location, task.workshop_status), ('Workshop A', 'Front Desk', 'In Workshop'))
+        self.assertEqual(task.workshop_technician, self.technician)
+
+    def test_operation_parameters_are_required(self):
+        response = self.client.post(self.url, {'task_ids': self.titles, 'operation': 'send_to_workshop'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('workshop_location', response.data)
+
+
+class TaskActivityBufferTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        self.technician = User.objects.create_user(username='tech', password='testpassword', email='tech@gmail.com', first_name='Jane', last_name='Tech', role='Technician')
+        self.workshop = Location.objects.create(name='Workshop A', is_workshop=True)
+        self.customer = Customer.objects.create(name='Test Customer')
+        PhoneNumber.objects.create(customer=self.customer, phone_number='0712345678')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+
+    def activity_inserts(self, queries):
+        table = TaskActivity._meta.db_table
+        return [query['sql'] for query in queries.captured_queries if query['sql'].startswith(f'INSERT INTO "{table}"')]
+
+    def test_create_writes_activities_in_one_insert(self):
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('task-list'), {
+                'customer': {'name': 'Test Customer', 'phone_numbers': [{'phone_number': '0712345678'}]}, 'laptop_model': 'X1', 'current_location': 'Front Desk',
+                'assigned_to': self.technician.id, 'device_notes': 'No charger',
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(len(self.activity_inserts(queries)), 1)
+        self.assertEqual(
+            sorted(TaskActivity.objects.values_list('type', flat=True)),
+            ['assignment', 'device_note', 'intake'],
+        )
+
+    def test_update_names_come_from_loaded_objects(self):
+        task = Task.objects.create(title='A1-001', customer=self.customer, created_by=self.manager, laptop_model='X1', current_location='Front Desk')
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('task-detail', args=[task.title]), {
+                'assigned_to': self.technician.id, 'workshop_location': self.workshop.id, 'workshop_technician': self.technician.id,
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(len(self.activity_inserts(queries)), 1)
+        self.assertEqual(response.data['current_location'], 'Workshop A')
+        self.assertEqual(sorted(TaskActivity.objects.values_list('message', flat=True)), [
+            'Task reassigned from unassigned to Jane Tech by Test Manager.',
+            'Task sent to workshop technician Jane Tech at Workshop A.',
+        ])
+
+    def test_send_to_workshop_needs_location_and_technician(self):
+        task = Task.objects.create(title='A1-001', customer=self.customer, created_by=self.manager, laptop_model='X1', current_location='Front Desk')
+        response = self.client.patch(reverse('task-detail', args=[task.title]), {
+            'workshop_location': None, 'workshop_technician': self.technician.id,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('workshop_location', response.data)
+        task.refresh_from_db()
+        self.assertEqual((task.current_location, task.workshop_status), ('Front Desk', None))
+
+    def test_rejected_update_writes_no_activities(self):
+        front_desk = User.objects.create_user(username='frontdesk', password='testpassword', email='frontdesk@gmail.com', first_name='Front', last_name='Desk', role='Front Desk')
+        task = Task.objects.create(title='A1-001', customer=self.customer, created_by=self.manager, laptop_model='X1', current_location='Front Desk')
+        self.client.force_authenticate(user=front_desk)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('task-detail', args=[task.title]), {'status': 'Picked Up'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(TaskActivity.objects.exists())
+
+
+class ActivityBufferAutocommitTests(TransactionTestCase):
+    def test_activities_added_outside_a_transaction_are_written_at_once(self):
+        manager = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        task = Task.objects.create(title='A1-001', customer=Customer.objects.create(name='Test Customer'), created_by=manager, laptop_model='X1', current_location='Front Desk')
+        buffer = ActivityBuffer()
+        buffer.add(task=task, user=manager, type=TaskActivity.ActivityType.NOTE, message='First')
+        self.assertEqual(list(TaskActivity.objects.values_list('message', flat=True)), ['First'])
+        buffer.add(task=task, user=manager, type=TaskActivity.ActivityType.NOTE, message='Second')
+        self.assertEqual(sorted(TaskActivity.objects.values_list('message', flat=True)), ['First', 'Second'])
+        self.assertEqual(buffer.pending, [])
+
+
+class TaskActivityTimelineTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        self.customer = Customer.objects.create(name='Test Customer')
+        self.task = Task.objects.create(title='A1-001', customer=self.customer, created_by=self.manager, laptop_model='X1', current_location='Front Desk')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+        self.url = reverse('task-activities', args=[self.task.title])
+
+    def add_activities(self, count, start=0):
+        base = timezone.now() - timedelta(days=1)
+        for offset in range(start, start + count):
+            activity = TaskActivity.objects.create(task=self.task, user=self.manager, type='note', message=f'Note {offset}')
+            TaskActivity.objects.filter(pk=activity.pk).update(timestamp=base + timedelta(minutes=offset))
+
+    def test_timeline_pages_newest_first(self):
+        self.add_activities(25)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(response.data['results'][0]['message'], 'Note 24')
+        self.assertIsNone(response.data['previous'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([activity['message'] for activity in response.data['results']], [f'Note {n}' for n in range(4, -1, -1)])
+        self.assertIsNone(response.data['next'])
+
+    def test_since_returns_only_newer_activities(self):
+        self.add_activities(5)
+        newest = self.client.get(self.url).data['results'][0]['timestamp']
+        self.add_activities(2, start=5)
+        response = self.client.get(self.url, {'since': newest})
+        self.assertEqual([activity['message'] for activity in response.data['results']], ['Note 6', 'Note 5'])
+
+    def test_type_filter_keeps_only_those_activities(self):
+        self.add_activities(3)
+        TaskActivity.objects.create(task=self.task, user=self.manager, type='diagnosis', message='Bad screen')
+        response = self.client.get(self.url, {'type': 'note'})
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual({activity['type'] for activity in response.data['results']}, {'note'})
+        response = self.client.get(self.url, {'type': 'diagnosis,intake'})
+        self.assertEqual([activity['message'] for activity in response.data['results']], ['Bad screen'])
+
+    def test_invalid_since_is_rejected(self):
+        response = self.client.get(self.url, {'since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_activity_user_is_a_compact_reference(self):
+        self.add_activities(1)
+        activity = self.client.get(self.url).data['results'][0]
+        self.assertEqual(set(activity['user']), {'id', 'full_name', 'role', 'profile_picture_url'})
+
+    def test_detail_embeds_only_the_latest_activities(self):
+        self.add_activities(30)
+        response = self.client.get(reverse('task-detail', args=[self.task.title]))
+        self.assertEqual(len(response.data['activities']), 20)
+        self.assertEqual(response.data['activities'][0]['message'], 'Note 29')
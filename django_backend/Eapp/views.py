@@ -1,88 +1,91 @@
-from common.models import Location
 from customers.serializers import CustomerSerializer
 from rest_framework import status, permissions, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from users.models import User
 from financials.serializers import PaymentSerializer, CostBreakdownSerializer
 from .models import Task, TaskActivity
 from .serializers import (
-    TaskListSerializer, TaskDetailSerializer, TaskActivitySerializer
+    TaskListSerializer, TaskDetailSerializer, TaskActivitySerializer, BulkTaskOperationSerializer,
+    latest_activities_prefetch,
 )
 from financials.models import Payment, PaymentMethod, PaymentCategory
 from django.shortcuts import get_object_or_404
 from users.permissions import IsAdminOrManagerOrAccountant
-from .status_transitions import can_transition
+from .status_transitions import STATUS_ACTIVITIES, can_transition
+from .activity_buffer import ActivityBuffer
+from .bulk import BulkOperationError, apply_bulk_operation
+from .task_sequence import generate_task_id
 from django_filters.rest_framework import DjangoFilterBackend
 from .filters import TaskFilter
-from .pagination import StandardResultsSetPagination
-from customers.models import Customer, Referrer
+from .pagination import ActivityTimelinePagination, StandardResultsSetPagination
+from customers.models import Referrer
+from customers.phones import resolve_customer
+from common.lookups import choices_response, get_or_create_lookup
 
 
-def generate_task_id():
-    now = timezone.now()
-    
-    # Determine the year character
-    first_task = Task.objects.order_by('created_at').first()
-    if first_task:
-        first_year = first_task.created_at.year
-        year_char = chr(ord('A') + now.year - first_year)
-    else:
-        year_char = 'A'
-
-    # Format the prefix for the current month
-    month_prefix = f"{year_char}{now.month}"
-
-    # Find the last task created this month to determine the next sequence number
-    last_task = Task.objects.filter(title__startswith=month_prefix).order_by('-title').first()
-
-    if last_task:
-        # Extract the sequence number from the last task\'s title
-        last_seq = int(last_task.title.split('-')[-1])
-        new_seq = last_seq + 1
-    else:
-        # Start a new sequence for the month
-        new_seq = 1
-
-    return f"{month_prefix}-{new_seq:03d}"
-
 class TaskViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = Task.objects.all()
-        
-        # Prefetch related objects to avoid N+1 queries
-        if self.action == 'list':
-            return queryset.select_related(
-                'customer', 'assigned_to'
-            ).prefetch_related(
-                'payments', 'cost_breakdowns'
+
+        # List and detail reads load only what the rendered fields need
+        if self.action in ('list', 'retrieve'):
+            return self.get_serializer_class().shape_queryset(
+                queryset, self.get_rendered_fields(), extra_columns=['created_at']
             )
-            
-        # For detail view, prefetch all related data
+
+        # The timeline and the payments list only need the task's key
+        if self.action in ('activities', 'payments'):
+            return queryset.only('id', 'title')
+
+        # Writes and other actions render the full detail serializer
         return queryset.select_related(
             'assigned_to', 'created_by', 'negotiated_by', 'approved_by', 
             'sent_out_by', 'brand', 'referred_by', 'customer', 
             'workshop_location', 'workshop_technician', 'original_technician', 'qc_rejected_by'
         ).prefetch_related(
-            'activities', 'payments', 'cost_breakdowns'
+            latest_activities_prefetch(), 'payments', 'cost_breakdowns'
         )
 
+    def get_rendered_fields(self):
+        """
+        Field names picked by the comma-separated ``?fields=`` and ``?expand=``
+        parameters, see ``SparseFieldsMixin.select_fields``.
+        """
+        def field_list(param):
+            value = self.request.query_params.get(param)
+            if value is None:
+                return None
+            return [name.strip() for name in value.split(',') if name.strip()]
+
+        return self.get_serializer_class().select_fields(field_list('fields'), field_list('expand'))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve'):
+            context['fields'] = self.get_rendered_fields()
+        return context
+
 
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_class = TaskFilter
     pagination_class = StandardResultsSetPagination
+    cursor_ordering = ('-created_at', '-id')
     lookup_field = 'title'
     lookup_url_kwarg = 'task_id'
 
     @action(detail=False, methods=['get'], url_path='status-options')
     def status_options(self, request):
-        return Response(Task.Status.choices)
+        return choices_response(request, Task.Status.choices)
 
     @action(detail=False, methods=['get'], url_path='urgency-options')
     def urgency_options(self, request):
-        return Response(Task.Urgency.choices)
+        return choices_response(request, Task.Urgency.choices)
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -97,12 +100,28 @@ class TaskViewSet(viewsets.ModelViewSet):
         self.check_object_permissions(self.request, obj)
         return obj
 
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.activity_buffer = ActivityBuffer()
+
     def create(self, request, *args, **kwargs):
         if not (request.user.role in ['Manager', 'Front Desk'] or request.user.is_superuser):
             return Response(
                 {"error": "You do not have permission to create tasks."},
                 status=status.HTTP_403_FORBIDDEN
             )
+        # Activities are written when the transaction commits, so the
+        # response is rendered after it.
+        with transaction.atomic():
+            task, customer_created = self._create_task(request)
+
+        response_data = self.get_serializer(task).data
+        response_data['customer_created'] = customer_created
+        
+        headers = self.get_success_headers(response_data)
+        return Response(response_data, status=status.HTTP_201_CREATED, headers=headers)
+
+    def _create_task(self, request):
         data = request.data.copy()
         data['title'] = generate_task_id()
 
@@ -110,15 +129,9 @@ class TaskViewSet(viewsets.ModelViewSet):
         customer_data = data.pop('customer', None)
         customer_created = False
         if customer_data:
+            # Any of the submitted numbers, in any format, finds an existing customer
             phone_numbers = customer_data.get('phone_numbers', [])
-            customer = None
-            if phone_numbers:
-                first_phone_number = phone_numbers[0].get('phone_number')
-                if first_phone_number:
-                    try:
-                        customer = Customer.objects.get(phone_numbers__phone_number=first_phone_number)
-                    except Customer.DoesNotExist:
-                        pass  # Customer not found, will be created
+            customer = resolve_customer(phone.get('phone_number') for phone in phone_numbers)
 
             if customer:
                 data['customer'] = customer.id
@@ -152,40 +165,47 @@ class TaskViewSet(viewsets.ModelViewSet):
         task = serializer.save(created_by=request.user, referred_by=referrer_obj)
 
         # --- Side effects after saving ---
-        TaskActivity.objects.create(
+        self.activity_buffer.add(
             task=task, user=task.created_by, type=TaskActivity.ActivityType.INTAKE, message="Task has been taken in."
         )
         if device_notes:
-            TaskActivity.objects.create(
+            self.activity_buffer.add(
                 task=task, user=task.created_by, type=TaskActivity.ActivityType.DEVICE_NOTE, message=f"Device Notes: {device_notes}"
             )
 
         if task.assigned_to:
-            TaskActivity.objects.create(
+            self.activity_buffer.add(
                 task=task,
                 user=task.created_by,
                 type=TaskActivity.ActivityType.ASSIGNMENT,
                 message=f"Task assigned to {task.assigned_to.get_full_name()} by {task.created_by.get_full_name()}."
             )
-
-        response_data = self.get_serializer(task).data
-        response_data['customer_created'] = customer_created
-        
-        headers = self.get_success_headers(response_data)
-        return Response(response_data, status=status.HTTP_201_CREATED, headers=headers)
+        return task, customer_created
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
+        # As in create(), the response is rendered once the activities are written.
+        with transaction.atomic():
+            result = self._update_task(request, partial)
+        if isinstance(result, Response):
+            return result
+        # Drop the activities, payments and cost breakdowns prefetched by get_object().
+        result._prefetched_objects_cache = {}
+        result.__dict__.pop('latest_activities', None)
+        return Response(self.get_serializer(result).data)
+
+    def _update_task(self, request, partial):
         task = self.get_object()
         user = request.user
         data = request.data.copy()
+        previous_technician = task.assigned_to
 
         # --- Pop and handle data before validation ---
         self._handle_customer_update(data.pop('customer', None), task)
         
         partial_payment_amount = data.pop("partial_payment_amount", None)
         if partial_payment_amount is not None:
-            payment_method, _ = PaymentMethod.objects.get_or_create(name="Partial Payment")
+            payment_method = get_or_create_lookup(PaymentMethod, name="Partial Payment")
             Payment.objects.create(task=task, amount=partial_payment_amount, method=payment_method)
 
         referred_by_name = data.pop("referred_by", None)
@@ -199,7 +219,6 @@ class TaskViewSet(viewsets.ModelViewSet):
                 data["status"] = "Pending"
         
         self._handle_payment_status_update(data, task, user)
-        self._handle_workshop_instance_update(data, task, user)
 
         # Handle status transitions
         if 'status' in data:
@@ -209,6 +228,7 @@ class TaskViewSet(viewsets.ModelViewSet):
 
         serializer = self.get_serializer(task, data=data, partial=partial)
         serializer.is_valid(raise_exception=True)
+        self._handle_workshop_instance_update(serializer.validated_data, task, user)
 
         # --- Save with extra data ---
         referrer_obj = task.referred_by
@@ -221,44 +241,41 @@ class TaskViewSet(viewsets.ModelViewSet):
         updated_task = serializer.save(referred_by=referrer_obj)
 
         # --- Side effects after saving ---
-        self._create_update_activities(updated_task, data, user, original_task=task)
-
-        return Response(self.get_serializer(updated_task).data)
+        self._create_update_activities(updated_task, data, user, previous_technician)
+        return updated_task
 
-    def _create_update_activities(self, task, data, user, original_task):
+    def _create_update_activities(self, task, data, user, previous_technician):
+        # Names come from the objects the serializer already loaded.
         if data.get('is_debt') is True:
-            TaskActivity.objects.create(
+            self.activity_buffer.add(
                 task=task, user=user, type=TaskActivity.ActivityType.STATUS_UPDATE, message="Task marked as debt."
             )
 
         if 'workshop_location' in data and 'workshop_technician' in data:
-            workshop_technician = get_object_or_404(User, id=data.get('workshop_technician'))
-            workshop_location = get_object_or_404(Location, id=data.get('workshop_location'))
-            TaskActivity.objects.create(
+            self.activity_buffer.add(
                 task=task, user=user, type=TaskActivity.ActivityType.WORKSHOP, 
-                message=f"Task sent to workshop technician {workshop_technician.get_full_name()} at {workshop_location.name}."
+                message=f"Task sent to workshop technician {task.workshop_technician.get_full_name()} at {task.workshop_location.name}."
             )
 
         if data.get('workshop_status') in ['Solved', 'Not Solved']:
-            TaskActivity.objects.create(
+            self.activity_buffer.add(
                 task=task, user=user, type=TaskActivity.ActivityType.WORKSHOP,
                 message=f"Task returned from workshop with status: {data['workshop_status']}."
             )
 
         if 'assigned_to' in data:
-            new_technician_id = data.get('assigned_to')
-            if new_technician_id:
-                new_technician = get_object_or_404(User, id=new_technician_id)
-                if original_task.assigned_to != new_technician:
-                    old_technician_name = original_task.assigned_to.get_full_name() if original_task.assigned_to else "unassigned"
-                    TaskActivity.objects.create(
+            new_technician = task.assigned_to
+            if new_technician:
+                if previous_technician != new_technician:
+                    old_technician_name = previous_technician.get_full_name() if previous_technician else "unassigned"
+                    self.activity_buffer.add(
                         task=task, user=user, type=TaskActivity.ActivityType.ASSIGNMENT,
                         message=f"Task reassigned from {old_technician_name} to {new_technician.get_full_name()} by {user.get_full_name()}."
                     )
             else:
-                if original_task.assigned_to:
-                    old_technician_name = original_task.assigned_to.get_full_name()
-                    TaskActivity.objects.create(
+                if previous_technician:
+                    old_technician_name = previous_technician.get_full_name()
+                    self.activity_buffer.add(
                         task=task, user=user, type=TaskActivity.ActivityType.ASSIGNMENT,
                         message=f"Task unassigned from {old_technician_name} by {user.get_full_name()}."
                     )
@@ -276,16 +293,18 @@ class TaskViewSet(viewsets.ModelViewSet):
                 task.paid_date = timezone.now().date()
             task.save()
 
-    def _handle_workshop_instance_update(self, data, task, user):
-        if 'workshop_location' in data and 'workshop_technician' in data:
+    def _handle_workshop_instance_update(self, validated_data, task, user):
+        if 'workshop_location' in validated_data and 'workshop_technician' in validated_data:
+            missing = [field for field in ('workshop_location', 'workshop_technician') if validated_data[field] is None]
+            if missing:
+                raise ValidationError({field: 'Required to send the task to the workshop.' for field in missing})
             task.original_location = task.current_location
             task.workshop_status = 'In Workshop'
             task.original_technician = user
             task.workshop_sent_at = timezone.now()
-            workshop_location = get_object_or_404(Location, id=data.get('workshop_location'))
-            task.current_location = workshop_location.name
+            task.current_location = validated_data['workshop_location'].name
 
-        if data.get('workshop_status') in ['Solved', 'Not Solved']:
+        if validated_data.get('workshop_status') in ['Solved', 'Not Solved']:
             if task.original_location:
                 task.current_location = task.original_location
                 task.original_location = None
@@ -307,7 +326,7 @@ class TaskViewSet(viewsets.ModelViewSet):
         if new_status == 'In Progress' and 'qc_notes' in data and data['qc_notes']:
             task.qc_rejected_by = user
             task.qc_rejected_at = timezone.now()
-            TaskActivity.objects.create(
+            self.activity_buffer.add(
                 task=task,
                 user=user,
                 type=TaskActivity.ActivityType.REJECTED,
@@ -316,27 +335,19 @@ class TaskViewSet(viewsets.ModelViewSet):
             return None # Prevent other status update logs for this case
 
         # Create activity logs for specific transitions
-        activity_messages = {
-            'Picked Up': "Task has been picked up by the customer.",
-            'Completed': "Task marked as Completed.",
-            'Ready for Pickup': "Task has been approved and is ready for pickup."
-        }
-        if new_status in activity_messages:
-            activity_type = TaskActivity.ActivityType.STATUS_UPDATE
+        if new_status in STATUS_ACTIVITIES:
+            activity_type, message = STATUS_ACTIVITIES[new_status]
             if new_status == 'Picked Up':
-                activity_type = TaskActivity.ActivityType.PICKED_UP
                 data['sent_out_by'] = user.id
                 data['date_out'] = timezone.now()
-            elif new_status == 'Ready for Pickup':
-                activity_type = TaskActivity.ActivityType.READY
-            TaskActivity.objects.create(task=task, user=user, type=activity_type, message=activity_messages[new_status])
+            self.activity_buffer.add(task=task, user=user, type=activity_type, message=message)
 
         if new_status == 'In Progress' and user.role == 'Front Desk':
             technician_id = data.get('assigned_to')
             if technician_id:
                 technician = get_object_or_404(User, id=technician_id, role='Technician')
                 task.assigned_to = technician
-                TaskActivity.objects.create(
+                self.activity_buffer.add(
                     task=task, user=user, type=TaskActivity.ActivityType.ASSIGNMENT,
                     message=f"Returned task assigned to {technician.get_full_name()}."
                 )
@@ -351,6 +362,26 @@ class TaskViewSet(viewsets.ModelViewSet):
             )
         return super().destroy(request, *args, **kwargs)
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Apply one operation (assign, transition or send_to_workshop) to many
+        tasks at once. Either every task is updated or, if any of them
+        cannot be, none are and the reasons are returned per task.
+        """
+        serializer = BulkTaskOperationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            tasks = apply_bulk_operation(
+                request.user,
+                serializer.validated_data['task_ids'],
+                serializer.validated_data['operation'],
+                **serializer.operation_params()
+            )
+        except BulkOperationError as e:
+            return Response({"error": e.message, "tasks": e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"updated": [task.title for task in tasks], "count": len(tasks)})
+
     @action(detail=False, methods=['get'], permission_classes=[IsAdminOrManagerOrAccountant])
     def debts(self, request):
         """
@@ -369,10 +400,30 @@ class TaskViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def activities(self, request, task_id=None):
+        """
+        The task's activity timeline, newest first and paged by cursor.
+        ``?since=<timestamp>`` returns only activities after that time, for
+        polling with the newest timestamp already shown. ``?type=`` (comma
+        separated) keeps only activities of those types, e.g. ``note``.
+        """
         task = self.get_object()
-        activities = task.activities.all()
-        serializer = TaskActivitySerializer(activities, many=True)
-        return Response(serializer.data)
+        activities = task.activities.select_related('user')
+        types = [value for value in request.query_params.get('type', '').split(',') if value]
+        if types:
+            activities = activities.filter(type__in=types)
+        since = request.query_params.get('since')
+        if since:
+            since_time = parse_datetime(since)
+            if since_time is None:
+                return Response({"error": "since must be an ISO 8601 timestamp."}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(since_time):
+                since_time = timezone.make_aware(since_time)
+            activities = activities.filter(timestamp__gt=since_time)
+
+        paginator = ActivityTimelinePagination()
+        page = paginator.paginate_queryset(activities, request, view=self)
+        serializer = TaskActivitySerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post'], url_path='add-activity')
     def add_activity(self, request, task_id=None):
@@ -386,7 +437,7 @@ class TaskViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def payments(self, request, task_id=None):
         task = self.get_object()
-        payments = task.payments.all()
+        payments = task.payments.select_related('task', 'method', 'category')
         serializer = PaymentSerializer(payments, many=True)
         return Response(serializer.data)
 
@@ -401,7 +452,7 @@ class TaskViewSet(viewsets.ModelViewSet):
         task = self.get_object()
         serializer = PaymentSerializer(data=request.data)
         if serializer.is_valid():
-            tech_support_category, _ = PaymentCategory.objects.get_or_create(name='Tech Support')
+            tech_support_category = get_or_create_lookup(PaymentCategory, name='Tech Support')
             print("Saving payment")
             serializer.save(task=task, description=f"{task.customer.name} - {task.title}", category=tech_support_category)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -0,0 +1,26 @@
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from .events import groups_for_user
+
+
+class EventsConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes task, activity and payment changes to a signed-in user. Events
+    only say what changed; clients re-fetch the records they display.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        self.groups = groups_for_user(user)
+        for group in self.groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        for group in getattr(self, 'groups', []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def event_push(self, message):
+        await self.send_json(message['event'])
@@ -0,0 +1,36 @@
+import base64
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+def encode_cursor(values, reverse=False):
+    # isoformat() keeps microseconds, which DjangoJSONEncoder would truncate;
+    # the encoder still handles decimals and UUIDs.
+    values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+    payload = {'v': values, 'r': 1} if reverse else {'v': values}
+    return base64.urlsafe_b64encode(json.dumps(payload, cls=DjangoJSONEncoder).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return ``(values, reverse)`` for a cursor, raising ``ValueError`` if it is malformed."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return list(payload['v']), bool(payload.get('r'))
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ValueError('Invalid cursor')
+
+
+def keyset_filter(ordering, values):
+    """
+    Condition for rows that sort after ``values`` in ``ordering`` (field
+    names, with a leading ``-`` for descending fields).
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
@@ -0,0 +1,88 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils.text import slugify
+
+# Roles that see every task, and every payment, as they do through the API.
+TASK_ROLES = ('Manager', 'Front Desk', 'Accountant')
+PAYMENT_ROLES = ('Manager', 'Front Desk', 'Accountant')
+
+
+def role_group(role):
+    return f'role-{slugify(role)}'
+
+
+def user_group(user_id):
+    return f'user-{user_id}'
+
+
+def groups_for_user(user):
+    """
+    The groups a connection of ``user`` listens on. Superusers listen as
+    managers, who already receive every event.
+    """
+    role = 'Manager' if user.is_superuser else user.role
+    groups = [user_group(user.pk)]
+    if role:
+        groups.append(role_group(role))
+    return groups
+
+
+def publish(groups, event):
+    """Send ``event`` to ``groups`` once the current transaction commits."""
+    def send():
+        layer = get_channel_layer()
+        if layer is None:
+            return
+        for group in groups:
+            async_to_sync(layer.group_send)(group, {'type': 'event.push', 'event': event})
+    transaction.on_commit(send)
+
+
+ASSIGNEE_FIELDS = ('assigned_to_id', 'workshop_technician_id')
+
+
+def task_groups(task, previous=None):
+    """
+    Technicians only hear about the tasks they work on. ``previous`` (the
+    task's values before a change) adds the technicians it was taken from,
+    so they drop it from their lists.
+    """
+    assignees = {getattr(task, field) for field in ASSIGNEE_FIELDS}
+    assignees |= {(previous or {}).get(field) for field in ASSIGNEE_FIELDS}
+    assignees -= {None}
+    return [role_group(role) for role in TASK_ROLES] + [user_group(user_id) for user_id in sorted(assignees)]
+
+
+def broadcast_task(task, action, previous=None):
+    publish(task_groups(task, previous), {
+        'type': f'task.{action}',
+        'task': task.title,
+        'status': task.status,
+        'assigned_to': task.assigned_to_id,
+        'updated_at': task.updated_at.isoformat() if task.updated_at else None,
+    })
+
+
+def broadcast_activities(activities):
+    for activity in activities:
+        publish(task_groups(activity.task), {
+            'type': 'activity.created',
+            'task': activity.task.title,
+            'activity': {
+                'id': activity.pk,
+                'type': activity.type,
+                'message': activity.message,
+                'user': activity.user_id,
+                'timestamp': activity.timestamp.isoformat() if activity.timestamp else None,
+            },
+        })
+
+
+def broadcast_payment(payment, action):
+    publish([role_group(role) for role in PAYMENT_ROLES], {
+        'type': f'payment.{action}',
+        'id': payment.pk,
+        'task': payment.task.title if payment.task_id else None,
+        'amount': str(payment.amount),
+    })
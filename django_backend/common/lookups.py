@@ -0,0 +1,128 @@
+import hashlib
+import json
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+LOOKUP_CACHE_VERSION_KEY = 'common:lookups:version'
+# Clients revalidate lookup tables on every use; a 304 costs no queries.
+LOOKUP_CACHE_CONTROL = 'private, no-cache'
+# Choices are constants in the code and only change with a deploy.
+CHOICES_CACHE_CONTROL = 'private, max-age=3600'
+
+# Process-local tier: {'version': ..., 'loaded_at': ..., 'tables': {model label: rows}}
+_local = {'version': None, 'loaded_at': None, 'tables': {}}
+
+
+def lookup_cache_ttl():
+    """Seconds lookup rows stay in the shared cache (LOOKUP_CACHE_TTL, default 3600)."""
+    return getattr(settings, 'LOOKUP_CACHE_TTL', 3600)
+
+
+def lookup_local_cache_ttl():
+    """Seconds a process keeps lookup rows in memory (LOOKUP_LOCAL_CACHE_TTL, default 30)."""
+    return getattr(settings, 'LOOKUP_LOCAL_CACHE_TTL', 30)
+
+
+def lookup_version():
+    return cache.get_or_set(LOOKUP_CACHE_VERSION_KEY, 1, timeout=None)
+
+
+def invalidate_lookups():
+    try:
+        cache.incr(LOOKUP_CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(LOOKUP_CACHE_VERSION_KEY, 1, timeout=None)
+
+
+def lookup_rows(model):
+    """
+    All rows of a small reference table, in its default ordering. Rows come
+    from this process's memory (for LOOKUP_LOCAL_CACHE_TTL seconds), then
+    the shared cache, then the database; saving or deleting any lookup row
+    bumps the version both tiers key on.
+    """
+    version = lookup_version()
+    now = time.monotonic()
+    # The version only changes for every process when the cache is shared
+    # (see CACHES); the expiry bounds how long this process trusts its copy.
+    if _local['version'] != version or _local['loaded_at'] is None or now - _local['loaded_at'] >= lookup_local_cache_ttl():
+        _local.update(version=version, loaded_at=now, tables={})
+    label = model._meta.label_lower
+    rows = _local['tables'].get(label)
+    if rows is not None:
+        return rows
+
+    key = f'common:lookups:{version}:{label}'
+    rows = cache.get(key)
+    if rows is None:
+        rows = list(model.objects.all())
+        # Rows read inside a transaction may be rolled back, so they are not kept.
+        if connection.in_atomic_block:
+            return rows
+        cache.set(key, rows, timeout=lookup_cache_ttl())
+    _local['tables'][label] = rows
+    return rows
+
+
+def get_lookup(model, **fields):
+    """The cached row of ``model`` matching ``fields``; raises ``model.DoesNotExist``."""
+    for row in lookup_rows(model):
+        if all(getattr(row, name) == value for name, value in fields.items()):
+            return row
+    raise model.DoesNotExist(f'No {model._meta.object_name} matches {fields}.')
+
+
+def get_or_create_lookup(model, **fields):
+    """Like ``get_or_create``, but a row that already exists costs no query."""
+    try:
+        return get_lookup(model, **fields)
+    except model.DoesNotExist:
+        return model.objects.get_or_create(**fields)[0]
+
+
+def conditional_response(request, etag, get_data, cache_control):
+    """
+    A 304 when the client's ``If-None-Match`` has ``etag``, otherwise
+    ``get_data()``; both carry ``ETag`` and ``Cache-Control``.
+    """
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in etags or '*' in etags:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(get_data())
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def choices_response(request, choices):
+    digest = hashlib.md5(json.dumps(choices, cls=DjangoJSONEncoder).encode()).hexdigest()
+    return conditional_response(request, quote_etag(digest), lambda: choices, CHOICES_CACHE_CONTROL)
+
+
+class LookupCacheMixin:
+    """
+    Serves a lookup-table viewset's list from ``lookup_rows``, with an ETag
+    that changes whenever any lookup table does.
+    """
+
+    def filter_lookup_rows(self, rows):
+        return rows
+
+    def list(self, request, *args, **kwargs):
+        return self.lookup_response(request, 'list', self.filter_lookup_rows)
+
+    def lookup_response(self, request, name, filter_rows):
+        model = self.get_queryset().model
+        etag = quote_etag(f'{model._meta.label_lower}.{name}.{lookup_version()}')
+        return conditional_response(
+            request, etag,
+            lambda: self.get_serializer(filter_rows(lookup_rows(model)), many=True).data,
+            LOOKUP_CACHE_CONTROL,
+        )
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+# (app, model, index name, SQL expression) for the full-text and trigram
+# indexes behind common.search. The tsvector expressions match what
+# SearchVector(..., config='simple') compiles to, so the planner can use them.
+SEARCH_VECTOR_INDEXES = [
+    ('Eapp', 'task', 'task_search_vector_idx',
+     "to_tsvector('simple'::regconfig, COALESCE(title, '') || ' ' || COALESCE(laptop_model, ''))"),
+    ('customers', 'customer', 'customer_search_vector_idx',
+     "to_tsvector('simple'::regconfig, COALESCE(name, ''))"),
+]
+TRIGRAM_INDEXES = [
+    ('Eapp', 'task', 'task_laptop_model_trgm_idx', 'laptop_model gin_trgm_ops'),
+    ('customers', 'customer', 'customer_name_trgm_idx', 'name gin_trgm_ops'),
+    ('customers', 'phonenumber', 'phone_number_trgm_idx', 'phone_number gin_trgm_ops'),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    quote = schema_editor.quote_name
+
+    def create_index(app_label, model_name, name, expression):
+        table = apps.get_model(app_label, model_name)._meta.db_table
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} USING gin ({expression})')
+
+    for index in SEARCH_VECTOR_INDEXES:
+        create_index(*index)
+
+    # Managed databases do not always ship pg_trgm; search then skips fuzzy matching.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for index in TRIGRAM_INDEXES:
+        create_index(*index)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for _, _, name, _ in SEARCH_VECTOR_INDEXES + TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(name)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0001_initial'),
+        ('Eapp', '0009_task_in_shop_idx'),
+        ('customers', '0004_customer_created_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
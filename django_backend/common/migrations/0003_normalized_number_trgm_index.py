@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# Phone searches also match inside the E.164 form (customers.phones.phone_number_match).
+TRIGRAM_INDEXES = [
+    ('customers', 'phonenumber', 'phonenumber_normalized_trgm_idx', 'normalized_number gin_trgm_ops'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # Without pg_trgm, 0002 created no trigram indexes and search skips fuzzy matching.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    quote = schema_editor.quote_name
+    for app_label, model_name, name, expression in TRIGRAM_INDEXES:
+        table = apps.get_model(app_label, model_name)._meta.db_table
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} USING gin ({expression})')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for _, _, name, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(name)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0002_search_indexes'),
+        ('customers', '0006_phonenumber_normalized_number_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
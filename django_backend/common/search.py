@@ -0,0 +1,143 @@
+import re
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+from customers.models import Customer
+from customers.phones import phone_search_match
+from Eapp.models import Task
+
+# The 'simple' configuration does no stemming, which suits IDs, names and models.
+SEARCH_CONFIG = 'simple'
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 50
+
+_trigram_enabled = {}
+
+
+def search_terms(query):
+    # Postgres reads the '-002' of a task ID like 'A1-002' as a signed number.
+    return re.findall(r'-?\d+|\w+', query.lower())
+
+
+def trigram_enabled():
+    """Whether pg_trgm is installed, so fuzzy matches can use the trigram indexes."""
+    if connection.vendor != 'postgresql':
+        return False
+    if connection.alias not in _trigram_enabled:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_enabled[connection.alias] = cursor.fetchone() is not None
+    return _trigram_enabled[connection.alias]
+
+
+def _score(value):
+    return Value(value, output_field=FloatField())
+
+
+def _postgres_matches(query, terms):
+    """
+    Prefix full-text matches on the tsvector indexes, plus typo-tolerant
+    trigram matches when pg_trgm is available. Each match set is ranked.
+    """
+    from django.contrib.postgres.lookups import TrigramWordSimilar
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+
+    # Every term may be the start of a word. Terms are only word characters
+    # and a leading '-', so quoting them makes the raw query safe.
+    tsquery = SearchQuery(' & '.join(f"'{term}':*" for term in terms), search_type='raw', config=SEARCH_CONFIG)
+    fuzzy = trigram_enabled()
+
+    task_document = SearchVector('title', 'laptop_model', config=SEARCH_CONFIG)
+    task_match = Q(task_document=tsquery)
+    task_rank = SearchRank(F('task_document'), tsquery) + Case(
+        When(title__iexact=query, then=_score(2.0)), default=_score(0.0)
+    )
+    if fuzzy:
+        task_match |= Q(TrigramWordSimilar(F('laptop_model'), Value(query)))
+        task_rank = task_rank + TrigramWordSimilarity(Value(query), 'laptop_model')
+    tasks = Task.objects.annotate(task_document=task_document).filter(task_match).annotate(rank=task_rank)
+
+    customer_document = SearchVector('name', config=SEARCH_CONFIG)
+    customer_match = Q(customer_document=tsquery)
+    customer_rank = SearchRank(F('customer_document'), tsquery)
+    if fuzzy:
+        customer_match |= Q(TrigramWordSimilar(F('name'), Value(query)))
+        customer_rank = customer_rank + TrigramWordSimilarity(Value(query), 'name')
+    phone_match = phone_search_match(query)
+    if phone_match is not None:
+        customer_match |= Q(phone_match)
+        customer_rank = customer_rank + Case(When(phone_match, then=_score(1.0)), default=_score(0.0))
+    customers = Customer.objects.annotate(customer_document=customer_document).filter(customer_match).annotate(rank=customer_rank)
+    return tasks, customers
+
+
+def _fallback_matches(query, terms):
+    """``icontains`` matching for databases without full-text indexes."""
+    task_match = Q()
+    customer_match = Q()
+    for term in terms:
+        task_match &= Q(title__icontains=term) | Q(laptop_model__icontains=term)
+        customer_match &= Q(name__icontains=term)
+    phone_match = phone_search_match(query)
+    if phone_match is not None:
+        customer_match |= Q(phone_match)
+
+    tasks = Task.objects.filter(task_match).annotate(rank=Case(
+        When(title__iexact=query, then=_score(2.0)),
+        When(title__istartswith=query, then=_score(1.0)),
+        default=_score(0.5),
+    ))
+    customers = Customer.objects.filter(customer_match).annotate(rank=Case(
+        When(name__iexact=query, then=_score(2.0)),
+        When(name__istartswith=query, then=_score(1.0)),
+        default=_score(0.5),
+    ))
+    return tasks, customers
+
+
+def search(query, limit=DEFAULT_SEARCH_LIMIT):
+    """
+    Ranked tasks and customers matching ``query`` (task ID, laptop model,
+    customer name or part of a phone number), best matches first. Phone
+    matches go through ``EXISTS``, so a customer is listed once however
+    many of their numbers match.
+    """
+    query = query.strip()
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    if connection.vendor == 'postgresql':
+        tasks, customers = _postgres_matches(query, terms)
+    else:
+        tasks, customers = _fallback_matches(query, terms)
+
+    tasks = (
+        tasks.select_related('customer')
+        .only('title', 'laptop_model', 'status', 'created_at', 'customer__name')
+        .order_by('-rank', '-created_at')[:limit]
+    )
+    customers = customers.prefetch_related('phone_numbers').order_by('-rank', 'name')[:limit]
+
+    results = [
+        {
+            'type': 'task',
+            'id': task.title,
+            'label': task.title,
+            'detail': f'{task.customer.name} - {task.laptop_model}',
+            'status': task.status,
+            'rank': task.rank,
+        }
+        for task in tasks
+    ] + [
+        {
+            'type': 'customer',
+            'id': customer.pk,
+            'label': customer.name,
+            'detail': ', '.join(phone.phone_number for phone in customer.phone_numbers.all()),
+            'status': None,
+            'rank': customer.rank,
+        }
+        for customer in customers
+    ]
+    results.sort(key=lambda result: -result['rank'])
+    return results[:limit]
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from financials.models import PaymentCategory, PaymentMethod
+from .lookups import invalidate_lookups
+from .models import Brand, Location
+
+
+@receiver([post_save, post_delete], sender=Brand)
+@receiver([post_save, post_delete], sender=Location)
+@receiver([post_save, post_delete], sender=PaymentMethod)
+@receiver([post_save, post_delete], sender=PaymentCategory)
+def invalidate_lookups_on_change(sender, instance, **kwargs):
+    # After commit, so no other request re-caches the rows this change replaces.
+    transaction.on_commit(invalidate_lookups)
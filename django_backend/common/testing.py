@@ -0,0 +1,30 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+QUERY_BUDGET_SIZES = (1, 10, 100)
+
+
+class QueryBudgetMixin:
+    """
+    Test case mixin for API endpoints. ``assertQueryBudget`` fetches an
+    endpoint with 1, 10 and 100 rows behind it and fails when any response
+    runs more than ``budget`` queries, so an N+1 fails as soon as it lands.
+    """
+
+    def assertQueryBudget(self, budget, add_rows, url, params=None, sizes=QUERY_BUDGET_SIZES):
+        """
+        ``add_rows(count)`` must create ``count`` more rows for the endpoint
+        to render: list items, or related rows of a detail endpoint's object.
+        """
+        rows = 0
+        for size in sizes:
+            add_rows(size - rows)
+            rows = size
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertLessEqual(
+                len(queries), budget,
+                f'{len(queries)} queries for {size} rows, budget is {budget}:\n'
+                + '\n'.join(query['sql'] for query in queries.captured_queries),
+            )
@@ -1,3 +1,293 @@
-from django.test import TestCase
+import asyncio
+import json
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from customers.models import Customer, PhoneNumber
+from customers.phones import phone_number_match
+from A_express.asgi import application
+from Eapp.bulk import apply_bulk_operation
+from Eapp.models import Task, TaskActivity
+from financials.models import Payment, PaymentCategory, PaymentMethod
+from users.models import User
+from .events import groups_for_user, role_group, user_group
+from .lookups import get_or_create_lookup, invalidate_lookups, lookup_rows, lookup_version
+from .models import Brand, Location
+from .search import search
+from .testing import QueryBudgetMixin
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='frontdesk', password='testpassword', email='frontdesk@gmail.com', first_name='Front', last_name='Desk', role='Front Desk')
+        self.amina = Customer.objects.create(name='Amina Juma')
+        PhoneNumber.objects.create(customer=self.amina, phone_number='0712345678')
+        PhoneNumber.objects.create(customer=self.amina, phone_number='0755345678')
+        self.baraka = Customer.objects.create(name='Baraka Mushi')
+        PhoneNumber.objects.create(customer=self.baraka, phone_number='0688000111')
+        Task.objects.create(title='A1-001', customer=self.amina, created_by=self.user, laptop_model='HP EliteBook 840', current_location='Front Desk')
+        Task.objects.create(title='A1-002', customer=self.baraka, created_by=self.user, laptop_model='Dell Latitude 5400', current_location='Front Desk')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def labels(self, query):
+        return [(result['type'], result['label']) for result in search(query)]
+
+    def test_task_id_ranks_the_task_first(self):
+        self.assertEqual(self.labels('A1-002')[0], ('task', 'A1-002'))
+        # Equal ranks list the newest task first.
+        self.assertEqual(self.labels('a1-00'), [('task', 'A1-002'), ('task', 'A1-001')])
+
+    def test_prefixes_of_names_and_models_match(self):
+        self.assertEqual(self.labels('amin'), [('customer', 'Amina Juma')])
+        self.assertEqual(self.labels('elitebook 84'), [('task', 'A1-001')])
+
+    def test_phone_digits_match_each_customer_once(self):
+        # Both of Amina's numbers contain 345678.
+        self.assertEqual(self.labels('345678'), [('customer', 'Amina Juma')])
+
+    def test_endpoint(self):
+        response = self.client.get(reverse('search'), {'q': 'latitude'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['id'], 'A1-002')
+        self.assertEqual(response.data['results'][0]['detail'], 'Baraka Mushi - Dell Latitude 5400')
+
+        response = self.client.get(reverse('search'), {'q': '  '})
+        self.assertEqual(response.data['results'], [])
+
+    def test_full_text_match_uses_the_index(self):
+        from django.contrib.postgres.search import SearchQuery, SearchVector
+
+        queryset = Task.objects.annotate(
+            task_document=SearchVector('title', 'laptop_model', config='simple')
+        ).filter(task_document=SearchQuery("'elitebook':*", search_type='raw', config='simple')).order_by()
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn('task_search_vector_idx', queryset.explain())
+
+
+
+class PhoneSearchIndexTests(TestCase):
+    """Phone searches stay index scans (sequential scans disabled, as the test tables are tiny)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        customers = Customer.objects.bulk_create([Customer(name=f'Customer {i}') for i in range(300)])
+        for i, customer in enumerate(customers):
+            PhoneNumber.objects.create(customer=customer, phone_number=f'07{i:08d}')
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(PhoneNumber._meta.db_table)}')
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            if cursor.fetchone() is None:
+                self.skipTest('pg_trgm is not installed, so there are no trigram indexes')
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def test_digits_match_uses_the_trigram_indexes(self):
+        plan = PhoneNumber.objects.filter(phone_number_match('0712 345')).explain()
+        self.assertIn('phone_number_trgm_idx', plan, plan)
+        self.assertIn('phonenumber_normalized_trgm_idx', plan, plan)
+
+
+class LookupQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='frontdesk', password='testpassword', email='frontdesk@gmail.com', first_name='Front', last_name='Desk', role='Front Desk')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_brand_and_location_lists(self):
+        def add_brands(count):
+            for _ in range(count):
+                Brand.objects.create(name=f'Brand {Brand.objects.count()}')
+
+        def add_locations(count):
+            for _ in range(count):
+                Location.objects.create(name=f'Shelf {Location.objects.count()}')
+
+        # Lookup rows are not cached inside the test transaction: one read of the table.
+        self.assertQueryBudget(1, add_brands, reverse('brand-list'))
+        self.assertQueryBudget(1, add_locations, reverse('location-list'))
+
+class EventBroadcastTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        self.technician = User.objects.create_user(username='tech', password='testpassword', email='tech@gmail.com', first_name='Jane', last_name='Tech', role='Technician')
+        self.other_technician = User.objects.create_user(username='tech2', password='testpassword', email='tech2@gmail.com', first_name='John', last_name='Tech', role='Technician')
+        self.customer = Customer.objects.create(name='Test Customer')
+        self.layer = get_channel_layer()
+        async_to_sync(self.layer.flush)()
+
+    def listen(self, *groups):
+        channel = async_to_sync(self.layer.new_channel)()
+        for group in groups:
+            async_to_sync(self.layer.group_add)(group, channel)
+        return channel
+
+    def received(self, channel):
+        async def drain():
+            events = []
+            while True:
+                try:
+                    message = await asyncio.wait_for(self.layer.receive(channel), 0.05)
+                except asyncio.TimeoutError:
+                    return events
+                events.append(message['event'])
+        return async_to_sync(drain)()
+
+    def test_groups_follow_role_and_user(self):
+        self.assertEqual(groups_for_user(self.technician), [user_group(self.technician.pk), 'role-technician'])
+        admin = User.objects.create_superuser(username='admin', password='testpassword', email='admin@gmail.com')
+        self.assertEqual(groups_for_user(admin), [user_group(admin.pk), 'role-manager'])
+
+    def test_task_changes_reach_staff_and_the_assignee_only(self):
+        front_desk = self.listen(role_group('Front Desk'))
+        assignee = self.listen(user_group(self.technician.pk))
+        other = self.listen(user_group(self.other_technician.pk), role_group('Technician'))
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(title='A1-001', customer=self.customer, created_by=self.manager, laptop_model='X1', current_location='Front Desk', assigned_to=self.technician)
+            TaskActivity.objects.create(task=task, user=self.manager, type='note', message='Checked in')
+
+        self.assertEqual([event['type'] for event in self.received(front_desk)], ['task.created', 'activity.created'])
+        events = self.received(assignee)
+        self.assertEqual(events[0]['task'], 'A1-001')
+        self.assertEqual(events[1]['activity']['message'], 'Checked in')
+        self.assertEqual(self.received(other), [])
+
+    def test_reassignment_reaches_the_previous_technician(self):
+        task = Task.objects.create(title='A1-001', customer=self.customer, created_by=self.manager, laptop_model='X1', current_location='Front Desk', assigned_to=self.technician)
+        previous = self.listen(user_group(self.technician.pk))
+        task = Task.objects.get(pk=task.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            task.assigned_to = self.other_technician
+            task.save()
+        self.assertEqual([event['assigned_to'] for event in self.received(previous)], [self.other_technician.pk])
+
+        # Later saves no longer reach the technician it was taken from.
+        with self.captureOnCommitCallbacks(execute=True):
+            task.save()
+        self.assertEqual(self.received(previous), [])
+
+    def test_bulk_reassignment_reaches_the_previous_technician(self):
+        Task.objects.create(title='A1-001', customer=self.customer, created_by=self.manager, laptop_model='X1', current_location='Front Desk', assigned_to=self.technician)
+        previous = self.listen(user_group(self.technician.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_bulk_operation(self.manager, ['A1-001'], 'assign', assigned_to=self.other_technician)
+        self.assertIn('task.updated', [event['type'] for event in self.received(previous)])
+
+    def test_nothing_is_sent_for_rolled_back_changes(self):
+        manager = self.listen(role_group('Manager'))
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Task.objects.create(title='A1-001', customer=self.customer, created_by=self.manager, laptop_model='X1', current_location='Front Desk')
+        # The broadcast and the customer summary invalidation.
+        self.assertEqual(len(callbacks), 2)
+        self.assertEqual(self.received(manager), [])
+
+    def test_payments_reach_payment_roles_only(self):
+        task = Task.objects.create(title='A1-001', customer=self.customer, created_by=self.manager, laptop_model='X1', current_location='Front Desk', assigned_to=self.technician)
+        accountant = self.listen(role_group('Accountant'))
+        assignee = self.listen(user_group(self.technician.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(task=task, amount=Decimal('40.00'), method=PaymentMethod.objects.create(name='Cash'))
+
+        self.assertIn({'type': 'payment.created', 'id': Payment.objects.get().pk, 'task': 'A1-001', 'amount': '40.00'}, self.received(accountant))
+        self.assertEqual(self.received(assignee), [])
+
+
+class EventSocketTests(TransactionTestCase):
+    # The consumer reads the user in another thread, which needs committed rows.
+    def setUp(self):
+        self.technician = User.objects.create_user(username='tech', password='testpassword', email='tech@gmail.com', first_name='Jane', last_name='Tech', role='Technician')
+        self.layer = get_channel_layer()
+
+    def socket(self, query_string=b''):
+        # channels.testing needs daphne, so drive the ASGI app directly.
+        return ApplicationCommunicator(application, {
+            'type': 'websocket', 'path': '/ws/events/', 'query_string': query_string, 'headers': [], 'subprotocols': [],
+        })
+
+    async def test_socket_requires_a_token(self):
+        communicator = self.socket()
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual(await communicator.receive_output(), {'type': 'websocket.close', 'code': 4401})
+
+    async def test_socket_pushes_events_for_the_user(self):
+        communicator = self.socket(f'token={AccessToken.for_user(self.technician)}'.encode())
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual((await communicator.receive_output())['type'], 'websocket.accept')
+        await self.layer.group_send(user_group(self.technician.pk), {'type': 'event.push', 'event': {'type': 'task.updated', 'task': 'A1-001'}})
+        message = await communicator.receive_output()
+        self.assertEqual(json.loads(message['text']), {'type': 'task.updated', 'task': 'A1-001'})
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+
+
+class LookupCacheTests(TransactionTestCase):
+    # Lookup rows are only cached outside transactions.
+    def setUp(self):
+        invalidate_lookups()
+        self.user = User.objects.create_user(username='frontdesk', password='testpassword', email='frontdesk@gmail.com', first_name='Front', last_name='Desk', role='Front Desk')
+        Brand.objects.create(name='Dell')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        invalidate_lookups()
+
+    def test_lists_are_served_from_cache_with_an_etag(self):
+        first = self.client.get(reverse('brand-list'))
+        self.assertEqual(first.data, [{'id': Brand.objects.get().pk, 'name': 'Dell'}])
+        self.assertEqual(first['Cache-Control'], 'private, no-cache')
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(reverse('brand-list'))
+            not_modified = self.client.get(reverse('brand-list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_saving_a_lookup_row_invalidates_the_cache(self):
+        first = self.client.get(reverse('brand-list'))
+        Brand.objects.create(name='HP')
+        response = self.client.get(reverse('brand-list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual([brand['name'] for brand in response.data], ['Dell', 'HP'])
+
+    def test_get_or_create_lookup_reuses_cached_rows(self):
+        category = get_or_create_lookup(PaymentCategory, name='Tech Support')
+        # Creating the row invalidated the cache, so the next lookup refills it.
+        get_or_create_lookup(PaymentCategory, name='Tech Support')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get_or_create_lookup(PaymentCategory, name='Tech Support'), category)
+        self.assertEqual(len(queries), 0)
+
+    def test_process_copy_expires(self):
+        shared_key = f'common:lookups:{lookup_version()}:{Brand._meta.label_lower}'
+        lookup_rows(Brand)
+        cache.delete(shared_key)
+        with self.assertNumQueries(0):
+            lookup_rows(Brand)
+
+        with override_settings(LOOKUP_LOCAL_CACHE_TTL=0):
+            lookup_rows(Brand)
+            cache.delete(shared_key)
+            with self.assertNumQueries(1):
+                lookup_rows(Brand)
+
+    def test_choices_revalidate_by_etag(self):
+        first = self.client.get(reverse('task-status-options'))
+        self.assertEqual(first['Cache-Control'], 'private, max-age=3600')
+        response = self.client.get(reverse('task-status-options'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
@@ -8,4 +8,5 @@ router.register(r'brands', views.BrandViewSet, basename='brand')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('search/', views.search_view, name='search'),
 ]
@@ -1,13 +1,15 @@
-from rest_framework import permissions, viewsets
+from rest_framework import permissions, status, viewsets
+from .lookups import LookupCacheMixin
 from .models import Brand, Location
+from .search import DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, search
 from .serializers import BrandSerializer, LocationSerializer
 from users.permissions import IsManager
 from rest_framework.response import Response
 
 
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 
-class LocationViewSet(viewsets.ModelViewSet):
+class LocationViewSet(LookupCacheMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows locations to be viewed or edited.
     """
@@ -17,11 +19,9 @@ class LocationViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], url_path='workshop-locations')
     def workshops(self, request):
-        locations = self.get_queryset().filter(is_workshop=True)
-        serializer = self.get_serializer(locations, many=True)
-        return Response(serializer.data)
+        return self.lookup_response(request, 'workshops', lambda locations: [location for location in locations if location.is_workshop])
 
-class BrandViewSet(viewsets.ModelViewSet):
+class BrandViewSet(LookupCacheMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows brands to be viewed or edited.
     """
@@ -36,4 +36,18 @@ class BrandViewSet(viewsets.ModelViewSet):
             self.permission_classes = [permissions.IsAuthenticated]
         else:
             self.permission_classes = [IsManager]
-        return super().get_permissions()
\ No newline at end of file
+        return super().get_permissions()
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def search_view(request):
+    """
+    Search tasks and customers by task ID, laptop model, customer name or
+    phone number: ``/api/search/?q=...&limit=20``.
+    """
+    query = request.query_params.get('q', '')
+    try:
+        limit = min(max(int(request.query_params.get('limit', DEFAULT_SEARCH_LIMIT)), 1), MAX_SEARCH_LIMIT)
+    except ValueError:
+        return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'query': query, 'results': search(query, limit)})
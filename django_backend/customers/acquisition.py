@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from .models import Customer
+
+ACQUISITION_CACHE_VERSION_KEY = 'customers:acquisition:version'
+GRANULARITIES = ('day', 'week', 'month')
+DEFAULT_BUCKETS = 12
+MAX_BUCKETS = 1000
+
+
+def acquisition_time_zone():
+    """Buckets follow the shop's calendar (REPORT_TIME_ZONE), as the reports do."""
+    return getattr(settings, 'REPORT_TIME_ZONE', settings.TIME_ZONE)
+
+
+def today():
+    return datetime.now(ZoneInfo(acquisition_time_zone())).date()
+
+
+def bucket_start(day, granularity):
+    """The first day of the bucket holding ``day``; weeks start on Monday, as in ``date_trunc``."""
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def next_bucket(bucket, granularity):
+    if granularity == 'month':
+        return (bucket.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return bucket + timedelta(days=7 if granularity == 'week' else 1)
+
+
+def buckets_between(start, end, granularity):
+    """Every bucket from the one holding ``start`` to the one holding ``end``."""
+    buckets, bucket = [], bucket_start(start, granularity)
+    while bucket <= end:
+        buckets.append(bucket)
+        bucket = next_bucket(bucket, granularity)
+    return buckets
+
+
+def bucket_count(start, end, granularity):
+    """How many buckets ``buckets_between`` returns, without building them."""
+    first, last = bucket_start(start, granularity), bucket_start(end, granularity)
+    if granularity == 'month':
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    return (last - first).days // (7 if granularity == 'week' else 1) + 1
+
+
+def default_start(end, granularity):
+    """The start of the range holding the last DEFAULT_BUCKETS buckets up to ``end``."""
+    bucket = bucket_start(end, granularity)
+    for _ in range(DEFAULT_BUCKETS - 1):
+        bucket = bucket_start(bucket - timedelta(days=1), granularity)
+    return bucket
+
+
+def _acquisition_version():
+    return cache.get_or_set(ACQUISITION_CACHE_VERSION_KEY, 1, timeout=None)
+
+
+def invalidate_acquisition_cache():
+    try:
+        cache.incr(ACQUISITION_CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(ACQUISITION_CACHE_VERSION_KEY, 1, timeout=None)
+
+
+def count_new_customers(first, last, granularity):
+    """
+    ``{bucket: new customers}`` for every bucket from ``first`` to ``last``
+    (bucket starts), with the buckets generated and zero-filled in SQL.
+    """
+    step = f'1 {granularity}'
+    table = connection.ops.quote_name(Customer._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT bucket::date, COUNT(customer.id)
+            FROM generate_series(%s::timestamp, %s::timestamp, %s::interval) AS bucket
+            LEFT JOIN {table} AS customer
+                ON customer.created_at >= bucket AT TIME ZONE %s
+                AND customer.created_at < (bucket + %s::interval) AT TIME ZONE %s
+            GROUP BY bucket
+            ORDER BY bucket
+            """,
+            [first, last, step, acquisition_time_zone(), step, acquisition_time_zone()],
+        )
+        return dict(cursor.fetchall())
+
+
+def acquisition_series(start, end, granularity):
+    """
+    New customers per bucket from ``start`` to ``end`` as a list of
+    ``(bucket start, count)``. Closed buckets never change once over, so
+    they are cached without expiry; only buckets from the current one on
+    are counted on every call. Deleting a customer clears the cache.
+    """
+    buckets = buckets_between(start, end, granularity)
+    current = bucket_start(today(), granularity)
+    version = _acquisition_version()
+    keys = {bucket: f'customers:acquisition:{version}:{granularity}:{bucket.isoformat()}' for bucket in buckets if bucket < current}
+    cached = cache.get_many(keys.values())
+    counts = {bucket: cached[key] for bucket, key in keys.items() if key in cached}
+
+    missing = [bucket for bucket in buckets if bucket not in counts]
+    if missing:
+        # One query over the span still missing; usually just the current bucket.
+        fresh = count_new_customers(missing[0], missing[-1], granularity)
+        counts.update({bucket: fresh.get(bucket, 0) for bucket in missing})
+        cache.set_many({keys[bucket]: counts[bucket] for bucket in missing if bucket in keys}, timeout=None)
+    return [(bucket, counts[bucket]) for bucket in buckets]
@@ -0,0 +1,108 @@
+from decimal import Decimal
+from django.db.models import Count, DecimalField, Exists, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from Eapp.models import Task
+from financials.models import Payment
+from .models import Customer
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+ZERO = Value(Decimal('0.00'), output_field=MONEY)
+# Tasks still in the shop count as open, as in the occupancy report.
+CLOSED_STATUSES = (Task.Status.PICKED_UP, Task.Status.TERMINATED)
+TASK_COUNTER_FIELDS = ('customer_id', 'status', 'is_debt')
+
+
+def _task_count(tasks):
+    counts = tasks.filter(customer=OuterRef('pk')).order_by().values('customer').annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts), 0)
+
+
+def counter_expressions():
+    """Expressions that compute every counter of ``Customer`` from scratch."""
+    payments = (
+        Payment.objects.filter(task__customer=OuterRef('pk'), amount__gte=0)
+        .order_by()
+        .values('task__customer')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    return {
+        'tasks_count': _task_count(Task.objects.all()),
+        'open_tasks_count': _task_count(Task.objects.exclude(status__in=CLOSED_STATUSES)),
+        'has_debt': debt_exists(),
+        'lifetime_paid': Coalesce(Subquery(payments, output_field=MONEY), ZERO),
+    }
+
+
+def debt_exists():
+    return Exists(Task.objects.filter(customer=OuterRef('pk'), is_debt=True))
+
+
+def refresh_customer_counters(customer_ids):
+    """Recompute the counters of ``customer_ids`` (ids or a ``values()`` queryset) in one UPDATE."""
+    Customer.objects.filter(pk__in=customer_ids).update(**counter_expressions())
+
+
+def task_contribution(values):
+    """What a task with ``values`` (customer_id, status, is_debt) adds to its customer's counters."""
+    if values is None:
+        return None, {'tasks_count': 0, 'open_tasks_count': 0, 'is_debt': 0}
+    return values['customer_id'], {
+        'tasks_count': 1,
+        'open_tasks_count': int(values['status'] not in CLOSED_STATUSES),
+        'is_debt': int(bool(values['is_debt'])),
+    }
+
+
+def apply_task_change(old, new):
+    """
+    Shift customer counters for a task going from ``old`` to ``new`` (dicts
+    of ``TASK_COUNTER_FIELDS``, ``None`` when the task did not or no longer
+    exists) with one ``F()`` UPDATE per customer involved.
+    """
+    old_customer, old_counts = task_contribution(old)
+    new_customer, new_counts = task_contribution(new)
+    if old_customer != new_customer:
+        # Moving a task moves its payments too, so recount both customers.
+        refresh_customer_counters([pk for pk in (old_customer, new_customer) if pk])
+        return
+    deltas = {field: new_counts[field] - old_counts[field] for field in new_counts}
+    if not any(deltas.values()):
+        return
+    updates = {
+        'tasks_count': F('tasks_count') + deltas['tasks_count'],
+        'open_tasks_count': F('open_tasks_count') + deltas['open_tasks_count'],
+    }
+    if deltas['is_debt']:
+        updates['has_debt'] = debt_exists()
+    Customer.objects.filter(pk=new_customer).update(**updates)
+
+
+def shift_lifetime_paid(task_id, delta):
+    """Add ``delta`` to the lifetime_paid of the customer owning task ``task_id``."""
+    if not task_id or not delta:
+        return
+    Customer.objects.filter(pk=Subquery(Task.objects.filter(pk=task_id).values('customer_id'))).update(
+        lifetime_paid=F('lifetime_paid') + Value(delta, output_field=MONEY)
+    )
+
+
+def drifted_customers(queryset=None):
+    """Customers whose stored counters no longer match their tasks and payments."""
+    queryset = Customer.objects.all() if queryset is None else queryset
+    expected = {f'expected_{name}': expression for name, expression in counter_expressions().items()}
+    drift = Q()
+    for name in counter_expressions():
+        drift |= ~Q(**{name: F(f'expected_{name}')})
+    return queryset.annotate(**expected).filter(drift)
+
+
+def reconcile_customer_counters(queryset=None):
+    """
+    Recompute the counters of the drifted customers in ``queryset`` with one
+    set-based UPDATE. Returns the number of customers that were corrected.
+    """
+    customer_ids = list(drifted_customers(queryset).values_list('pk', flat=True))
+    if customer_ids:
+        refresh_customer_counters(customer_ids)
+    return len(customer_ids)
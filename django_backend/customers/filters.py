@@ -0,0 +1,16 @@
+from rest_framework import filters
+from .phones import phone_search_match
+
+
+class CustomerSearchFilter(filters.SearchFilter):
+    """
+    ``search_fields`` matching, plus customers owning a number that
+    contains the query's digits in any format (see ``phone_search_match``).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        results = super().filter_queryset(request, queryset, view)
+        phone_match = phone_search_match(request.query_params.get(self.search_param, ''))
+        if phone_match is None:
+            return results
+        return results | queryset.filter(phone_match)
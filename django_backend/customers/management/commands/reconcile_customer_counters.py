@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from customers.counters import drifted_customers, reconcile_customer_counters
+from customers.models import Customer
+
+class Command(BaseCommand):
+    help = 'Rebuild Customer.tasks_count, open_tasks_count, has_debt and lifetime_paid from tasks and payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--customer',
+            action='append',
+            dest='customers',
+            type=int,
+            help='Only reconcile the customer with this ID. Can be repeated.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted customers without changing them',
+        )
+
+    def handle(self, *args, **options):
+        queryset = Customer.objects.all()
+        if options['customers']:
+            queryset = queryset.filter(pk__in=options['customers'])
+
+        if options['dry_run']:
+            customers = list(drifted_customers(queryset).values_list('pk', 'name'))
+            for pk, name in customers:
+                self.stdout.write(f'{pk} {name}')
+            self.stdout.write(f'{len(customers)} customer(s) have drifted counters.')
+            return
+
+        with transaction.atomic():
+            corrected = reconcile_customer_counters(queryset)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Reconciled counters for {corrected} customer(s).')
+        )
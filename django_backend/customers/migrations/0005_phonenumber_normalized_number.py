@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+def backfill_normalized_numbers(apps, schema_editor):
+    from customers.phones import normalize_phone_number
+
+    PhoneNumber = apps.get_model('customers', 'PhoneNumber')
+    seen = set()
+    phones = []
+    # When formats collide, the oldest number keeps the normalized form; the
+    # others stay NULL until someone merges the duplicate customers.
+    for phone in PhoneNumber.objects.order_by('pk').iterator():
+        number = normalize_phone_number(phone.phone_number)
+        if number in seen:
+            number = None
+        seen.add(number)
+        phone.normalized_number = number
+        phones.append(phone)
+    PhoneNumber.objects.bulk_update(phones, ['normalized_number'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_customer_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='phonenumber',
+            name='normalized_number',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True),
+        ),
+        migrations.RunPython(backfill_normalized_numbers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0005_phonenumber_normalized_number'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='phonenumber',
+            name='normalized_number',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True, unique=True),
+        ),
+    ]
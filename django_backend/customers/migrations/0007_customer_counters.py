@@ -0,0 +1,63 @@
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Exists, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_customer_counters(apps, schema_editor):
+    Customer = apps.get_model('customers', 'Customer')
+    Task = apps.get_model('Eapp', 'Task')
+    Payment = apps.get_model('financials', 'Payment')
+    money = DecimalField(max_digits=12, decimal_places=2)
+
+    def task_count(tasks):
+        counts = tasks.filter(customer=OuterRef('pk')).order_by().values('customer').annotate(total=Count('pk')).values('total')
+        return Coalesce(Subquery(counts), 0)
+
+    payments = (
+        Payment.objects.filter(task__customer=OuterRef('pk'), amount__gte=0)
+        .order_by().values('task__customer').annotate(total=Sum('amount')).values('total')
+    )
+    Customer.objects.update(
+        tasks_count=task_count(Task.objects.all()),
+        open_tasks_count=task_count(Task.objects.exclude(status__in=['Picked Up', 'Terminated'])),
+        has_debt=Exists(Task.objects.filter(customer=OuterRef('pk'), is_debt=True)),
+        lifetime_paid=Coalesce(Subquery(payments, output_field=money), Value(Decimal('0.00'), output_field=money)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0006_phonenumber_normalized_number_unique'),
+        ('Eapp', '0011_task_activity_timeline_idx'),
+        ('financials', '0004_dailyfinancialrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='has_debt',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='lifetime_paid',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='open_tasks_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='tasks_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(condition=models.Q(('has_debt', True)), fields=['id'], name='customer_has_debt_idx'),
+        ),
+        migrations.RunPython(backfill_customer_counters, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
+from .phones import normalize_phone_number
 
 class Customer(models.Model):
     class CustomerType(models.TextChoices):
@@ -15,19 +16,51 @@ class Customer(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Maintained from task and payment changes (see customers/counters.py);
+    # `manage.py reconcile_customer_counters` rebuilds them.
+    tasks_count = models.PositiveIntegerField(default=0, editable=False)
+    open_tasks_count = models.PositiveIntegerField(default=0, editable=False)
+    has_debt = models.BooleanField(default=False, editable=False)
+    lifetime_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Credit customers (stats).
+            models.Index(fields=['id'], name='customer_has_debt_idx', condition=models.Q(has_debt=True)),
+            # New customers per period (acquisition series).
+            models.Index(fields=['created_at'], name='customer_created_at_idx'),
+        ]
 
 class PhoneNumber(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='phone_numbers')
     phone_number = models.CharField(max_length=20, unique=True)
+    # E.164 form of phone_number, so differently formatted numbers match.
+    normalized_number = models.CharField(max_length=16, unique=True, null=True, blank=True, editable=False)
 
     def __str__(self):
         return self.phone_number
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Only a new or retyped number is normalized again: the backfill left
+        # legacy numbers that collide in E.164 form without one on purpose.
+        loaded = getattr(self, '_loaded_values', None) or {}
+        if self._state.adding or loaded.get('phone_number') != self.phone_number:
+            self.normalized_number = normalize_phone_number(self.phone_number)
+            if kwargs.get('update_fields') is not None and 'phone_number' in kwargs['update_fields']:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'normalized_number'}
+        super().save(*args, **kwargs)
+        self._loaded_values = {**loaded, 'phone_number': self.phone_number, 'normalized_number': self.normalized_number}
+
 class Referrer(models.Model):
     name = models.CharField(max_length=100, unique=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
@@ -0,0 +1,105 @@
+import re
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+
+# E.164 numbers have at most 15 digits; fewer than 7 is never a full number.
+MIN_PHONE_DIGITS = 7
+MAX_PHONE_DIGITS = 15
+# Searches need this many digits before they look at phone numbers.
+MIN_PHONE_SEARCH_DIGITS = 3
+
+
+def default_country_code():
+    """Calling code assumed for local numbers (PHONE_COUNTRY_CODE, default Tanzania's 255)."""
+    return getattr(settings, 'PHONE_COUNTRY_CODE', '255')
+
+
+def normalize_phone_number(value, country_code=None):
+    """
+    The E.164 form of ``value`` ("0712 345 678", "+255 712-345-678" and
+    "255712345678" all give "+255712345678"), or ``None`` when it cannot
+    be a full phone number.
+    """
+    value = (value or '').strip()
+    digits = re.sub(r'\D', '', value)
+    country_code = country_code or default_country_code()
+    if value.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    else:
+        # A local number, with or without its trunk 0 or country code.
+        if digits.startswith('0'):
+            digits = digits[1:]
+        elif digits.startswith(country_code) and len(digits) > len(country_code) + MIN_PHONE_DIGITS:
+            digits = digits[len(country_code):]
+        if len(digits) < MIN_PHONE_DIGITS:
+            return None
+        digits = country_code + digits
+    if not MIN_PHONE_DIGITS <= len(digits) <= MAX_PHONE_DIGITS:
+        return None
+    return f'+{digits}'
+
+
+def normalized_numbers(values):
+    """The distinct E.164 forms of ``values``, in order, skipping invalid ones."""
+    numbers = (normalize_phone_number(value) for value in values)
+    return [number for number in dict.fromkeys(numbers) if number]
+
+
+def customers_with_numbers(queryset, numbers):
+    """Customers of ``queryset`` owning any of the E.164 ``numbers``."""
+    from .models import PhoneNumber
+    return queryset.filter(Exists(PhoneNumber.objects.filter(customer=OuterRef('pk'), normalized_number__in=numbers)))
+
+
+def phone_number_match(query):
+    """
+    ``Q`` for phone numbers containing the digits of ``query`` as typed or
+    in E.164 form, so "0712 345" finds "+255712345678". Both columns have
+    trigram indexes. ``None`` when the query has too few digits.
+    """
+    digits = re.sub(r'\D', '', query or '')
+    if len(digits) < MIN_PHONE_SEARCH_DIGITS:
+        return None
+    # Without its trunk or international 0s, the digits sit inside the E.164 form.
+    match = Q(phone_number__contains=digits) | Q(normalized_number__contains=digits.lstrip('0') or digits)
+    number = normalize_phone_number(query)
+    if number:
+        match |= Q(normalized_number=number)
+    return match
+
+
+def phone_search_match(query):
+    """``Exists`` for customers with a number matching ``phone_number_match``, or ``None``."""
+    from .models import PhoneNumber
+    match = phone_number_match(query)
+    if match is None:
+        return None
+    return Exists(PhoneNumber.objects.filter(match, customer=OuterRef('pk')))
+
+
+def resolve_customer(values):
+    """
+    The customer owning any of the phone numbers in ``values``, in one
+    ``IN`` query on the normalized and raw indexes; the raw match finds
+    legacy numbers stored without a normalized form. Earlier numbers win
+    when they belong to different customers. ``None`` when none matches.
+    """
+    from .models import PhoneNumber
+    values = [value for value in values if value]
+    if not values:
+        return None
+    owners = {}
+    phones = PhoneNumber.objects.select_related('customer').filter(
+        Q(normalized_number__in=normalized_numbers(values)) | Q(phone_number__in=values)
+    )
+    for phone in phones:
+        owners[phone.phone_number] = phone.customer
+        if phone.normalized_number:
+            owners[phone.normalized_number] = phone.customer
+    for value in values:
+        for key in (value, normalize_phone_number(value)):
+            if key in owners:
+                return owners[key]
+    return None
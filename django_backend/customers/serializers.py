@@ -1,5 +1,7 @@
+from django.db.models import Q
 from rest_framework import serializers
 from .models import Customer, PhoneNumber, Referrer
+from .phones import normalize_phone_number
 from Eapp.models import Task
 
 
@@ -7,19 +9,57 @@ class PhoneNumberSerializer(serializers.ModelSerializer):
     class Meta:
         model = PhoneNumber
         fields = ['id', 'phone_number']
+        # A customer sends its own numbers back on every edit; the customer
+        # serializer checks the new ones against other customers instead.
+        extra_kwargs = {'phone_number': {'validators': []}}
 
 
 class CustomerSerializer(serializers.ModelSerializer):
     phone_numbers = PhoneNumberSerializer(many=True)
-    has_debt = serializers.SerializerMethodField()
-    tasks_count = serializers.ReadOnlyField()
 
     class Meta:
         model = Customer
-        fields = ['id', 'name', 'customer_type', 'phone_numbers', 'has_debt', 'tasks_count']
-
-    def get_has_debt(self, obj):
-        return obj.tasks.filter(is_debt=True).exists()
+        fields = ['id', 'name', 'customer_type', 'phone_numbers', 'has_debt', 'tasks_count', 'open_tasks_count', 'lifetime_paid']
+        read_only_fields = ['has_debt', 'tasks_count', 'open_tasks_count', 'lifetime_paid']
+
+    def validate_phone_numbers(self, value):
+        """
+        New or retyped numbers must not belong to another customer in any
+        format. The customer's numbers sent back unchanged are not checked,
+        so legacy ones without a normalized form (format duplicates left by
+        the backfill, numbers too short to normalize) do not block edits.
+        Numbers that cannot be normalized are stored without that form.
+        """
+        current = {}
+        if self.instance is not None:
+            current = {phone.phone_number: phone.normalized_number for phone in self.instance.phone_numbers.all()}
+        listed = [current[data.get('phone_number')] for data in value if data.get('phone_number') in current]
+        texts, numbers = [], []
+        for phone_number_data in value:
+            text = phone_number_data.get('phone_number')
+            if text in current:
+                continue
+            if text in texts:
+                raise serializers.ValidationError(f"{text} is listed twice.")
+            texts.append(text)
+            number = normalize_phone_number(text)
+            if number is None:
+                continue
+            if number in listed:
+                raise serializers.ValidationError(f"{text} is listed twice.")
+            listed.append(number)
+            numbers.append(number)
+        if not texts:
+            return value
+        taken = PhoneNumber.objects.filter(
+            Q(normalized_number__in=numbers) | Q(phone_number__in=texts)
+        ).select_related('customer')
+        if self.instance is not None:
+            taken = taken.exclude(customer=self.instance)
+        phone = taken.first()
+        if phone is not None:
+            raise serializers.ValidationError(f"{phone.phone_number} already belongs to {phone.customer.name}.")
+        return value
 
     def create(self, validated_data):
         phone_numbers_data = validated_data.pop('phone_numbers')
@@ -34,26 +74,37 @@ class CustomerSerializer(serializers.ModelSerializer):
         instance.customer_type = validated_data.get('customer_type', instance.customer_type)
         instance.save()
 
-        # Get existing phone numbers
-        existing_phone_numbers = {str(pn.id): pn for pn in instance.phone_numbers.all()}
-
-        # Update or create phone numbers
+        # Match each number to an existing row by id, its text, or its
+        # normalized form so re-typing a number in another format updates
+        # it in place.
+        existing = {str(pn.id): pn for pn in instance.phone_numbers.all()}
+        by_text = {pn.phone_number: pn for pn in existing.values()}
+        by_number = {pn.normalized_number: pn for pn in existing.values() if pn.normalized_number}
+        matched, kept = [], set()
         for phone_number_data in phone_numbers_data:
-            phone_number_id = phone_number_data.get('id')
-            if phone_number_id:
-                # If phone number has an ID, it's an existing one
-                phone_number = existing_phone_numbers.pop(str(phone_number_id), None)
-                if phone_number:
-                    # Update existing phone number
-                    phone_number.phone_number = phone_number_data.get('phone_number', phone_number.phone_number)
-                    phone_number.save()
-            else:
-                # If phone number has no ID, it's a new one
-                PhoneNumber.objects.get_or_create(customer=instance, **phone_number_data)
-
-        # Remove phone numbers that are no longer in the list
-        for phone_number in existing_phone_numbers.values():
-            phone_number.delete()
+            phone_number = existing.get(str(phone_number_data.get('id')))
+            if phone_number is None:
+                phone_number = by_text.get(phone_number_data.get('phone_number'))
+            if phone_number is None:
+                phone_number = by_number.get(normalize_phone_number(phone_number_data.get('phone_number')))
+            if phone_number is not None and phone_number.pk in kept:
+                phone_number = None
+            if phone_number is not None:
+                kept.add(phone_number.pk)
+            matched.append((phone_number, phone_number_data))
+
+        # Remove the numbers that are no longer listed first, so their
+        # normalized forms are free for the rows below.
+        for phone_number in existing.values():
+            if phone_number.pk not in kept:
+                phone_number.delete()
+
+        for phone_number, phone_number_data in matched:
+            if phone_number is None:
+                PhoneNumber.objects.create(customer=instance, phone_number=phone_number_data['phone_number'])
+            elif phone_number.phone_number != phone_number_data.get('phone_number', phone_number.phone_number):
+                phone_number.phone_number = phone_number_data['phone_number']
+                phone_number.save()
 
         return instance
 
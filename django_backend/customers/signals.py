@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from Eapp.models import Task
+from financials.models import CostBreakdown, Payment
+from .acquisition import invalidate_acquisition_cache
+from .counters import TASK_COUNTER_FIELDS, apply_task_change, refresh_customer_counters
+from .models import Customer
+from .summary import invalidate_customer_summaries
+
+
+# Connected before the counters, which refresh _loaded_values, so a moved
+# task clears its previous customer's summary too.
+@receiver([post_save, post_delete], sender=Task)
+def invalidate_summary_on_task_change(sender, instance, **kwargs):
+    customer_ids = {(getattr(instance, '_loaded_values', None) or {}).get('customer_id')}
+    if 'customer_id' not in instance.get_deferred_fields():
+        customer_ids.add(instance.customer_id)
+    transaction.on_commit(lambda: invalidate_customer_summaries(customer_ids))
+
+
+@receiver([post_save, post_delete], sender=Task)
+def update_customer_counters_on_task_change(sender, instance, **kwargs):
+    deleted = kwargs['signal'] is post_delete
+    if instance.get_deferred_fields() & set(TASK_COUNTER_FIELDS):
+        # The task was saved without loading these fields; recount its
+        # customer from the row. Deletes are left to reconcile_customer_counters.
+        if not deleted:
+            refresh_customer_counters(Task.objects.filter(pk=instance.pk).values('customer_id'))
+        return
+
+    current = {field: getattr(instance, field) for field in TASK_COUNTER_FIELDS}
+    loaded = getattr(instance, '_loaded_values', None)
+    if kwargs.get('created', False):
+        apply_task_change(None, current)
+    elif loaded is not None and all(field in loaded for field in TASK_COUNTER_FIELDS):
+        apply_task_change({field: loaded[field] for field in TASK_COUNTER_FIELDS}, None if deleted else current)
+    elif not deleted:
+        # Saved without having been loaded from the DB: the old values are unknown.
+        refresh_customer_counters([current['customer_id']])
+    instance._loaded_values = None if deleted else {**(loaded or {}), **current}
+
+
+@receiver(post_save, sender=Customer)
+def invalidate_summary_on_customer_change(sender, instance, **kwargs):
+    # The summary carries the customer's own name and type too.
+    transaction.on_commit(lambda: invalidate_customer_summaries([instance.pk]))
+
+
+@receiver(post_delete, sender=Customer)
+def invalidate_acquisition_on_customer_delete(sender, **kwargs):
+    # New customers only land in the current bucket, but a deletion can
+    # empty a closed one, whose count is cached without expiry.
+    invalidate_acquisition_cache()
+
+
+@receiver([post_save, post_delete], sender=Payment)
+@receiver([post_save, post_delete], sender=CostBreakdown)
+def invalidate_summary_on_task_money_change(sender, instance, **kwargs):
+    if instance.task_id is None:
+        return
+    # Looked up after the commit; when the task went with it, the task's own
+    # delete has already cleared its customer.
+    tasks = Task.objects.filter(pk=instance.task_id)
+    transaction.on_commit(lambda: invalidate_customer_summaries(tasks.values_list('customer_id', flat=True)))
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from Eapp.models import Task
+from financials.models import Payment
+from .counters import CLOSED_STATUSES, MONEY, ZERO
+from .models import Customer
+
+# Task history columns; the customer is the one being summarised.
+SUMMARY_TASK_FIELDS = [
+    'id', 'title', 'status', 'urgency', 'payment_status', 'workshop_status',
+    'current_location', 'laptop_model', 'description', 'updated_at', 'assigned_to_details', 'outstanding_balance',
+]
+
+
+def customer_summary_cache_ttl():
+    """Seconds a customer summary may be served from cache (CUSTOMER_SUMMARY_CACHE_TTL, default 300)."""
+    return getattr(settings, 'CUSTOMER_SUMMARY_CACHE_TTL', 300)
+
+
+def _version_key(customer_id):
+    return f'customers:summary:version:{customer_id}'
+
+
+def customer_summary_cache_key(customer_id, *parts):
+    # Keys embed the customer's version, so bumping it drops all their pages.
+    version = cache.get_or_set(_version_key(customer_id), 1, timeout=None)
+    return ':'.join(['customers:summary', str(customer_id), str(version), *(str(part) for part in parts)])
+
+
+def invalidate_customer_summaries(customer_ids):
+    for customer_id in set(customer_ids) - {None}:
+        try:
+            cache.incr(_version_key(customer_id))
+        except ValueError:
+            cache.set(_version_key(customer_id), 1, timeout=None)
+
+
+def customer_summary_queryset():
+    """
+    Customers annotated with everything the summary shows, aggregated over
+    their tasks in one query. Spend and balances come from the task totals
+    the ledger keeps from payments; the last payment is a subquery, so the
+    payments join does not multiply the task sums.
+    """
+    debt = Q(tasks__status=Task.Status.PICKED_UP) & ~Q(tasks__payment_status=Task.PaymentStatus.FULLY_PAID)
+    last_payment = Payment.objects.filter(task__customer=OuterRef('pk')).order_by('-date').values('date')[:1]
+    return Customer.objects.annotate(
+        total_tasks=Count('tasks'),
+        open_devices=Count('tasks', filter=~Q(tasks__status__in=CLOSED_STATUSES)),
+        lifetime_spend=Coalesce(Sum('tasks__paid_amount'), ZERO, output_field=MONEY),
+        outstanding_debt=Coalesce(Sum(F('tasks__total_cost') - F('tasks__paid_amount'), filter=debt), ZERO, output_field=MONEY),
+        last_visit=Max('tasks__date_in'),
+        last_pickup=Max('tasks__date_out'),
+        last_payment=Subquery(last_payment),
+    )
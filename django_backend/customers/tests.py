@@ -1,9 +1,20 @@
+from decimal import Decimal
+from datetime import date, datetime, timezone
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
-from customers.models import Customer, PhoneNumber
-from Eapp.models import User
+from common.testing import QueryBudgetMixin
+from customers.acquisition import acquisition_series, invalidate_acquisition_cache
+from customers.models import Customer, PhoneNumber, Referrer
+from customers.phones import normalize_phone_number, resolve_customer
+from common.search import search
+from Eapp.models import Task, User
+from financials.models import Payment, PaymentMethod
 
 class CustomerAPITests(APITestCase):
     def setUp(self):
@@ -23,4 +34,344 @@ class CustomerAPITests(APITestCase):
         url = reverse('customer-search')
         response = self.client.get(url, {'query': 'Test'}, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
\ No newline at end of file
+        self.assertEqual(len(response.data), 2)
+
+class CustomerQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword', email='test@gmail.com', first_name='test', last_name='user', role='Manager')
+        self.client.force_authenticate(user=self.user)
+        self.customer = Customer.objects.create(name='Test Customer')
+
+    def add_customer_rows(self, customer, count):
+        for _ in range(count):
+            PhoneNumber.objects.create(customer=customer, phone_number=f'07{PhoneNumber.objects.count():08d}')
+            Task.objects.create(
+                title=f'A1-{Task.objects.count():03d}', customer=customer, created_by=self.user,
+                laptop_model='X1', current_location='Front Desk', is_debt=True,
+            )
+
+    def test_customer_list(self):
+        def add_rows(count):
+            for i in range(count):
+                self.add_customer_rows(Customer.objects.create(name=f'Customer {i}'), 1)
+
+        # Count, customers with their stored counters, phone numbers.
+        self.assertQueryBudget(3, add_rows, reverse('customer-list'), {'page_size': 100})
+
+    def test_customer_detail(self):
+        self.assertQueryBudget(
+            2, lambda count: self.add_customer_rows(self.customer, count),
+            reverse('customer-detail', args=[self.customer.pk]),
+        )
+
+    def test_referrer_list(self):
+        def add_rows(count):
+            for _ in range(count):
+                Referrer.objects.create(name=f'Referrer {Referrer.objects.count()}')
+
+        self.assertQueryBudget(1, add_rows, reverse('referrer-list'))
+
+    def test_list_reads_has_debt_from_the_counters(self):
+        self.add_customer_rows(self.customer, 1)
+        Customer.objects.create(name='Other Customer')
+        response = self.client.get(reverse('customer-list'))
+        self.assertEqual(
+            {customer['name']: customer['has_debt'] for customer in response.data['results']},
+            {'Other Customer': False, 'Test Customer': True},
+        )
+
+
+class CustomerCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='frontdesk', password='testpassword', email='frontdesk@gmail.com', first_name='Front', last_name='Desk', role='Front Desk')
+        self.customer = Customer.objects.create(name='Test Customer')
+        self.method = PaymentMethod.objects.create(name='Cash')
+
+    def create_task(self, **fields):
+        return Task.objects.create(
+            title=f'A1-{Task.objects.count():03d}', customer=self.customer, created_by=self.user,
+            laptop_model='X1', current_location='Front Desk', **fields,
+        )
+
+    def assertCounters(self, tasks_count, open_tasks_count, has_debt, lifetime_paid, customer=None):
+        customer = Customer.objects.get(pk=(customer or self.customer).pk)
+        self.assertEqual(
+            (customer.tasks_count, customer.open_tasks_count, customer.has_debt, customer.lifetime_paid),
+            (tasks_count, open_tasks_count, has_debt, Decimal(lifetime_paid)),
+        )
+
+    def test_task_changes_shift_the_counters(self):
+        task = self.create_task()
+        self.create_task(is_debt=True)
+        self.assertCounters(2, 2, True, '0.00')
+
+        task.status = Task.Status.PICKED_UP
+        task.save()
+        self.assertCounters(2, 1, True, '0.00')
+
+        Task.objects.get(is_debt=True).delete()
+        self.assertCounters(1, 0, False, '0.00')
+
+    def test_moving_a_task_recounts_both_customers(self):
+        task = self.create_task(is_debt=True)
+        Payment.objects.create(task=task, amount=Decimal('40.00'), method=self.method)
+        other = Customer.objects.create(name='Other Customer')
+
+        task.customer = other
+        task.save()
+        self.assertCounters(0, 0, False, '0.00')
+        self.assertCounters(1, 1, True, '40.00', customer=other)
+
+    def test_payments_add_to_lifetime_paid(self):
+        task = self.create_task()
+        payment = Payment.objects.create(task=task, amount=Decimal('40.00'), method=self.method)
+        Payment.objects.create(task=task, amount=Decimal('-15.00'), method=self.method)
+        self.assertCounters(1, 1, False, '40.00')
+
+        payment.amount = Decimal('60.00')
+        payment.save()
+        self.assertCounters(1, 1, False, '60.00')
+
+        payment.delete()
+        self.assertCounters(1, 1, False, '0.00')
+
+    def test_reconcile_command_repairs_drifted_counters(self):
+        task = self.create_task(is_debt=True)
+        Payment.objects.create(task=task, amount=Decimal('25.00'), method=self.method)
+        Customer.objects.update(tasks_count=0, open_tasks_count=0, has_debt=False, lifetime_paid=0)
+
+        out = StringIO()
+        call_command('reconcile_customer_counters', '--dry-run', stdout=out)
+        self.assertIn('Test Customer', out.getvalue())
+        self.assertCounters(0, 0, False, '0.00')
+
+        call_command('reconcile_customer_counters', stdout=StringIO())
+        self.assertCounters(1, 1, True, '25.00')
+
+        out = StringIO()
+        call_command('reconcile_customer_counters', stdout=out)
+        self.assertIn('0 customer(s)', out.getvalue())
+
+
+class PhoneNumberResolutionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='frontdesk', password='testpassword', email='frontdesk@gmail.com', first_name='Front', last_name='Desk', role='Front Desk')
+        self.client.force_authenticate(user=self.user)
+        self.customer = Customer.objects.create(name='Amina Juma')
+        PhoneNumber.objects.create(customer=self.customer, phone_number='0712 345 678')
+
+    def test_numbers_normalize_to_e164(self):
+        for value in ['0712345678', '0712-345-678', '+255 712 345 678', '255712345678', '712345678', '00255712345678']:
+            self.assertEqual(normalize_phone_number(value), '+255712345678', value)
+        self.assertEqual(normalize_phone_number('+1 (415) 555-0100'), '+14155550100')
+        self.assertIsNone(normalize_phone_number('12345'))
+        self.assertEqual(PhoneNumber.objects.get().normalized_number, '+255712345678')
+
+    def test_resolver_matches_any_number_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            customer = resolve_customer(['0655 000 111', '+255712345678'])
+        self.assertEqual(customer, self.customer)
+        self.assertEqual(len(queries), 1)
+        self.assertIsNone(resolve_customer(['0655 000 111']))
+
+    def test_search_matches_numbers_in_any_format(self):
+        Customer.objects.create(name='Someone Else')
+        for query in ['0712 345 678', '+255712345678', '712-345', '0712 345']:
+            response = self.client.get(reverse('customer-list'), {'search': query})
+            self.assertEqual([customer['name'] for customer in response.data['results']], ['Amina Juma'], query)
+        self.assertEqual([result['label'] for result in search('255 712 345 678')], ['Amina Juma'])
+
+    def test_resolve_endpoint(self):
+        response = self.client.get(reverse('customer-resolve'), {'phone': '255712345678,0655000111'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['numbers'], ['+255712345678', '+255655000111'])
+        self.assertEqual([customer['name'] for customer in response.data['customers']], ['Amina Juma'])
+
+    def test_numbers_of_another_customer_are_rejected_in_any_format(self):
+        response = self.client.post(reverse('customer-list'), {
+            'name': 'Someone Else', 'phone_numbers': [{'phone_number': '+255712345678'}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('already belongs to Amina Juma', str(response.data['phone_numbers']))
+
+    def test_own_number_can_be_retyped_in_another_format(self):
+        response = self.client.put(reverse('customer-detail', args=[self.customer.pk]), {
+            'name': 'Amina Juma', 'phone_numbers': [{'phone_number': '+255712345678'}, {'phone_number': '0655 000 111'}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(
+            sorted(self.customer.phone_numbers.values_list('phone_number', 'normalized_number')),
+            [('+255712345678', '+255712345678'), ('0655 000 111', '+255655000111')],
+        )
+
+    def legacy_duplicate(self):
+        # As the backfill leaves a number colliding with an older one in E.164 form.
+        customer = Customer.objects.create(name='Amina J.')
+        phone = PhoneNumber.objects.create(customer=customer, phone_number='0655 000 111')
+        PhoneNumber.objects.filter(pk=phone.pk).update(phone_number='+255 712 345 678', normalized_number=None)
+        return customer
+
+    def test_legacy_duplicates_do_not_block_edits(self):
+        customer = self.legacy_duplicate()
+        response = self.client.put(reverse('customer-detail', args=[customer.pk]), {
+            'name': 'Amina Juma (2)', 'phone_numbers': [{'phone_number': '+255 712 345 678'}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(list(customer.phone_numbers.values_list('normalized_number', flat=True)), [None])
+
+        phone = PhoneNumber.objects.get(customer=customer)
+        phone.save()
+        phone.refresh_from_db()
+        self.assertIsNone(phone.normalized_number)
+
+    def test_numbers_that_cannot_be_normalized_are_kept(self):
+        response = self.client.post(reverse('customer-list'), {
+            'name': 'Short Number', 'phone_numbers': [{'phone_number': '12345'}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertIsNone(PhoneNumber.objects.get(phone_number='12345').normalized_number)
+
+    def test_intake_finds_numbers_stored_without_a_normalized_form(self):
+        customer = self.legacy_duplicate()
+        self.assertEqual(resolve_customer(['+255 712 345 678']), customer)
+        self.assertEqual(resolve_customer(['0712345678']), self.customer)
+
+    def test_intake_reuses_the_customer_whatever_the_format(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('task-list'), {
+                'customer': {'name': 'Amina', 'phone_numbers': [{'phone_number': '+255 712 345 678'}]},
+                'laptop_model': 'X1', 'current_location': 'Front Desk',
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertFalse(response.data['customer_created'])
+        self.assertEqual(Customer.objects.count(), 1)
+
+
+class CustomerAcquisitionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        self.client.force_authenticate(user=self.user)
+        invalidate_acquisition_cache()
+
+    def create_customer(self, created_at):
+        customer = Customer.objects.create(name=f'Customer {Customer.objects.count()}')
+        Customer.objects.filter(pk=customer.pk).update(created_at=created_at)
+        return customer
+
+    def test_months_follow_the_calendar_across_years(self):
+        self.create_customer(datetime(2023, 12, 10, tzinfo=timezone.utc))
+        self.create_customer(datetime(2024, 12, 10, tzinfo=timezone.utc))
+        # 22:00 UTC on New Year's Eve is already January in the shop.
+        self.create_customer(datetime(2024, 12, 31, 22, tzinfo=timezone.utc))
+        self.assertEqual(acquisition_series(date(2024, 11, 15), date(2025, 2, 1), 'month'), [
+            (date(2024, 11, 1), 0), (date(2024, 12, 1), 1), (date(2025, 1, 1), 1), (date(2025, 2, 1), 0),
+        ])
+
+    def test_weeks_start_on_monday(self):
+        self.create_customer(datetime(2025, 3, 9, 12, tzinfo=timezone.utc))
+        self.create_customer(datetime(2025, 3, 10, 12, tzinfo=timezone.utc))
+        response = self.client.get(reverse('customer-acquisition'), {'granularity': 'week', 'start': '2025-03-05', 'end': '2025-03-12'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [
+            {'period': date(2025, 3, 3), 'customers': 1},
+            {'period': date(2025, 3, 10), 'customers': 1},
+        ])
+
+    def test_closed_buckets_are_served_from_cache_until_a_customer_is_deleted(self):
+        customer = self.create_customer(datetime(2024, 5, 2, 12, tzinfo=timezone.utc))
+        self.assertEqual(acquisition_series(date(2024, 5, 1), date(2024, 5, 3), 'day')[1], (date(2024, 5, 2), 1))
+        with self.assertNumQueries(0):
+            self.assertEqual(acquisition_series(date(2024, 5, 1), date(2024, 5, 3), 'day')[1], (date(2024, 5, 2), 1))
+
+        customer.delete()
+        self.assertEqual(acquisition_series(date(2024, 5, 1), date(2024, 5, 3), 'day')[1], (date(2024, 5, 2), 0))
+
+    def test_current_bucket_is_always_counted(self):
+        self.client.get(reverse('customer-acquisition'))
+        Customer.objects.create(name='New Customer')
+        response = self.client.get(reverse('customer-acquisition'))
+        self.assertEqual(len(response.data), 12)
+        self.assertEqual(response.data[-1]['customers'], 1)
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in [{'granularity': 'year'}, {'start': 'soon'}, {'end': 'later'}, {'start': '2025-02-01', 'end': '2025-01-01'}, {'granularity': 'day', 'start': '2000-01-01'}]:
+            response = self.client.get(reverse('customer-acquisition'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class CustomerSummaryTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='frontdesk', password='testpassword', email='frontdesk@gmail.com', first_name='Front', last_name='Desk', role='Front Desk')
+        self.client.force_authenticate(user=self.user)
+        self.customer = Customer.objects.create(name='Repair Shop')
+        self.method = PaymentMethod.objects.create(name='Cash')
+        self.url = reverse('customer-summary', args=[self.customer.pk])
+
+    def create_task(self, **fields):
+        return Task.objects.create(
+            title=f'A1-{Task.objects.count():03d}', customer=self.customer, created_by=self.user,
+            laptop_model='X1', current_location='Front Desk', **fields,
+        )
+
+    def test_summary_aggregates_tasks_and_payments(self):
+        picked_up = self.create_task(
+            status=Task.Status.PICKED_UP, estimated_cost=Decimal('100.00'), total_cost=Decimal('100.00'), date_in=date(2025, 1, 5),
+        )
+        self.create_task(estimated_cost=Decimal('50.00'), total_cost=Decimal('50.00'), date_in=date(2025, 2, 1))
+        Payment.objects.create(task=picked_up, amount=Decimal('30.00'), method=self.method, date=date(2025, 1, 20))
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {name: response.data[name] for name in ['total_tasks', 'open_devices', 'lifetime_spend', 'outstanding_debt', 'last_visit', 'last_payment']},
+            {
+                'total_tasks': 2, 'open_devices': 1, 'lifetime_spend': Decimal('30.00'),
+                'outstanding_debt': Decimal('70.00'), 'last_visit': date(2025, 2, 1), 'last_payment': date(2025, 1, 20),
+            },
+        )
+        self.assertEqual([task['title'] for task in response.data['tasks']['results']], ['A1-001', 'A1-000'])
+
+    def test_task_history_is_paged_by_cursor(self):
+        for _ in range(3):
+            self.create_task()
+        first = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual([task['title'] for task in first.data['tasks']['results']], ['A1-002', 'A1-001'])
+        second = self.client.get(first.data['tasks']['next'])
+        self.assertEqual([task['title'] for task in second.data['tasks']['results']], ['A1-000'])
+
+    def test_summary_is_cached_until_the_customer_changes(self):
+        task = self.create_task()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(task=task, amount=Decimal('25.00'), method=self.method)
+        self.assertEqual(self.client.get(self.url).data['lifetime_spend'], Decimal('25.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            task.status = Task.Status.PICKED_UP
+            task.save()
+        self.assertEqual(self.client.get(self.url).data['open_devices'], 0)
+
+    def test_other_customers_keep_their_cache(self):
+        other = Customer.objects.create(name='Other Customer')
+        other_url = reverse('customer-summary', args=[other.pk])
+        self.client.get(other_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_task()
+        with self.assertNumQueries(0):
+            self.client.get(other_url)
+
+    def test_renaming_the_customer_clears_the_summary(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('customer-detail', args=[self.customer.pk]), {'name': 'Repair Shop Ltd', 'phone_numbers': []}, format='json')
+        self.assertEqual(self.client.get(self.url).data['name'], 'Repair Shop Ltd')
+
+    def test_unknown_customer(self):
+        response = self.client.get(reverse('customer-summary', args=[self.customer.pk + 100]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse('customer-summary', args=['abc']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -1,67 +1,114 @@
-from django.db.models import Count
-from rest_framework import viewsets, permissions, filters
+from django.core.cache import cache
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_date
+from rest_framework import viewsets, permissions, status
+from .acquisition import GRANULARITIES, MAX_BUCKETS, acquisition_series, bucket_count, default_start, today
+from .filters import CustomerSearchFilter
 from .models import Customer, Referrer
+from .phones import customers_with_numbers, normalized_numbers
 from .serializers import CustomerSerializer, ReferrerSerializer
+from .summary import SUMMARY_TASK_FIELDS, customer_summary_cache_key, customer_summary_cache_ttl, customer_summary_queryset
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from Eapp.pagination import StandardResultsSetPagination
+from Eapp.models import Task
+from Eapp.pagination import CustomerTaskHistoryPagination, StandardResultsSetPagination
+from Eapp.serializers import TaskListSerializer
 
 class CustomerViewSet(viewsets.ModelViewSet):
-    queryset = Customer.objects.annotate(tasks_count=Count('tasks')).order_by('name')
+    queryset = Customer.objects.prefetch_related('phone_numbers').order_by('name')
     serializer_class = CustomerSerializer
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = StandardResultsSetPagination
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['name', 'phone_numbers__phone_number']
+    cursor_ordering = ('name', 'id')
+    filter_backends = [CustomerSearchFilter]
+    # Phone numbers are matched by CustomerSearchFilter, in any format.
+    search_fields = ['name']
 
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        credit_customers_count = Customer.objects.filter(tasks__is_debt=True).distinct().count()
+        credit_customers_count = Customer.objects.filter(has_debt=True).count()
         data = {
             'credit_customers_count': credit_customers_count
         }
         return Response(data)
 
     @action(detail=False, methods=['get'])
-    def monthly_acquisition(self, request):
+    def resolve(self, request):
         """
-        Provides monthly customer acquisition data for the last 12 months.
+        Existing customers owning any of the ``phone`` numbers (repeat the
+        parameter or separate them with commas), in any format. Built for
+        the intake form to call as numbers are typed.
         """
-        from django.db.models.functions import TruncMonth
-        from django.utils import timezone
-        import calendar
+        values = [value for param in request.query_params.getlist('phone') for value in param.split(',')]
+        numbers = normalized_numbers(values)
+        customers = customers_with_numbers(self.get_queryset(), numbers) if numbers else Customer.objects.none()
+        serializer = self.get_serializer(customers, many=True)
+        return Response({'numbers': numbers, 'customers': serializer.data})
 
-        # Get the last 12 months
-        today = timezone.now()
-        months = [(today - timezone.timedelta(days=30 * i)).strftime('%Y-%m-01') for i in range(12)]
-        months.reverse()
-
-        # Query to get monthly customer counts
-        acquisition_data = (
-            Customer.objects
-            .filter(created_at__gte=months[0])
-            .annotate(month=TruncMonth('created_at'))
-            .values('month')
-            .annotate(customers=Count('id'))
-            .order_by('month')
-        )
-
-        # Create a dictionary for quick lookup
-        data_map = {item['month'].strftime('%b'): item['customers'] for item in acquisition_data}
+    @action(detail=True, methods=['get'])
+    def summary(self, request, pk=None):
+        """
+        Everything staff need when the customer calls: open devices,
+        lifetime spend, outstanding debt, last visit and payment, and their
+        tasks newest first (paged by cursor). Cached until one of the
+        customer's tasks or payments changes.
+        """
+        if not str(pk).isdigit():
+            raise Http404
+        key = customer_summary_cache_key(int(pk), request.query_params.urlencode())
+        data = cache.get(key)
+        if data is None:
+            customer = get_object_or_404(customer_summary_queryset(), pk=pk)
+            tasks = TaskListSerializer.shape_queryset(
+                Task.objects.filter(customer=customer), SUMMARY_TASK_FIELDS, extra_columns=['created_at']
+            )
+            paginator = CustomerTaskHistoryPagination()
+            page = paginator.paginate_queryset(tasks, request, view=self)
+            history = TaskListSerializer(page, many=True, context={'request': request, 'fields': SUMMARY_TASK_FIELDS})
+            data = {
+                'id': customer.pk,
+                'name': customer.name,
+                'customer_type': customer.customer_type,
+                'total_tasks': customer.total_tasks,
+                'open_devices': customer.open_devices,
+                'lifetime_spend': customer.lifetime_spend,
+                'outstanding_debt': customer.outstanding_debt,
+                'last_visit': customer.last_visit,
+                'last_pickup': customer.last_pickup,
+                'last_payment': customer.last_payment,
+                'tasks': paginator.get_paginated_response(history.data).data,
+            }
+            cache.set(key, data, timeout=customer_summary_cache_ttl())
+        return Response(data)
 
-        # Format the data for the chart
-        chart_data = []
-        for i in range(12):
-            month_date = today - timezone.timedelta(days=30 * i)
-            month_abbr = calendar.month_abbr[month_date.month]
-            chart_data.append({
-                'month': month_abbr,
-                'customers': data_map.get(month_abbr, 0)
-            })
-        
-        chart_data.reverse() # To have the current month at the end
+    @action(detail=False, methods=['get'])
+    def acquisition(self, request):
+        """
+        New customers per calendar ``granularity`` bucket (day, week or
+        month, default month) from ``start`` to ``end`` (ISO dates; default
+        the last 12 buckets up to today). Every bucket is listed, empty
+        ones with 0.
+        """
+        granularity = request.query_params.get('granularity', 'month')
+        if granularity not in GRANULARITIES:
+            return Response({'error': f"granularity must be one of {', '.join(GRANULARITIES)}."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            end = parse_date(request.query_params['end']) if 'end' in request.query_params else today()
+            start = parse_date(request.query_params['start']) if 'start' in request.query_params else end and default_start(end, granularity)
+        except ValueError:
+            start = end = None
+        if start is None or end is None:
+            return Response({'error': 'start and end must be ISO dates.'}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end:
+            return Response({'error': 'start must not be after end.'}, status=status.HTTP_400_BAD_REQUEST)
+        if bucket_count(start, end, granularity) > MAX_BUCKETS:
+            return Response({'error': f'At most {MAX_BUCKETS} buckets can be requested.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(chart_data)
+        return Response([
+            {'period': bucket, 'customers': count}
+            for bucket, count in acquisition_series(start, end, granularity)
+        ])
 
 class ReferrerViewSet(viewsets.ModelViewSet):
     queryset = Referrer.objects.all()
@@ -0,0 +1,168 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+from django.db import connection, transaction
+from django.db.models import F
+from Eapp.models import Task
+from common.lookups import lookup_rows
+from customers.counters import refresh_customer_counters
+from customers.summary import invalidate_customer_summaries
+from .ledger import payment_status_updates
+from .models import Account, Payment, PaymentCategory, PaymentMethod
+from .rollups import apply_payment_rollups
+from .serializers import PaymentImportSerializer
+
+IMPORT_FORMATS = ('csv', 'json', 'ndjson')
+
+
+def read_payment_rows(stream, fmt):
+    """
+    Yield one dict per statement row. ``csv`` and ``ndjson`` are read line by
+    line so large statements are never held in memory; ``json`` expects a
+    top-level array.
+    """
+    if isinstance(stream, (io.RawIOBase, io.BufferedIOBase)) or hasattr(stream, 'chunks'):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'ndjson':
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    elif fmt == 'json':
+        yield from json.load(stream)
+    else:
+        raise ValueError(f"Unsupported format '{fmt}'. Use one of: {', '.join(IMPORT_FORMATS)}.")
+
+
+def _quoted_table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+class PaymentImporter:
+    """
+    Imports payments in batches with ``bulk_create``. ``bulk_create`` does
+    not send post_save, so the per-row account and task signals never run;
+    instead each batch finishes with grouped ``UPDATE ... FROM (SELECT ...
+    GROUP BY)`` statements for the accounts and tasks it touched, and one
+    grouped upsert into the daily financial rollups.
+    """
+
+    def __init__(self, batch_size=500, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.methods = {method.name: method for method in lookup_rows(PaymentMethod)}
+        self.categories = {category.name: category for category in lookup_rows(PaymentCategory)}
+
+    def run(self, rows):
+        started = time.monotonic()
+        created = 0
+        errors = []
+        row_number = 0
+        rows = iter(rows)
+
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            payments = []
+            lookups = {
+                'task': self._tasks_for(batch),
+                'method': self.methods,
+                'category': self.categories,
+            }
+            for row in batch:
+                row_number += 1
+                serializer = PaymentImportSerializer(data=self._clean_row(row), context={'lookups': lookups})
+                if serializer.is_valid():
+                    payments.append(Payment(**serializer.validated_data))
+                else:
+                    errors.append({'row': row_number, 'errors': serializer.errors})
+
+            if payments and not self.dry_run:
+                self._save_batch(payments)
+            created += len(payments)
+
+        elapsed = time.monotonic() - started
+        return {
+            'rows': row_number,
+            'created': 0 if self.dry_run else created,
+            'valid': created,
+            'errors': errors,
+            'dry_run': self.dry_run,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(row_number / elapsed, 1) if elapsed else float(row_number),
+        }
+
+    @staticmethod
+    def _clean_row(row):
+        # Anything but an object is left for the serializer to reject as that row's error.
+        if not isinstance(row, dict):
+            return row
+        # Blank CSV cells mean "not provided" rather than an empty string.
+        return {key: value for key, value in row.items() if key and value not in ('', None)}
+
+    @staticmethod
+    def _tasks_for(batch):
+        titles = {str(row['task']) for row in batch if isinstance(row, dict) and row.get('task')}
+        if not titles:
+            return {}
+        return {task.title: task for task in Task.objects.filter(title__in=titles).only('id', 'title', 'customer_id')}
+
+    def _save_batch(self, payments):
+        with transaction.atomic():
+            created = Payment.objects.bulk_create(payments, batch_size=self.batch_size)
+            payment_ids = [payment.pk for payment in created]
+            self._apply_account_balances(payment_ids)
+            self._recompute_task_totals(payment_ids)
+            customer_ids = {payment.task.customer_id for payment in payments if payment.task_id}
+            refresh_customer_counters(customer_ids)
+            apply_payment_rollups(payment_ids)
+            transaction.on_commit(lambda: invalidate_customer_summaries(customer_ids))
+
+    @staticmethod
+    def _apply_account_balances(payment_ids):
+        placeholders = ', '.join(['%s'] * len(payment_ids))
+        account, payment, method = _quoted_table(Account), _quoted_table(Payment), _quoted_table(PaymentMethod)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {account} SET balance = {account}.balance + totals.total
+                FROM (
+                    SELECT m.account_id AS account_id, SUM(p.amount) AS total
+                    FROM {payment} p JOIN {method} m ON m.id = p.method_id
+                    WHERE p.id IN ({placeholders}) AND m.account_id IS NOT NULL
+                    GROUP BY m.account_id
+                ) AS totals
+                WHERE {account}.id = totals.account_id
+                """,
+                payment_ids,
+            )
+
+    @staticmethod
+    def _recompute_task_totals(payment_ids):
+        placeholders = ', '.join(['%s'] * len(payment_ids))
+        task, payment = _quoted_table(Task), _quoted_table(Payment)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {task} SET paid_amount = totals.total
+                FROM (
+                    SELECT task_id, SUM(amount) AS total
+                    FROM {payment}
+                    WHERE amount >= 0 AND task_id IN (
+                        SELECT DISTINCT task_id FROM {payment} WHERE id IN ({placeholders})
+                    )
+                    GROUP BY task_id
+                ) AS totals
+                WHERE {task}.id = totals.task_id
+                """,
+                payment_ids,
+            )
+        task_ids = Payment.objects.filter(pk__in=payment_ids, task__isnull=False).values('task_id')
+        Task.objects.filter(pk__in=task_ids).update(
+            **payment_status_updates(F('paid_amount'), F('total_cost'))
+        )
@@ -0,0 +1,125 @@
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import Exact, GreaterThanOrEqual, LessThan
+from django.utils import timezone
+from Eapp.models import Task
+from .models import CostBreakdown, Payment
+
+MONEY = DecimalField(max_digits=10, decimal_places=2)
+ZERO = Value(Decimal('0.00'), output_field=MONEY)
+
+
+def incremental_mode_enabled():
+    """Task totals are maintained by deltas unless TASK_TOTALS_INCREMENTAL is set to False."""
+    return getattr(settings, 'TASK_TOTALS_INCREMENTAL', True)
+
+
+def _to_decimal(amount):
+    return amount if isinstance(amount, Decimal) else Decimal(str(amount))
+
+
+def payment_contribution(amount):
+    """What a payment adds to ``Task.paid_amount``; expenditures (negative amounts) add nothing."""
+    if amount is None or _to_decimal(amount) < 0:
+        return Decimal('0.00')
+    return _to_decimal(amount)
+
+
+def cost_contribution(cost_type, amount):
+    """What a cost breakdown adds to ``Task.total_cost`` on top of the estimate."""
+    if amount is None:
+        return Decimal('0.00')
+    if cost_type == CostBreakdown.CostType.ADDITIVE:
+        return _to_decimal(amount)
+    if cost_type == CostBreakdown.CostType.SUBTRACTIVE:
+        return -_to_decimal(amount)
+    return Decimal('0.00')
+
+
+def payment_status_updates(paid_amount, total_cost):
+    """
+    SQL version of ``Task.update_payment_status`` for use in ``.update()``.
+    ``paid_amount`` and ``total_cost`` are expressions for the new values.
+    """
+    unpaid = Exact(paid_amount, ZERO)
+    fully_paid = Q(GreaterThanOrEqual(paid_amount, total_cost)) & ~Q(unpaid)
+    return {
+        'payment_status': Case(
+            When(unpaid, then=Value(Task.PaymentStatus.UNPAID)),
+            When(LessThan(paid_amount, total_cost), then=Value(Task.PaymentStatus.PARTIALLY_PAID)),
+            default=Value(Task.PaymentStatus.FULLY_PAID),
+        ),
+        'paid_date': Case(
+            When(fully_paid & Q(paid_date__isnull=True), then=Value(timezone.now().date())),
+            default=F('paid_date'),
+        ),
+    }
+
+
+def apply_task_delta(task_id, paid_delta=Decimal('0.00'), cost_delta=Decimal('0.00')):
+    """Shift a task's paid_amount/total_cost by the given deltas in one atomic UPDATE."""
+    if not task_id or (not paid_delta and not cost_delta):
+        return
+    paid_amount = F('paid_amount') + Value(paid_delta, output_field=MONEY)
+    total_cost = F('total_cost') + Value(cost_delta, output_field=MONEY)
+    Task.objects.filter(pk=task_id).update(
+        paid_amount=paid_amount,
+        total_cost=total_cost,
+        **payment_status_updates(paid_amount, total_cost),
+    )
+
+
+def paid_amount_subquery():
+    payments = (
+        Payment.objects.filter(task=OuterRef('pk'), amount__gte=0)
+        .order_by()
+        .values('task')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    return Coalesce(Subquery(payments, output_field=MONEY), ZERO)
+
+
+def total_cost_expression():
+    def cost_sum(cost_type):
+        costs = (
+            CostBreakdown.objects.filter(task=OuterRef('pk'), cost_type=cost_type)
+            .order_by()
+            .values('task')
+            .annotate(total=Sum('amount'))
+            .values('total')
+        )
+        return Coalesce(Subquery(costs, output_field=MONEY), ZERO)
+
+    return (
+        Coalesce(F('estimated_cost'), ZERO)
+        + cost_sum(CostBreakdown.CostType.ADDITIVE)
+        - cost_sum(CostBreakdown.CostType.SUBTRACTIVE)
+    )
+
+
+def drifted_tasks(queryset=None):
+    """Tasks whose stored totals no longer match their payments and cost breakdowns."""
+    queryset = Task.objects.all() if queryset is None else queryset
+    return queryset.annotate(
+        expected_paid=paid_amount_subquery(),
+        expected_total=total_cost_expression(),
+    ).filter(~Q(paid_amount=F('expected_paid')) | ~Q(total_cost=F('expected_total')))
+
+
+def reconcile_task_totals(queryset=None):
+    """
+    Rebuild paid_amount, total_cost and payment_status from scratch for the
+    drifted tasks in ``queryset`` using two set-based UPDATEs. Returns the
+    number of tasks that were corrected.
+    """
+    task_ids = list(drifted_tasks(queryset).values_list('pk', flat=True))
+    if not task_ids:
+        return 0
+    tasks = Task.objects.filter(pk__in=task_ids)
+    tasks.update(paid_amount=paid_amount_subquery(), total_cost=total_cost_expression())
+    # Second statement so the status is derived from the freshly written totals.
+    tasks.update(**payment_status_updates(F('paid_amount'), F('total_cost')))
+    return len(task_ids)
@@ -0,0 +1,31 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from financials.rollups import rebuild_daily_rollups
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily financial rollups from payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            help='First day to rebuild (YYYY-MM-DD). Defaults to the first payment.',
+        )
+        parser.add_argument(
+            '--end',
+            help='Last day to rebuild (YYYY-MM-DD). Defaults to the last payment.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start, end = (
+                datetime.strptime(options[name], '%Y-%m-%d').date() if options[name] else None
+                for name in ('start', 'end')
+            )
+        except ValueError:
+            raise CommandError('Invalid date format. Use YYYY-MM-DD.')
+
+        with transaction.atomic():
+            rows = rebuild_daily_rollups(start, end)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} daily rollup row(s).'))
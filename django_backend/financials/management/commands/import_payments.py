@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from financials.importers import IMPORT_FORMATS, PaymentImporter, read_payment_rows
+
+class Command(BaseCommand):
+    help = 'Bulk import payments from a CSV, JSON or NDJSON statement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the statement file')
+        parser.add_argument(
+            '--format',
+            dest='file_format',
+            choices=IMPORT_FORMATS,
+            help='Statement format (defaults to the file extension)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows per bulk insert (default: 500)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate the statement without saving anything',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['file_format'] or path.rsplit('.', 1)[-1].lower()
+        if file_format not in IMPORT_FORMATS:
+            raise CommandError(f"Cannot tell the format of '{path}'. Pass --format.")
+
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as statement:
+                importer = PaymentImporter(batch_size=max(options['batch_size'], 1), dry_run=options['dry_run'])
+                result = importer.run(read_payment_rows(statement, file_format))
+        except OSError as e:
+            raise CommandError(f"Cannot read '{path}': {e}")
+        except ValueError as e:
+            raise CommandError(f"Could not read statement: {e}")
+
+        for error in result['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+
+        summary = (
+            f"{result['rows']} row(s) read, {result['valid']} valid, {len(result['errors'])} rejected "
+            f"in {result['elapsed_seconds']}s ({result['rows_per_second']} rows/s)."
+        )
+        if options['dry_run']:
+            self.stdout.write(f'Dry run: {summary}')
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Imported {result['created']} payment(s). {summary}"))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from Eapp.models import Task
+from financials.ledger import drifted_tasks, reconcile_task_totals
+
+class Command(BaseCommand):
+    help = 'Rebuild Task.paid_amount, total_cost and payment_status from payments and cost breakdowns'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--task',
+            action='append',
+            dest='tasks',
+            help='Only reconcile the task with this ID (e.g. A10-001). Can be repeated.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted tasks without changing them',
+        )
+
+    def handle(self, *args, **options):
+        queryset = Task.objects.all()
+        if options['tasks']:
+            queryset = queryset.filter(title__in=options['tasks'])
+
+        if options['dry_run']:
+            titles = list(drifted_tasks(queryset).values_list('title', flat=True))
+            for title in titles:
+                self.stdout.write(title)
+            self.stdout.write(f'{len(titles)} task(s) have drifted totals.')
+            return
+
+        with transaction.atomic():
+            corrected = reconcile_task_totals(queryset)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Reconciled totals for {corrected} task(s).')
+        )
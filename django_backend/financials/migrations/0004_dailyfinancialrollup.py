@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financials', '0003_paymentmethod_account'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyFinancialRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('revenue_count', models.IntegerField(default=0)),
+                ('refunds', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('refund_count', models.IntegerField(default=0)),
+                ('expenditure', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('expenditure_count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='financials.paymentcategory')),
+                ('method', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='financials.paymentmethod')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily Financial Rollups',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'method', 'category'), name='unique_daily_financial_rollup', nulls_distinct=False)],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+VALUE_FIELDS = ('revenue', 'revenue_count', 'refunds', 'refund_count', 'expenditure', 'expenditure_count')
+
+
+def merge_duplicate_rollups(apps, schema_editor):
+    # Servers that ignored nulls_distinct=False may hold several rows per
+    # day and method without a category; fold them into the oldest one.
+    DailyFinancialRollup = apps.get_model('financials', 'DailyFinancialRollup')
+    duplicates = (
+        DailyFinancialRollup.objects.filter(category__isnull=True)
+        .values('date', 'method')
+        .annotate(rows=Count('id'), keep=Min('id'), **{f'total_{field}': Sum(field) for field in VALUE_FIELDS})
+        .filter(rows__gt=1)
+    )
+    for group in duplicates:
+        rows = DailyFinancialRollup.objects.filter(date=group['date'], method=group['method'], category__isnull=True)
+        rows.filter(pk=group['keep']).update(**{field: group[f'total_{field}'] for field in VALUE_FIELDS})
+        rows.exclude(pk=group['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financials', '0004_dailyfinancialrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rollups, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='dailyfinancialrollup',
+            name='unique_daily_financial_rollup',
+        ),
+        migrations.AddConstraint(
+            model_name='dailyfinancialrollup',
+            constraint=models.UniqueConstraint(models.F('date'), models.F('method'), django.db.models.functions.comparison.Coalesce(models.F('category'), models.Value(0)), name='unique_daily_financial_rollup'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 from users.models import User
 from django.utils import timezone
@@ -50,10 +51,53 @@ class Payment(models.Model):
             return f'Payment of {self.amount} for {self.task.title} on {self.date}'
         return f'Payment of {self.amount} on {self.date}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so signals can apply deltas instead of re-aggregating.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     class Meta:
         ordering = ['-date']
 
 
+class DailyFinancialRollup(models.Model):
+    """
+    Payment totals per day, method and category, kept current by the Payment
+    signals (see ``financials.rollups``). Amounts keep the sign of the
+    payments they sum: revenue is positive, refunds (negative payments on a
+    task) and expenditure (negative payments without a task) are negative.
+    """
+    date = models.DateField()
+    method = models.ForeignKey(PaymentMethod, on_delete=models.CASCADE, related_name='daily_rollups')
+    # Deleting a category nulls it on payments without sending signals; a
+    # pre_delete receiver first moves its rows into the uncategorised ones.
+    category = models.ForeignKey(PaymentCategory, on_delete=models.CASCADE, null=True, blank=True, related_name='daily_rollups')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    revenue_count = models.IntegerField(default=0)
+    refunds = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refund_count = models.IntegerField(default=0)
+    expenditure = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expenditure_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.date} {self.method} {self.category or "-"}'
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name_plural = 'Daily Financial Rollups'
+        constraints = [
+            # Keyed on an expression that is never NULL, so payments without
+            # a category share one row on every database (the rollup upsert
+            # conflicts on the same expression).
+            models.UniqueConstraint(
+                models.F('date'), models.F('method'), Coalesce(models.F('category'), models.Value(0)),
+                name='unique_daily_financial_rollup',
+            ),
+        ]
+
+
 
 
 
@@ -84,6 +128,12 @@ class CostBreakdown(models.Model):
     def __str__(self):
         return f'{self.get_cost_type_display()} cost of {self.amount} for {self.task.title}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     class Meta:
         ordering = ['created_at']
         verbose_name_plural = 'Cost Breakdowns'
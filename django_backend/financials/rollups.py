@@ -0,0 +1,184 @@
+from decimal import Decimal
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from .ledger import _to_decimal
+from .models import DailyFinancialRollup, Payment
+
+ROLLUP_KEY_FIELDS = ('date', 'method_id', 'category_id')
+# Rollup amount column -> its count column
+ROLLUP_BUCKETS = {
+    'revenue': 'revenue_count',
+    'refunds': 'refund_count',
+    'expenditure': 'expenditure_count',
+}
+ROLLUP_VALUE_FIELDS = tuple(ROLLUP_BUCKETS) + tuple(ROLLUP_BUCKETS.values())
+ROLLUP_COLUMNS = ROLLUP_KEY_FIELDS + ROLLUP_VALUE_FIELDS
+
+
+def rollup_bucket(amount, task_id):
+    """Which rollup column a payment counts towards, or None for zero amounts."""
+    amount = _to_decimal(amount or 0)
+    if amount > 0:
+        return 'revenue'
+    if amount < 0:
+        return 'refunds' if task_id else 'expenditure'
+    return None
+
+
+def _rollup_row(values, sign):
+    bucket = rollup_bucket(values['amount'], values['task_id'])
+    if bucket is None or values['date'] is None:
+        return None
+    row = {field: values[field] for field in ROLLUP_KEY_FIELDS}
+    row.update({column: Decimal('0.00') for column in ROLLUP_BUCKETS})
+    row.update({column: 0 for column in ROLLUP_BUCKETS.values()})
+    row[bucket] = sign * _to_decimal(values['amount'])
+    row[ROLLUP_BUCKETS[bucket]] = sign
+    return row
+
+
+def payment_rollup_changes(instance, created=False, deleted=False):
+    """
+    Rollup deltas for a payment save/delete: the old values are taken out of
+    their bucket and the new ones added. Returns ``None`` when the old values
+    are unknown (e.g. a deferred load) and the day has to be rebuilt instead.
+    """
+    fields = ROLLUP_KEY_FIELDS + ('amount', 'task_id')
+    current = {field: getattr(instance, field) for field in fields}
+    loaded = getattr(instance, '_loaded_values', None)
+    if not created and (loaded is None or not all(field in loaded for field in fields)):
+        return None
+
+    rows = []
+    if not created:
+        rows.append(_rollup_row(loaded, -1))
+    if not deleted:
+        rows.append(_rollup_row(current, 1))
+    return [row for row in rows if row is not None]
+
+
+def _upsert(cursor, source_sql, params):
+    """
+    ``INSERT`` the rows produced by ``source_sql`` into the rollup table,
+    adding to existing rows on conflict so concurrent writers for the same
+    day increment the same row.
+    """
+    table = connection.ops.quote_name(DailyFinancialRollup._meta.db_table)
+    updates = ', '.join(f'{column} = {table}.{column} + EXCLUDED.{column}' for column in ROLLUP_VALUE_FIELDS)
+    cursor.execute(
+        f"""
+        INSERT INTO {table} ({', '.join(ROLLUP_COLUMNS)}) {source_sql}
+        ON CONFLICT (date, method_id, COALESCE(category_id, 0)) DO UPDATE SET {updates}
+        """,
+        params,
+    )
+
+
+def apply_rollup_changes(rows):
+    """Add ``rows`` (key fields plus amount/count deltas) to the rollup table."""
+    # One upsert cannot touch the same row twice, so merge rows per key first.
+    merged = {}
+    for row in rows:
+        key = tuple(row[field] for field in ROLLUP_KEY_FIELDS)
+        if key in merged:
+            for column in ROLLUP_VALUE_FIELDS:
+                merged[key][column] += row[column]
+        else:
+            merged[key] = dict(row)
+    merged = {key: row for key, row in merged.items() if any(row[column] for column in ROLLUP_VALUE_FIELDS)}
+    if not merged:
+        return
+    values = ', '.join(['(' + ', '.join(['%s'] * len(ROLLUP_COLUMNS)) + ')'] * len(merged))
+    with connection.cursor() as cursor:
+        _upsert(cursor, f'VALUES {values}', [row[column] for row in merged.values() for column in ROLLUP_COLUMNS])
+
+
+def apply_payment_rollups(payment_ids):
+    """Add freshly bulk-created payments (which send no signals) to the rollups."""
+    if not payment_ids:
+        return
+    payment = connection.ops.quote_name(Payment._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(payment_ids))
+    with connection.cursor() as cursor:
+        _upsert(
+            cursor,
+            f"""
+            SELECT date, method_id, category_id,
+                SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END),
+                SUM(CASE WHEN amount < 0 AND task_id IS NOT NULL THEN amount ELSE 0 END),
+                SUM(CASE WHEN amount < 0 AND task_id IS NULL THEN amount ELSE 0 END),
+                COUNT(CASE WHEN amount > 0 THEN 1 END),
+                COUNT(CASE WHEN amount < 0 AND task_id IS NOT NULL THEN 1 END),
+                COUNT(CASE WHEN amount < 0 AND task_id IS NULL THEN 1 END)
+            FROM {payment}
+            WHERE id IN ({placeholders}) AND amount <> 0
+            GROUP BY date, method_id, category_id
+            """,
+            payment_ids,
+        )
+
+
+def move_category_rollups_to_uncategorised(category_id):
+    """
+    Add a category's rollup rows to the rows without a category, which is
+    where its payments end up once the category is deleted. The category's
+    own rows are left for the delete to cascade to.
+    """
+    table = connection.ops.quote_name(DailyFinancialRollup._meta.db_table)
+    with connection.cursor() as cursor:
+        _upsert(
+            cursor,
+            f"SELECT date, method_id, NULL, {', '.join(ROLLUP_VALUE_FIELDS)} FROM {table} WHERE category_id = %s",
+            [category_id],
+        )
+
+
+def _rollup_aggregates():
+    def amount_sum(condition):
+        return Coalesce(Sum('amount', filter=condition), Decimal('0.00'))
+
+    revenue = Q(amount__gt=0)
+    refunds = Q(amount__lt=0, task__isnull=False)
+    expenditure = Q(amount__lt=0, task__isnull=True)
+    return {
+        'revenue': amount_sum(revenue),
+        'revenue_count': Count('id', filter=revenue),
+        'refunds': amount_sum(refunds),
+        'refund_count': Count('id', filter=refunds),
+        'expenditure': amount_sum(expenditure),
+        'expenditure_count': Count('id', filter=expenditure),
+    }
+
+
+def aggregate_payments(queryset):
+    """Group ``queryset`` into rollup rows (dicts), one per day, method and category."""
+    rows = (
+        queryset.exclude(amount=0)
+        .order_by()
+        .values('date', 'method', 'category')
+        .annotate(**_rollup_aggregates())
+    )
+    for row in rows.iterator():
+        row['method_id'], row['category_id'] = row.pop('method'), row.pop('category')
+        yield row
+
+
+def rebuild_daily_rollups(start=None, end=None):
+    """
+    Recompute the rollup rows from payments, for every day or for the
+    ``start``..``end`` range (inclusive). Returns the number of rows written.
+    """
+    payments = Payment.objects.all()
+    rollups = DailyFinancialRollup.objects.all()
+    if start:
+        payments, rollups = payments.filter(date__gte=start), rollups.filter(date__gte=start)
+    if end:
+        payments, rollups = payments.filter(date__lte=end), rollups.filter(date__lte=end)
+
+    rollups.delete()
+    created = DailyFinancialRollup.objects.bulk_create(
+        [DailyFinancialRollup(**row) for row in aggregate_payments(payments)],
+        batch_size=1000,
+    )
+    return len(created)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.core.validators import MinValueValidator
+from django.utils.encoding import smart_str
 from decimal import Decimal
 from .models import (
     ExpenditureRequest,
@@ -10,6 +11,7 @@ from .models import (
     CostBreakdown,
 )
 from users.serializers import UserSerializer
+from Eapp.models import Task
 
 
 class CostBreakdownSerializer(serializers.ModelSerializer):
@@ -82,6 +84,41 @@ class PaymentSerializer(serializers.ModelSerializer):
         }
 
 
+class LookupSlugRelatedField(serializers.SlugRelatedField):
+    """
+    SlugRelatedField that resolves values from a ``{slug: instance}`` dict in
+    ``context['lookups'][field_name]`` when one is provided, so validating
+    thousands of rows does not cost one query per row.
+    """
+
+    def to_internal_value(self, data):
+        lookup = self.context.get("lookups", {}).get(self.field_name)
+        if lookup is None:
+            return super().to_internal_value(data)
+        try:
+            return lookup[smart_str(data)]
+        except KeyError:
+            self.fail("does_not_exist", slug_name=self.slug_field, value=smart_str(data))
+
+
+class PaymentImportSerializer(PaymentSerializer):
+    """Validates one statement row; related objects are referenced by name/title."""
+
+    task = LookupSlugRelatedField(
+        slug_field="title", queryset=Task.objects.all(), required=False, allow_null=True
+    )
+    method = LookupSlugRelatedField(slug_field="name", queryset=PaymentMethod.objects.all())
+    category = LookupSlugRelatedField(
+        slug_field="name", queryset=PaymentCategory.objects.all(), required=False, allow_null=True
+    )
+
+    class Meta(PaymentSerializer.Meta):
+        fields = ("task", "amount", "date", "method", "description", "category")
+        read_only_fields = []
+        # Statements carry refunds and expenditures as negative amounts.
+        extra_kwargs = {}
+
+
 class ExpenditureRequestSerializer(serializers.ModelSerializer):
     requester = UserSerializer(read_only=True)
     approver = UserSerializer(read_only=True)
@@ -1,11 +1,72 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.db.models import Sum
-from .models import Payment, CostBreakdown
+from .models import Payment, PaymentCategory, CostBreakdown
+from .ledger import apply_task_delta, cost_contribution, incremental_mode_enabled, payment_contribution
+from .rollups import apply_rollup_changes, move_category_rollups_to_uncategorised, payment_rollup_changes, rebuild_daily_rollups
 from Eapp.models import Task
+from common.events import broadcast_payment
+from customers.counters import refresh_customer_counters, shift_lifetime_paid
+
+
+def _ledger_changes(instance, contribution, fields, created=False, deleted=False):
+    """
+    Return ``(task_id, delta)`` pairs describing how a save/delete moves the
+    task totals, or ``None`` when the previous values are unknown and the
+    totals have to be recomputed instead.
+    """
+    current = {'task_id': instance.task_id, **{field: getattr(instance, field) for field in fields}}
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is not None and not all(field in loaded for field in current):
+        return None
+    if loaded is None and not (created or deleted):
+        return None
+
+    changes = {}
+    if not created:
+        old = loaded or current
+        changes[old['task_id']] = -contribution(*(old[field] for field in fields))
+    if not deleted:
+        changes[current['task_id']] = changes.get(current['task_id'], 0) + contribution(*(current[field] for field in fields))
+    instance._loaded_values = None if deleted else current
+    return [(task_id, delta) for task_id, delta in changes.items() if task_id and delta]
+
+
+def _apply_changes(instance, changes, delta_field):
+    for task_id, delta in changes:
+        apply_task_delta(task_id, **{delta_field: delta})
+    # Callers often keep using (and saving) the task they attached, so keep it in sync.
+    if changes and instance._meta.get_field('task').is_cached(instance) and instance.task is not None:
+        instance.task.refresh_from_db(fields=['paid_amount', 'total_cost', 'payment_status', 'paid_date'])
+
+
+@receiver([post_save, post_delete], sender=Payment)
+def update_daily_rollup_on_payment_change(sender, instance, **kwargs):
+    changes = payment_rollup_changes(instance, kwargs.get('created', False), kwargs['signal'] is post_delete)
+    if changes is not None:
+        apply_rollup_changes(changes)
+        return
+    # The previous values are unknown, so rebuild the day(s) the payment touches.
+    for day in {instance.date, (getattr(instance, '_loaded_values', None) or {}).get('date')} - {None}:
+        rebuild_daily_rollups(day, day)
+
+
+@receiver(pre_delete, sender=PaymentCategory)
+def keep_rollups_on_category_delete(sender, instance, **kwargs):
+    # Payments lose the category without sending signals; their totals move
+    # to the uncategorised rows before the category's own rows cascade away.
+    move_category_rollups_to_uncategorised(instance.pk)
+
 
 @receiver([post_save, post_delete], sender=Payment)
 def update_task_on_payment_change(sender, instance, **kwargs):
+    if incremental_mode_enabled():
+        changes = _ledger_changes(instance, payment_contribution, ('amount',), kwargs.get('created', False), kwargs['signal'] is post_delete)
+        if changes is not None:
+            for task_id, delta in changes:
+                shift_lifetime_paid(task_id, delta)
+            _apply_changes(instance, changes, 'paid_delta')
+            return
     try:
         if instance.task:
             task = instance.task
@@ -13,11 +74,17 @@ def update_task_on_payment_change(sender, instance, **kwargs):
             task.paid_amount = task.payments.filter(amount__gte=0).aggregate(total=Sum('amount'))['total'] or 0
             task.update_payment_status()
             task.save(update_fields=['paid_amount', 'payment_status', 'paid_date'])
+            refresh_customer_counters([task.customer_id])
     except Task.DoesNotExist:
         pass # Task was deleted, do nothing.
 
 @receiver([post_save, post_delete], sender=CostBreakdown)
 def update_task_on_cost_breakdown_change(sender, instance, **kwargs):
+    if incremental_mode_enabled():
+        changes = _ledger_changes(instance, cost_contribution, ('cost_type', 'amount'), kwargs.get('created', False), kwargs['signal'] is post_delete)
+        if changes is not None:
+            _apply_changes(instance, changes, 'cost_delta')
+            return
     try:
         if instance.task:
             task = instance.task
@@ -26,3 +93,22 @@ def update_task_on_cost_breakdown_change(sender, instance, **kwargs):
             task.save(update_fields=['total_cost', 'payment_status', 'paid_date'])
     except Task.DoesNotExist:
         pass # Task was deleted, do nothing.
+
+
+@receiver([post_save, post_delete], sender=Payment)
+def broadcast_payment_change(sender, instance, **kwargs):
+    if kwargs['signal'] is post_delete:
+        action = 'deleted'
+    else:
+        action = 'created' if kwargs['created'] else 'updated'
+    broadcast_payment(instance, action)
+
+
+# Registered last so the receivers above still see the values loaded from the DB.
+@receiver([post_save, post_delete], sender=Payment)
+@receiver([post_save, post_delete], sender=CostBreakdown)
+def remember_saved_values(sender, instance, **kwargs):
+    if kwargs['signal'] is post_delete:
+        instance._loaded_values = None
+    else:
+        instance._loaded_values = {field.attname: getattr(instance, field.attname) for field in sender._meta.concrete_fields}
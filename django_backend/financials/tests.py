@@ -1,3 +1,364 @@
+import os
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from common.testing import QueryBudgetMixin
+from customers.models import Customer
+from Eapp.models import Task
+from users.models import User
+from .importers import PaymentImporter
+from .models import Account, CostBreakdown, DailyFinancialRollup, ExpenditureRequest, Payment, PaymentCategory, PaymentMethod
+from .rollups import rebuild_daily_rollups
+
+
+class TaskLedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        customer = Customer.objects.create(name='Test Customer')
+        self.task = Task.objects.create(
+            title='A1-001', customer=customer, created_by=self.user, laptop_model='X1',
+            current_location='Front', estimated_cost=Decimal('100.00'), total_cost=Decimal('100.00'),
+        )
+        self.method = PaymentMethod.objects.create(name='Cash')
+
+    def assertTotals(self, paid_amount, total_cost, payment_status):
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.paid_amount, Decimal(paid_amount))
+        self.assertEqual(self.task.total_cost, Decimal(total_cost))
+        self.assertEqual(self.task.payment_status, payment_status)
+
+    def test_payments_adjust_paid_amount(self):
+        payment = Payment.objects.create(task=self.task, amount=Decimal('40.00'), method=self.method)
+        self.assertTotals('40.00', '100.00', Task.PaymentStatus.PARTIALLY_PAID)
+
+        payment.amount = Decimal('100.00')
+        payment.save()
+        self.assertTotals('100.00', '100.00', Task.PaymentStatus.FULLY_PAID)
+        self.assertIsNotNone(self.task.paid_date)
+
+        payment.delete()
+        self.assertTotals('0.00', '100.00', Task.PaymentStatus.UNPAID)
+
+    def test_expenditures_do_not_count_as_paid(self):
+        Payment.objects.create(task=self.task, amount=Decimal('-30.00'), method=self.method)
+        self.assertTotals('0.00', '100.00', Task.PaymentStatus.UNPAID)
+
+    def test_cost_breakdowns_adjust_total_cost(self):
+        Payment.objects.create(task=self.task, amount=Decimal('100.00'), method=self.method)
+        addition = CostBreakdown.objects.create(task=self.task, description='Screen', amount=Decimal('50.00'), cost_type='Additive')
+        self.assertTotals('100.00', '150.00', Task.PaymentStatus.PARTIALLY_PAID)
+
+        CostBreakdown.objects.create(task=self.task, description='Discount', amount=Decimal('20.00'), cost_type='Subtractive')
+        CostBreakdown.objects.create(task=self.task, description='Included', amount=Decimal('999.00'), cost_type='Inclusive')
+        self.assertTotals('100.00', '130.00', Task.PaymentStatus.PARTIALLY_PAID)
+
+        addition.cost_type = 'Subtractive'
+        addition.save()
+        self.assertTotals('100.00', '30.00', Task.PaymentStatus.FULLY_PAID)
+
+    def test_signal_does_not_reaggregate(self):
+        for i in range(5):
+            CostBreakdown.objects.create(task=self.task, description=f'Part {i}', amount=Decimal('10.00'), cost_type='Additive')
+        item = CostBreakdown.objects.filter(task=self.task).first()
+        item.amount = Decimal('15.00')
+        with self.assertNumQueries(2):  # UPDATE cost breakdown, UPDATE task
+            item.save()
+
+    def test_attached_task_instance_stays_in_sync(self):
+        Payment.objects.create(task=self.task, amount=Decimal('25.00'), method=self.method)
+        self.assertEqual(self.task.paid_amount, Decimal('25.00'))
+        # A full save of the attached task must not overwrite the ledger.
+        self.task.save()
+        self.assertTotals('25.00', '100.00', Task.PaymentStatus.PARTIALLY_PAID)
+
+    def test_reconcile_command_repairs_drift(self):
+        Payment.objects.create(task=self.task, amount=Decimal('60.00'), method=self.method)
+        CostBreakdown.objects.create(task=self.task, description='Screen', amount=Decimal('50.00'), cost_type='Additive')
+        Task.objects.filter(pk=self.task.pk).update(paid_amount=0, total_cost=0, payment_status=Task.PaymentStatus.UNPAID)
+
+        out = StringIO()
+        call_command('reconcile_task_totals', '--dry-run', stdout=out)
+        self.assertIn('A1-001', out.getvalue())
+        self.assertTotals('0.00', '0.00', Task.PaymentStatus.UNPAID)
+
+        call_command('reconcile_task_totals', stdout=StringIO())
+        self.assertTotals('60.00', '150.00', Task.PaymentStatus.PARTIALLY_PAID)
+
+        out = StringIO()
+        call_command('reconcile_task_totals', stdout=out)
+        self.assertIn('0 task(s)', out.getvalue())
+
+
+class PaymentImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='accountant', password='testpassword', email='accountant@gmail.com', first_name='Test', last_name='Accountant', role='Accountant')
+        customer = Customer.objects.create(name='Test Customer')
+        self.task = Task.objects.create(
+            title='A1-001', customer=customer, created_by=self.user, laptop_model='X1',
+            current_location='Front', estimated_cost=Decimal('100.00'), total_cost=Decimal('100.00'),
+        )
+        self.account = Account.objects.create(name='M-Pesa')
+        self.method = PaymentMethod.objects.get(name='M-Pesa')
+        Account.objects.filter(pk=self.account.pk).update(balance=Decimal('10.00'))
+
+    def statement(self, content, name='statement.csv'):
+        return SimpleUploadedFile(name, content.encode(), content_type='text/plain')
+
+    def test_csv_import_updates_accounts_and_tasks_in_bulk(self):
+        rows = '\n'.join(['task,amount,date,method,description'] + [
+            f'A1-001,20.00,2025-10-0{i},M-Pesa,Installment {i}' for i in range(1, 6)
+        ] + [',-5.00,2025-10-06,M-Pesa,Float fee'])
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        response = client.post('/api/payments/import/', {'file': self.statement(rows)}, format='multipart')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['created'], 6)
+        self.assertEqual(Payment.objects.count(), 6)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('105.00'))
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.paid_amount, Decimal('100.00'))
+        self.assertEqual(self.task.payment_status, Task.PaymentStatus.FULLY_PAID)
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        rows = [
+            {'task': 'A1-001', 'amount': '30.00', 'method': 'M-Pesa'},
+            {'task': 'Z9-999', 'amount': '30.00', 'method': 'M-Pesa'},
+            {'amount': '30.00', 'method': 'Unknown'},
+        ]
+
+        response = client.post('/api/payments/import/', rows, format='json')
+
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.paid_amount, Decimal('30.00'))
+
+    def test_rows_that_are_not_objects_are_reported(self):
+        rows = ['A1-001,30.00', {'task': 'A1-001', 'amount': '30.00', 'method': 'M-Pesa'}, ['A1-001', '30.00'], None]
+        result = PaymentImporter().run(rows)
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([error['row'] for error in result['errors']], [1, 3, 4])
+        self.assertIn('non_field_errors', result['errors'][0]['errors'])
+
+    def test_import_queries_do_not_grow_per_row(self):
+        rows = [{'task': 'A1-001', 'amount': '1.00', 'method': 'M-Pesa'} for _ in range(50)]
+        importer = PaymentImporter(batch_size=100)
+        # task lookup, savepoint, INSERT, account UPDATE, task UPDATE, status UPDATE, customer UPDATE, rollup upsert, release
+        with self.assertNumQueries(9):
+            result = importer.run(rows)
+        self.assertEqual(result['created'], 50)
+
+    def test_command_reports_throughput(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as statement:
+            statement.write('{"task": "A1-001", "amount": "15.00", "method": "M-Pesa"}\n\n')
+            statement.write('{"amount": "-2.50", "method": "M-Pesa", "description": "Fee"}\n')
+        out = StringIO()
+        try:
+            call_command('import_payments', statement.name, stdout=out, stderr=StringIO())
+        finally:
+            os.unlink(statement.name)
+        self.assertIn('Imported 2 payment(s)', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('22.50'))
+
+
+class DailyFinancialRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        customer = Customer.objects.create(name='Test Customer')
+        self.task = Task.objects.create(
+            title='A1-001', customer=customer, created_by=self.user, laptop_model='X1',
+            current_location='Front', estimated_cost=Decimal('100.00'), total_cost=Decimal('100.00'),
+        )
+        self.cash = PaymentMethod.objects.create(name='Cash')
+        self.bank = PaymentMethod.objects.create(name='Bank')
+        self.rent = PaymentCategory.objects.create(name='Rent')
+        self.day = date(2025, 10, 1)
+
+    def rollups(self):
+        return {
+            (row.date, row.method.name, row.category.name if row.category else None): (
+                row.revenue, row.revenue_count, row.refunds, row.refund_count, row.expenditure, row.expenditure_count,
+            )
+            for row in DailyFinancialRollup.objects.select_related('method', 'category')
+            if row.revenue_count or row.refund_count or row.expenditure_count
+        }
+
+    def test_payment_signals_keep_rollups_current(self):
+        payment = Payment.objects.create(task=self.task, amount=Decimal('40.00'), method=self.cash, date=self.day)
+        Payment.objects.create(task=self.task, amount=Decimal('60.00'), method=self.cash, date=self.day)
+        Payment.objects.create(task=self.task, amount=Decimal('-10.00'), method=self.cash, date=self.day)
+        Payment.objects.create(amount=Decimal('-25.00'), method=self.cash, date=self.day, category=self.rent)
+        self.assertEqual(self.rollups(), {
+            (self.day, 'Cash', None): (Decimal('100.00'), 2, Decimal('-10.00'), 1, Decimal('0.00'), 0),
+            (self.day, 'Cash', 'Rent'): (Decimal('0.00'), 0, Decimal('0.00'), 0, Decimal('-25.00'), 1),
+        })
+        # Payments without a category share a single row.
+        self.assertEqual(DailyFinancialRollup.objects.count(), 2)
+
+        payment.amount = Decimal('15.00')
+        payment.method = self.bank
+        payment.date = self.day + timedelta(days=1)
+        payment.save()
+        payment.amount = Decimal('20.00')
+        payment.save()
+        self.assertEqual(self.rollups()[(self.day, 'Cash', None)][:2], (Decimal('60.00'), 1))
+        self.assertEqual(self.rollups()[(self.day + timedelta(days=1), 'Bank', None)][:2], (Decimal('20.00'), 1))
+
+        payment.delete()
+        self.assertNotIn((self.day + timedelta(days=1), 'Bank', None), self.rollups())
+
+    def test_deleting_a_category_keeps_its_totals(self):
+        Payment.objects.create(task=self.task, amount=Decimal('40.00'), method=self.cash, date=self.day)
+        Payment.objects.create(task=self.task, amount=Decimal('30.00'), method=self.cash, date=self.day, category=self.rent)
+        Payment.objects.create(amount=Decimal('-25.00'), method=self.bank, date=self.day, category=self.rent)
+        self.rent.delete()
+        self.assertEqual(self.rollups(), {
+            (self.day, 'Cash', None): (Decimal('70.00'), 2, Decimal('0.00'), 0, Decimal('0.00'), 0),
+            (self.day, 'Bank', None): (Decimal('0.00'), 0, Decimal('0.00'), 0, Decimal('-25.00'), 1),
+        })
+        self.assertEqual(DailyFinancialRollup.objects.count(), 2)
+
+    def test_deferred_payment_rebuilds_the_day(self):
+        Payment.objects.create(task=self.task, amount=Decimal('40.00'), method=self.cash, date=self.day)
+        payment = Payment.objects.only('id', 'date').get()
+        payment.amount = Decimal('70.00')
+        payment.save(update_fields=['amount'])
+        self.assertEqual(self.rollups()[(self.day, 'Cash', None)][:2], (Decimal('70.00'), 1))
+
+    def test_import_updates_rollups(self):
+        rows = [{'task': 'A1-001', 'amount': '5.00', 'method': 'Cash', 'date': '2025-10-01'} for _ in range(4)]
+        rows.append({'amount': '-3.00', 'method': 'Cash', 'date': '2025-10-01', 'category': 'Rent'})
+        PaymentImporter().run(rows)
+        self.assertEqual(self.rollups(), {
+            (self.day, 'Cash', None): (Decimal('20.00'), 4, Decimal('0.00'), 0, Decimal('0.00'), 0),
+            (self.day, 'Cash', 'Rent'): (Decimal('0.00'), 0, Decimal('0.00'), 0, Decimal('-3.00'), 1),
+        })
+
+    def test_backfill_command_rebuilds_rollups(self):
+        Payment.objects.create(task=self.task, amount=Decimal('40.00'), method=self.cash, date=self.day)
+        Payment.objects.create(amount=Decimal('-5.00'), method=self.bank, date=self.day)
+        expected = self.rollups()
+        DailyFinancialRollup.objects.all().delete()
+
+        out = StringIO()
+        call_command('backfill_financial_rollups', stdout=out)
+        self.assertIn('Rebuilt 2 daily rollup row(s)', out.getvalue())
+        self.assertEqual(self.rollups(), expected)
+        self.assertEqual(rebuild_daily_rollups(self.day, self.day), 2)
+
+    def test_revenue_overview_reads_rollups(self):
+        today = timezone.now().date()
+        Payment.objects.create(task=self.task, amount=Decimal('80.00'), method=self.cash, date=today - timedelta(days=3))
+        Payment.objects.create(amount=Decimal('-30.00'), method=self.cash, date=today - timedelta(days=2))
+        Payment.objects.create(task=self.task, amount=Decimal('20.00'), method=self.cash, date=today)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        with self.assertNumQueries(1):
+            response = client.get('/api/revenue-overview/')
+
+        self.assertEqual(response.data['opening_balance'], Decimal('50.00'))
+        self.assertEqual(response.data['today_revenue'], Decimal('20.00'))
+
+
+class PaymentCursorPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        cash = PaymentMethod.objects.create(name='Cash')
+        day = date(2025, 10, 1)
+        for offset in (0, 0, 1, 2, 2):
+            Payment.objects.create(amount=Decimal('10.00'), method=cash, date=day + timedelta(days=offset))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_cursor_pages_follow_date_then_id(self):
+        expected = list(Payment.objects.order_by('-date', '-id').values_list('id', flat=True))
+        response = self.client.get('/api/payments/', {'cursor': '', 'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 5)
+        seen = [payment['id'] for payment in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen += [payment['id'] for payment in response.data['results']]
+        self.assertEqual(seen, expected)
+
+
+class PaymentQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        customer = Customer.objects.create(name='Test Customer')
+        self.task = Task.objects.create(title='A1-001', customer=customer, created_by=self.user, laptop_model='X1', current_location='Front')
+        self.cash = PaymentMethod.objects.create(name='Cash')
+        self.rent = PaymentCategory.objects.create(name='Rent')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_payment_list(self):
+        def add_rows(count):
+            for _ in range(count):
+                Payment.objects.create(task=self.task, amount=Decimal('10.00'), method=self.cash, category=self.rent)
+
+        # Count and payments with task, method and category.
+        self.assertQueryBudget(2, add_rows, '/api/payments/', {'page_size': 100})
+
+    def test_payment_detail(self):
+        payment = Payment.objects.create(task=self.task, amount=Decimal('10.00'), method=self.cash, category=self.rent)
+        self.assertQueryBudget(1, lambda count: None, f'/api/payments/{payment.pk}/')
+
+    def test_account_list(self):
+        def add_rows(count):
+            for _ in range(count):
+                Account.objects.create(name=f'Account {Account.objects.count()}', created_by=self.user)
+
+        # Accounts with their creators.
+        self.assertQueryBudget(1, add_rows, '/api/accounts/')
+        self.assertQueryBudget(1, lambda count: None, f'/api/accounts/{Account.objects.first().pk}/')
+
+    def test_expenditure_request_list(self):
+        def add_rows(count):
+            for _ in range(count):
+                ExpenditureRequest.objects.create(
+                    description='Rent', amount=Decimal('10.00'), task=self.task, category=self.rent,
+                    payment_method=self.cash, requester=self.user, approver=self.user,
+                )
+
+        # Count and requests with task, category, method, requester and approver.
+        self.assertQueryBudget(2, add_rows, '/api/expenditure-requests/', {'page_size': 100})
+        self.assertQueryBudget(1, lambda count: None, f'/api/expenditure-requests/{ExpenditureRequest.objects.first().pk}/')
+
+    def test_cost_breakdown_list(self):
+        def add_rows(count):
+            for _ in range(count):
+                CostBreakdown.objects.create(task=self.task, description='Screen', amount=Decimal('10.00'), category='Parts', payment_method=self.cash)
+
+        # Cost breakdowns with their task.
+        self.assertQueryBudget(1, add_rows, '/api/cost-breakdowns/')
+        self.assertQueryBudget(1, lambda count: None, f'/api/cost-breakdowns/{CostBreakdown.objects.first().pk}/')
+
+    def test_lookup_lists(self):
+        def add_methods(count):
+            for _ in range(count):
+                PaymentMethod.objects.create(name=f'Method {PaymentMethod.objects.count()}')
+
+        def add_categories(count):
+            for _ in range(count):
+                PaymentCategory.objects.create(name=f'Category {PaymentCategory.objects.count()}')
 
-# Create your tests here.
+        # Lookup rows are not cached inside the test transaction: one read of the table.
+        self.assertQueryBudget(1, add_methods, '/api/payment-methods/')
+        self.assertQueryBudget(1, add_categories, '/api/payment-categories/')
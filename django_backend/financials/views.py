@@ -1,6 +1,7 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser
 from django.shortcuts import get_object_or_404
 from .models import (
     Payment,
@@ -8,6 +9,7 @@ from .models import (
     PaymentMethod,
     Account,
     CostBreakdown,
+    DailyFinancialRollup,
     ExpenditureRequest,
 )
 from .serializers import (
@@ -20,6 +22,8 @@ from .serializers import (
     FinancialSummarySerializer,
 )
 from Eapp.models import Task
+from common.lookups import LookupCacheMixin
+from .importers import IMPORT_FORMATS, PaymentImporter, read_payment_rows
 from users.permissions import (
     IsManager,
     IsAdminOrManagerOrFrontDeskOrAccountant,
@@ -38,7 +42,7 @@ class AccountViewSet(viewsets.ModelViewSet):
     API endpoint that allows accounts to be viewed or edited by managers.
     """
 
-    queryset = Account.objects.all()
+    queryset = Account.objects.select_related("created_by")
     serializer_class = AccountSerializer
     permission_classes = [IsManager]
 
@@ -46,7 +50,7 @@ class AccountViewSet(viewsets.ModelViewSet):
         serializer.save(created_by=self.request.user)
 
 
-class PaymentMethodViewSet(viewsets.ModelViewSet):
+class PaymentMethodViewSet(LookupCacheMixin, viewsets.ModelViewSet):
     queryset = PaymentMethod.objects.filter(is_user_selectable=True)
     serializer_class = PaymentMethodSerializer
     permission_classes = [permissions.IsAuthenticated, IsManager]
@@ -56,8 +60,11 @@ class PaymentMethodViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated()]
         return super().get_permissions()
 
+    def filter_lookup_rows(self, rows):
+        return [method for method in rows if method.is_user_selectable]
 
-class PaymentCategoryViewSet(viewsets.ModelViewSet):
+
+class PaymentCategoryViewSet(LookupCacheMixin, viewsets.ModelViewSet):
     queryset = PaymentCategory.objects.all()
     serializer_class = PaymentCategorySerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrManagerOrAccountant]
@@ -77,9 +84,10 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
         IsAdminOrManagerOrFrontDeskOrAccountant,
     ]
     pagination_class = CustomPagination
+    cursor_ordering = ("-date", "-id")
 
     def get_queryset(self):
-        queryset = Payment.objects.all()
+        queryset = Payment.objects.select_related("task", "method", "category")
         task_payments = self.request.query_params.get("task_payments")
         is_refunded = self.request.query_params.get("is_refunded")
 
@@ -91,6 +99,54 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
 
         return queryset
 
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        parser_classes=[MultiPartParser, JSONParser],
+        permission_classes=[permissions.IsAuthenticated, IsAdminOrManagerOrAccountant],
+    )
+    def import_payments(self, request):
+        """
+        Import a statement of payments. Accepts a multipart ``file`` (CSV,
+        JSON array or NDJSON, picked from ``file_format`` or the file
+        extension) or a JSON array body. Rows reference the task by title
+        and the method/category by name.
+        """
+        dry_run = str(request.query_params.get("dry_run", "")).lower() in ["1", "true"]
+        try:
+            batch_size = int(request.query_params.get("batch_size", 500))
+        except ValueError:
+            return Response(
+                {"error": "batch_size must be an integer."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if isinstance(request.data, list):
+            rows = request.data
+        else:
+            upload = request.FILES.get("file")
+            if upload is None:
+                return Response(
+                    {"error": "Upload a statement as 'file' or post a JSON array of rows."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            file_format = request.data.get("file_format") or upload.name.rsplit(".", 1)[-1].lower()
+            if file_format not in IMPORT_FORMATS:
+                return Response(
+                    {"error": f"Unsupported format '{file_format}'. Use one of: {', '.join(IMPORT_FORMATS)}."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            rows = read_payment_rows(upload, file_format)
+
+        try:
+            result = PaymentImporter(batch_size=max(batch_size, 1), dry_run=dry_run).run(rows)
+        except (ValueError, UnicodeDecodeError) as e:
+            return Response({"error": f"Could not read statement: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        response_status = status.HTTP_201_CREATED if result["created"] else status.HTTP_200_OK
+        return Response(result, status=response_status)
+
 
 class CostBreakdownViewSet(viewsets.ModelViewSet):
     queryset = CostBreakdown.objects.all()
@@ -98,7 +154,7 @@ class CostBreakdownViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsAdminOrManagerOrAccountant]
 
     def get_queryset(self):
-        queryset = CostBreakdown.objects.all()
+        queryset = CostBreakdown.objects.select_related("task")
         task_id = self.kwargs.get("task_id")
         if task_id:
             queryset = queryset.filter(task__title=task_id)
@@ -276,7 +332,12 @@ class FinancialSummaryView(APIView):
         )
 
         # Calculate totals
-        total_revenue = revenue_payments.aggregate(total=Sum("amount"))["total"] or 0
+        total_revenue = (
+            DailyFinancialRollup.objects.filter(date=selected_date).aggregate(
+                total=Sum("revenue")
+            )["total"]
+            or 0
+        )
 
         total_expenditures = expenditures.aggregate(total=Sum("amount"))["total"] or 0
 
@@ -0,0 +1,141 @@
+import csv
+import json
+import tempfile
+from itertools import chain
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.negotiation import DefaultContentNegotiation
+
+EXPORT_FORMATS = ("csv", "xlsx", "ndjson")
+EXPORT_CHUNK_SIZE = 2000
+
+# The list inside each predefined report that holds its tabular rows.
+PREDEFINED_REPORT_ROWS = {
+    "revenue_summary": "payments_by_date",
+    "outstanding_payments": "outstanding_tasks",
+    "task_status": "status_distribution",
+    "technician_performance": "technician_performance",
+    "turnaround_time": "task_details",
+    "technician_workload": "workload_data",
+    "payment_methods": "revenue_methods",
+}
+
+
+class ReportContentNegotiation(DefaultContentNegotiation):
+    """
+    DRF treats ``?format=`` as a renderer override and would 404 on
+    ``csv``/``xlsx``/``ndjson``. For report views those values are export
+    options handled by the view itself, so negotiate as if it was absent.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        if request.query_params.get(self.settings.URL_FORMAT_OVERRIDE) in EXPORT_FORMATS:
+            return super().select_renderer(request, renderers, format_suffix="json")
+        return super().select_renderer(request, renderers, format_suffix)
+
+
+def requested_export_format(request):
+    """The export format asked for in the query string or request body, if any."""
+    export_format = request.query_params.get("format")
+    if export_format is None and hasattr(request.data, "get"):
+        export_format = request.data.get("format")
+    return export_format if export_format in EXPORT_FORMATS else None
+
+
+class _Echo:
+    """File-like object whose write() just returns the line, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=DjangoJSONEncoder)
+    return value
+
+
+def _peek_columns(rows, columns):
+    rows = iter(rows)
+    if columns is not None:
+        return rows, list(columns)
+    first = next(rows, None)
+    if first is None:
+        return iter(()), []
+    return chain([first], rows), list(first.keys())
+
+
+def _stream_csv(rows, columns):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_cell(row.get(column)) for column in columns])
+
+
+def _stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+def _xlsx_file(rows, columns):
+    """
+    XLSX is a zip archive and cannot be sent before it is complete, so rows
+    are written with openpyxl's write-only mode (constant memory) into a
+    temporary file that is then streamed back in chunks.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(columns)
+    for row in rows:
+        sheet.append([_cell(row.get(column)) for column in columns])
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def export_response(rows, export_format, filename, columns=None):
+    """
+    Stream ``rows`` (an iterable of dicts, ideally backed by
+    ``QuerySet.iterator()``) as a CSV, NDJSON or XLSX download.
+    """
+    filename = f"{filename}-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"
+
+    if export_format == "ndjson":
+        response = StreamingHttpResponse(_stream_ndjson(rows), content_type="application/x-ndjson")
+    elif export_format == "csv":
+        rows, columns = _peek_columns(rows, columns)
+        response = StreamingHttpResponse(_stream_csv(rows, columns), content_type="text/csv")
+    elif export_format == "xlsx":
+        rows, columns = _peek_columns(rows, columns)
+        return FileResponse(
+            _xlsx_file(rows, columns),
+            as_attachment=True,
+            filename=filename,
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+    else:
+        raise ValueError(f"Unsupported export format '{export_format}'")
+
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def predefined_export_response(report_type, report_data, export_format):
+    """
+    Export the tabular part of a predefined report. Reports generated with a
+    ``chunk_size`` hand over their rows as an iterator over the database
+    cursor, so those are streamed without being loaded first.
+    """
+    rows = report_data.get(PREDEFINED_REPORT_ROWS[report_type], [])
+    if report_type == "payment_methods":
+        rows = chain(
+            ({"type": "revenue", **row} for row in report_data.get("revenue_methods", [])),
+            ({"type": "expenditure", **row} for row in report_data.get("expenditure_methods", [])),
+        )
+    return export_response(rows, export_format, report_type.replace("_", "-"))
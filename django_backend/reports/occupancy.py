@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.cache import cache
+
+OCCUPANCY_CACHE_VERSION_KEY = "reports:occupancy:version"
+
+
+def occupancy_cache_ttl():
+    """Seconds an occupancy report may be served from cache (OCCUPANCY_CACHE_TTL, default 30)."""
+    return getattr(settings, "OCCUPANCY_CACHE_TTL", 30)
+
+
+def occupancy_cache_key(*parts):
+    # Every key embeds the current version, so bumping it invalidates them all.
+    version = cache.get_or_set(OCCUPANCY_CACHE_VERSION_KEY, 1, timeout=None)
+    return ":".join(["reports:occupancy", str(version), *(str(part) for part in parts)])
+
+
+def invalidate_occupancy_cache():
+    try:
+        cache.incr(OCCUPANCY_CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(OCCUPANCY_CACHE_VERSION_KEY, 1, timeout=None)
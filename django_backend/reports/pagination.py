@@ -0,0 +1,73 @@
+from rest_framework.exceptions import ValidationError
+from common.cursors import decode_cursor, encode_cursor, keyset_filter
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 500
+
+
+def paginate_queryset(queryset, ordering, page=1, page_size=DEFAULT_PAGE_SIZE, cursor=None, total=None, total_key="total"):
+    """
+    Fetch one page of ``queryset`` with LIMIT/OFFSET, or with a keyset
+    condition when ``cursor`` (from a previous page's ``next_cursor``) is
+    given. ``ordering`` must be unique, so end it with the primary key.
+    The total comes from ``total`` or a separate COUNT query. A malformed
+    cursor raises ``ValidationError``.
+
+    Returns ``(rows, pagination)``.
+    """
+    page = max(int(page or 1), 1)
+    page_size = min(max(int(page_size or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    ordered = queryset.order_by(*ordering)
+
+    if cursor:
+        try:
+            values = decode_cursor(cursor)[0]
+        except ValueError:
+            raise ValidationError({"cursor": "Invalid cursor."})
+        ordered = ordered.filter(keyset_filter(ordering, values))
+        offset = 0
+    else:
+        offset = (page - 1) * page_size
+
+    # One extra row tells us whether there is a next page.
+    rows = list(ordered[offset:offset + page_size + 1])
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if total is None:
+        total = queryset.order_by().count()
+
+    next_cursor = None
+    if has_next and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor([
+            last[field.lstrip("-")] if isinstance(last, dict) else getattr(last, field.lstrip("-"))
+            for field in ordering
+        ])
+
+    return rows, {
+        "current_page": page,
+        "page_size": page_size,
+        total_key: total,
+        "total_pages": (total + page_size - 1) // page_size,
+        "has_next": has_next,
+        "has_previous": page > 1,
+        "next_cursor": next_cursor,
+    }
+
+
+def paginate_list(rows, page=1, page_size=DEFAULT_PAGE_SIZE, total_key="total"):
+    """Page a list that has to be ordered in Python. Returns ``(rows, pagination)``."""
+    page = max(int(page or 1), 1)
+    page_size = min(max(int(page_size or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    total = len(rows)
+    start = (page - 1) * page_size
+    return rows[start:start + page_size], {
+        "current_page": page,
+        "page_size": page_size,
+        total_key: total,
+        "total_pages": (total + page_size - 1) // page_size,
+        "has_next": start + page_size < total,
+        "has_previous": page > 1,
+        "next_cursor": None,
+    }
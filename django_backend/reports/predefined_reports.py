@@ -1,67 +1,95 @@
 # Eapp/reports/predefined_reports.py
-from itertools import zip_longest
-from django.db.models import Count, Sum, Avg, Q, F
+from bisect import bisect_right
+from itertools import groupby, zip_longest
+from operator import itemgetter
+from zoneinfo import ZoneInfo
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (
+    Case, CharField, Count, DurationField, ExpressionWrapper, F, Min, OuterRef, Q, Subquery, Sum,
+    Value, When,
+)
+from django.db.models.functions import Coalesce
+from financials.ledger import total_cost_expression
 from django.utils import timezone
 from datetime import timedelta, datetime, time
 from decimal import Decimal
 from Eapp.models import Task, User, TaskActivity
-from financials.models import Payment, CostBreakdown
+from customers.models import PhoneNumber
+from financials.models import Payment, CostBreakdown, DailyFinancialRollup
+from .occupancy import occupancy_cache_key, occupancy_cache_ttl
+from .pagination import paginate_queryset, paginate_list
+from .services import _payments_sum
 
 
 class PredefinedReportGenerator:
 
 
     @staticmethod
-    def generate_revenue_summary_report(date_range="last_7_days", start_date=None, end_date=None):
-        """Generate an accurate financial revenue summary report"""
+    def generate_revenue_summary_report(date_range="last_7_days", start_date=None, end_date=None, page=None, page_size=None, cursor=None, chunk_size=None):
+        """
+        Generate an accurate financial revenue summary report. Passing
+        ``page`` or ``cursor`` returns one page of ``payments_by_date``;
+        passing ``chunk_size`` leaves it an iterator over the database
+        cursor, fetched that many rows at a time, for exports.
+        """
         date_filter, actual_date_range, duration_days, duration_description = PredefinedReportGenerator._get_date_filter(date_range, start_date, end_date)
 
+        # Totals come from the daily rollups rather than scanning payments.
         # FILTER: Only positive amounts = actual revenue
-        revenue_filter = Q(date_filter) & Q(amount__gt=0)
-
-        # Optional: Capture refunds separately (negative amounts)
-        refund_filter = Q(date_filter) & Q(amount__lt=0)
+        rollups = DailyFinancialRollup.objects.filter(date_filter)
+        revenue_rollups = rollups.filter(revenue_count__gt=0)
 
         # --- 1. Daily Revenue (only income) ---
         payments = (
-            Payment.objects.filter(revenue_filter)
+            revenue_rollups
             .values("date")
-            .annotate(daily_revenue=Sum("amount"))
+            .annotate(daily_revenue=Sum("revenue"))
             .order_by("date")
         )
 
-        # --- 2. Monthly Totals (Revenue-focused) ---
-        monthly_revenue = Payment.objects.filter(revenue_filter).aggregate(
-            total_revenue=Sum("amount"),
-            average_payment=Avg("amount"),
-            payment_count=Count("id"),
-        )
-
-        # --- 3. Refund Summary (for transparency) ---
-        refund_summary = Payment.objects.filter(refund_filter).aggregate(
-            total_refunds=Sum("amount"),  # This will be negative
-            refund_count=Count("id"),
+        # --- 2. Monthly Totals (Revenue-focused) and 3. Refunds (negative amounts) ---
+        totals = rollups.aggregate(
+            total_revenue=Sum("revenue"),
+            payment_count=Sum("revenue_count"),
+            total_refunds=Sum(F("refunds") + F("expenditure")),  # This will be negative
+            refund_count=Sum(F("refund_count") + F("expenditure_count")),
         )
-        total_refunds = abs(refund_summary["total_refunds"] or 0)
+        monthly_revenue = {
+            "total_revenue": totals["total_revenue"],
+            "payment_count": totals["payment_count"],
+            "average_payment": (
+                (totals["total_revenue"] / totals["payment_count"]).quantize(Decimal("0.01"))
+                if totals["payment_count"]
+                else 0
+            ),
+        }
+        total_refunds = abs(totals["total_refunds"] or 0)
         net_revenue = (monthly_revenue["total_revenue"] or 0) - total_refunds
 
         # --- 4. Payment Methods (only for revenue, not refunds) ---
         payment_methods = (
-            Payment.objects.filter(revenue_filter)
+            revenue_rollups
             .values("method__name")
-            .annotate(total=Sum("amount"), count=Count("id"))
+            .annotate(total=Sum("revenue"), count=Sum("revenue_count"))
             .order_by("-total")
         )
 
-        return {
-            "payments_by_date": list(payments),
+        pagination = None
+        if page or cursor:
+            payments, pagination = paginate_queryset(
+                payments, ["date"], page, page_size, cursor, total_key="total_payments"
+            )
+
+        report = {
+            "payments_by_date": payments.iterator(chunk_size=chunk_size) if chunk_size else list(payments),
             "monthly_totals": {
                 "total_revenue": monthly_revenue["total_revenue"] or 0,
                 "total_refunds": total_refunds,
                 "net_revenue": net_revenue,
                 "average_payment": monthly_revenue["average_payment"] or 0,
                 "payment_count": monthly_revenue["payment_count"] or 0,
-                "refund_count": refund_summary["refund_count"] or 0,
+                "refund_count": totals["refund_count"] or 0,
             },
             "payment_methods": list(payment_methods),
             "date_range": actual_date_range,
@@ -72,6 +100,9 @@ class PredefinedReportGenerator:
             "start_date": start_date,
             "end_date": end_date,
         }
+        if pagination:
+            report["pagination"] = pagination
+        return report
 
  
         
@@ -172,80 +203,79 @@ class PredefinedReportGenerator:
         return Q(**filter_kwargs), actual_range, duration_days, duration_description
     
     @staticmethod
-    def generate_outstanding_payments_report(date_range='last_7_days', start_date=None, end_date=None):
-        """Generate outstanding payments report with date range support"""
+    def generate_outstanding_payments_report(date_range='last_7_days', start_date=None, end_date=None, page=None, page_size=None, cursor=None, chunk_size=None):
+        """
+        Generate outstanding payments report with date range support. The
+        whole report is one annotated ``values()`` query plus one aggregate
+        for the summary; passing ``page`` or ``cursor`` only loads one page,
+        and ``chunk_size`` streams ``outstanding_tasks`` for exports.
+        """
         # Apply date filter to tasks based on date_in field
         date_filter, actual_date_range, duration_days, duration_description = PredefinedReportGenerator._get_date_filter(date_range, start_date, end_date, field='date_in')
         
         # Get tasks with unpaid or partially paid status within date range
+        # and a positive balance (estimated cost + additive - subtractive - payments)
         outstanding_tasks = (
             Task.objects.filter(
                 (Q(payment_status="Unpaid") | Q(payment_status="Partially Paid")) &
                 date_filter
             )
-            .select_related("customer")
-            .prefetch_related("payments", "customer__phone_numbers")
+            .annotate(report_total_cost=total_cost_expression(), report_paid_amount=_payments_sum())
+            .annotate(outstanding=F("report_total_cost") - F("report_paid_amount"))
+            .filter(outstanding__gt=0)
         )
 
-        tasks_data = []
-        for task in outstanding_tasks:
-            # Calculate paid amount from related payments
-            paid_amount = task.payments.aggregate(total=Sum("amount"))[
-                "total"
-            ] or Decimal("0.00")
-
-            # Calculate total cost (estimated_cost + additive costs - subtractive costs)
-            estimated_cost = task.estimated_cost or Decimal("0.00")
-            additive_costs = task.cost_breakdowns.filter(
-                cost_type="Additive"
-            ).aggregate(total=Sum("amount"))["total"] or Decimal("0.00")
-            subtractive_costs = task.cost_breakdowns.filter(
-                cost_type="Subtractive"
-            ).aggregate(total=Sum("amount"))["total"] or Decimal("0.00")
-
-            total_cost = estimated_cost + additive_costs - subtractive_costs
-            outstanding_balance = total_cost - paid_amount
-
-            # Only include tasks with positive outstanding balance
-            if outstanding_balance > 0:
-                days_overdue = (
-                    (timezone.now().date() - task.date_in).days if task.date_in else 0
-                )
-
-                # Get the first phone number or use 'Not provided'
-                customer_phone = "Not provided"
-                if (
-                    hasattr(task.customer, "phone_numbers")
-                    and task.customer.phone_numbers.exists()
-                ):
-                    customer_phone = task.customer.phone_numbers.first().phone_number
+        summary = outstanding_tasks.aggregate(total=Sum("outstanding"), count=Count("id"))
+        total_outstanding = float(summary["total"] or 0)
+        task_count = summary["count"]
 
-                tasks_data.append(
-                    {
-                        "task_id": task.title,
-                        "customer_name": task.customer.name,
-                        "customer_phone": customer_phone,
-                        "total_cost": float(total_cost),
-                        "paid_amount": float(paid_amount),
-                        "outstanding_balance": float(outstanding_balance),
-                        "days_overdue": days_overdue,
-                        "status": task.status,
-                        "date_in": task.date_in.isoformat() if task.date_in else None,
-                    }
-                )
+        # The customer's first phone number, or 'Not provided'
+        first_phone = (
+            PhoneNumber.objects.filter(customer=OuterRef("customer"))
+            .order_by("pk")
+            .values("phone_number")[:1]
+        )
+        rows = outstanding_tasks.values(
+            "id", "title", "status", "date_in", "report_total_cost", "report_paid_amount", "outstanding",
+            customer_name=F("customer__name"),
+            customer_phone=Coalesce(Subquery(first_phone), Value("Not provided")),
+        )
 
-        # Sort by outstanding balance (highest first)
-        tasks_data.sort(key=lambda x: x["outstanding_balance"], reverse=True)
+        # Highest outstanding balance first
+        ordering = ["-outstanding", "id"]
+        pagination = None
+        if page or cursor:
+            rows, pagination = paginate_queryset(
+                rows, ordering, page, page_size, cursor, total=task_count, total_key="total_tasks"
+            )
+        else:
+            rows = rows.order_by(*ordering)
+            if chunk_size:
+                rows = rows.iterator(chunk_size=chunk_size)
 
-        total_outstanding = sum(task["outstanding_balance"] for task in tasks_data)
+        today = timezone.now().date()
+        tasks_data = (
+            {
+                "task_id": row["title"],
+                "customer_name": row["customer_name"],
+                "customer_phone": row["customer_phone"],
+                "total_cost": float(row["report_total_cost"]),
+                "paid_amount": float(row["report_paid_amount"]),
+                "outstanding_balance": float(row["outstanding"]),
+                "days_overdue": (today - row["date_in"]).days if row["date_in"] else 0,
+                "status": row["status"],
+                "date_in": row["date_in"].isoformat() if row["date_in"] else None,
+            }
+            for row in rows
+        )
 
-        return {
-            "outstanding_tasks": tasks_data,
+        report = {
+            "outstanding_tasks": tasks_data if chunk_size else list(tasks_data),
             "summary": {
                 "total_outstanding": total_outstanding,
-                "task_count": len(tasks_data),
+                "task_count": task_count,
                 "average_balance": (
-                    total_outstanding / len(tasks_data) if tasks_data else 0
+                    total_outstanding / task_count if task_count else 0
                 ),
             },
             "date_range": actual_date_range,
@@ -255,21 +285,31 @@ class PredefinedReportGenerator:
             },
             "start_date": start_date,
             "end_date": end_date,
-        }   
+        }
+        if pagination:
+            report["pagination"] = pagination
+        return report
 
     @staticmethod
-    def generate_technician_performance_report(date_range='last_7_days', start_date=None, end_date=None):
-        """Generate comprehensive technician performance report with task status grouping."""
+    def generate_technician_performance_report(date_range='last_7_days', start_date=None, end_date=None, include_tasks=True):
+        """
+        Generate comprehensive technician performance report with task status
+        grouping. Runs a fixed number of queries: technicians, status counts,
+        READY events joined to each task's first intake, and (unless
+        ``include_tasks`` is False) the per-status task lists.
+        """
         date_filter_q, actual_date_range, duration_days, duration_description = PredefinedReportGenerator._get_date_filter(
             date_range, field="timestamp", start_date=start_date, end_date=end_date
         )
 
         # Get all active technicians
-        technicians = User.objects.filter(
-            role="Technician", is_active=True
-        ).prefetch_related("tasks")
+        technicians = list(
+            User.objects.filter(role="Technician", is_active=True).only(
+                "id", "first_name", "last_name", "email"
+            )
+        )
 
-        if not technicians.exists():
+        if not technicians:
             return {
                 "technician_performance": [],
                 "date_range": actual_date_range,
@@ -280,96 +320,102 @@ class PredefinedReportGenerator:
                 "total_technicians": 0,
             }
 
-        final_report = []
-
-        for technician in technicians:
-            # Get all tasks assigned to this technician
-            all_tasks = technician.tasks.all()
-
-            # Group tasks by status
-            tasks_by_status = {}
-            for task in all_tasks:
-                status = task.status
-                if status not in tasks_by_status:
-                    tasks_by_status[status] = []
-
-                tasks_by_status[status].append(
+        technician_ids = [technician.id for technician in technicians]
+
+        # Task counts per technician and status
+        status_counts = {technician_id: {} for technician_id in technician_ids}
+        for row in (
+            Task.objects.filter(assigned_to__in=technician_ids)
+            .values("assigned_to", "status")
+            .annotate(count=Count("id"))
+            .order_by()
+        ):
+            status_counts[row["assigned_to"]][row["status"]] = row["count"]
+
+        # Per-status task lists (optional, they make up most of the payload)
+        tasks_by_status = {technician_id: {} for technician_id in technician_ids}
+        if include_tasks:
+            for task in Task.objects.filter(assigned_to__in=technician_ids).values(
+                "id", "title", "status", "assigned_to", "laptop_model", "date_in",
+                "estimated_cost", "total_cost", "paid_amount", "customer__name",
+            ):
+                tasks_by_status[task["assigned_to"]].setdefault(task["status"], []).append(
                     {
-                        "task_id": task.id,
-                        "task_title": task.title,
-                        "customer_name": task.customer.name if task.customer else "N/A",
-                        "laptop_model": task.laptop_model,
-                        "date_in": task.date_in.isoformat() if task.date_in else "N/A",
+                        "task_id": task["id"],
+                        "task_title": task["title"],
+                        "customer_name": task["customer__name"] or "N/A",
+                        "laptop_model": task["laptop_model"],
+                        "date_in": task["date_in"].isoformat() if task["date_in"] else "N/A",
                         "estimated_cost": (
-                            float(task.estimated_cost) if task.estimated_cost else 0
+                            float(task["estimated_cost"]) if task["estimated_cost"] else 0
                         ),
-                        "total_cost": float(task.total_cost) if task.total_cost else 0,
+                        "total_cost": float(task["total_cost"]) if task["total_cost"] else 0,
                         "paid_amount": (
-                            float(task.paid_amount) if task.paid_amount else 0
+                            float(task["paid_amount"]) if task["paid_amount"] else 0
                         ),
                     }
                 )
 
-            # Calculate completed tasks metrics (using READY activities for accuracy)
-            ready_activities = (
-                TaskActivity.objects.filter(
-                    task__assigned_to=technician, type=TaskActivity.ActivityType.READY
-                )
-                .filter(date_filter_q)
-                .select_related("task")
+        # Completed tasks metrics (using READY activities for accuracy), each
+        # joined to the first INTAKE of its task
+        first_intake = (
+            TaskActivity.objects.filter(
+                task=OuterRef("task"), type=TaskActivity.ActivityType.INTAKE
             )
+            .order_by()
+            .values("task")
+            .annotate(first=Min("timestamp"))
+            .values("first")
+        )
+        ready_activities = (
+            TaskActivity.objects.filter(
+                task__assigned_to__in=technician_ids, type=TaskActivity.ActivityType.READY
+            )
+            .filter(date_filter_q)
+            .annotate(intake_timestamp=Subquery(first_intake))
+            .filter(intake_timestamp__isnull=False)
+            .values(
+                "timestamp", "intake_timestamp", "task_id", "task__title",
+                "task__estimated_cost", "task__assigned_to",
+            )
+        )
 
-            completed_tasks_data = []
-            total_completion_seconds = 0
-
-            for ready_activity in ready_activities:
-                task = ready_activity.task
+        completed_by_technician = {technician_id: [] for technician_id in technician_ids}
+        completion_seconds = dict.fromkeys(technician_ids, 0)
+        for ready_activity in ready_activities:
+            technician_id = ready_activity["task__assigned_to"]
+            completion_duration = ready_activity["timestamp"] - ready_activity["intake_timestamp"]
+            completion_seconds[technician_id] += completion_duration.total_seconds()
+            completed_by_technician[technician_id].append(
+                {
+                    "task_id": ready_activity["task_id"],
+                    "task_title": ready_activity["task__title"],
+                    "completion_hours": round(completion_duration.total_seconds() / 3600, 1),
+                    "revenue": float(ready_activity["task__estimated_cost"] or 0),
+                }
+            )
 
-                # Find intake time for this task
-                intake_activity = (
-                    TaskActivity.objects.filter(
-                        task=task, type=TaskActivity.ActivityType.INTAKE
-                    )
-                    .order_by("timestamp")
-                    .first()
-                )
+        final_report = []
 
-                if intake_activity:
-                    completion_duration = (
-                        ready_activity.timestamp - intake_activity.timestamp
-                    )
-                    completion_hours = completion_duration.total_seconds() / 3600
-                    total_completion_seconds += completion_duration.total_seconds()
-
-                    completed_tasks_data.append(
-                        {
-                            "task_id": task.id,
-                            "task_title": task.title,
-                            "completion_hours": round(completion_hours, 1),
-                            "revenue": float(task.estimated_cost or 0),
-                        }
-                    )
+        for technician in technicians:
+            counts = status_counts[technician.id]
+            completed_tasks_data = completed_by_technician[technician.id]
 
             # Calculate performance metrics
             completed_tasks_count = len(completed_tasks_data)
             total_revenue = sum(task["revenue"] for task in completed_tasks_data)
             avg_completion_hours = (
-                total_completion_seconds / (completed_tasks_count * 3600)
+                completion_seconds[technician.id] / (completed_tasks_count * 3600)
                 if completed_tasks_count > 0
                 else 0
             )
-            in_progress_tasks = len(tasks_by_status.get("In Progress", []))
-
-            # Count tasks by status
-            status_counts = {
-                status: len(tasks) for status, tasks in tasks_by_status.items()
-            }
+            total_tasks = sum(counts.values())
 
-            # Get current assigned tasks (all statuses except completed/picked up)
-            current_tasks = all_tasks.exclude(
-                status__in=["Completed", "Picked Up", "Terminated"]
+            # Current assigned tasks (all statuses except completed/picked up)
+            current_task_count = sum(
+                count for status, count in counts.items()
+                if status not in ("Completed", "Picked Up", "Terminated")
             )
-            current_task_count = current_tasks.count()
 
             technician_data = {
                 "technician_id": technician.id,
@@ -378,18 +424,18 @@ class PredefinedReportGenerator:
                 "completed_tasks_count": completed_tasks_count,
                 "total_revenue_generated": round(total_revenue, 2),
                 "avg_completion_hours": round(avg_completion_hours, 1),
-                "current_in_progress_tasks": in_progress_tasks,
+                "current_in_progress_tasks": counts.get("In Progress", 0),
                 "current_assigned_tasks": current_task_count,
                 # Task status breakdown
-                "tasks_by_status": tasks_by_status,
-                "status_counts": status_counts,
+                "tasks_by_status": tasks_by_status[technician.id],
+                "status_counts": counts,
                 # Detailed completed tasks
                 "completed_tasks_detail": completed_tasks_data,
                 # Summary stats
-                "total_tasks_handled": all_tasks.count(),
+                "total_tasks_handled": total_tasks,
                 "completion_rate": (
-                    (completed_tasks_count / all_tasks.count() * 100)
-                    if all_tasks.count() > 0
+                    (completed_tasks_count / total_tasks * 100)
+                    if total_tasks > 0
                     else 0
                 ),
                 # Current workload indicators
@@ -439,43 +485,29 @@ class PredefinedReportGenerator:
         """Generate payment methods breakdown report"""
         date_filter, actual_date_range, duration_days, duration_description = PredefinedReportGenerator._get_date_filter(date_range, start_date, end_date)
 
+        rollups = DailyFinancialRollup.objects.filter(date_filter)
+
         # Revenue payments (positive amounts)
-        revenue_methods = (
-            Payment.objects.filter(date_filter, amount__gt=0)
-            .values("method__name")
-            .annotate(
-                total_amount=Sum("amount"),
-                payment_count=Count("id"),
-                average_payment=Avg("amount"),
-            )
+        revenue_methods = list(
+            rollups.values("method__name")
+            .annotate(total_amount=Sum("revenue"), payment_count=Sum("revenue_count"))
+            .filter(payment_count__gt=0)
             .order_by("-total_amount")
         )
 
         # Expenditure payments (negative amounts)
-        expenditure_methods = (
-            Payment.objects.filter(date_filter, amount__lt=0)
-            .values("method__name")
+        expenditure_methods = list(
+            rollups.values("method__name")
             .annotate(
-                total_amount=Sum("amount"),
-                payment_count=Count("id"),
-                average_payment=Avg("amount"),
+                total_amount=Sum(F("refunds") + F("expenditure")),
+                payment_count=Sum(F("refund_count") + F("expenditure_count")),
             )
+            .filter(payment_count__gt=0)
             .order_by("total_amount")
         )  # Order by ascending (most negative first)
 
-        total_revenue = (
-            Payment.objects.filter(date_filter, amount__gt=0).aggregate(
-                total=Sum("amount")
-            )["total"]
-            or 0
-        )
-
-        total_expenditure = abs(
-            Payment.objects.filter(date_filter, amount__lt=0).aggregate(
-                total=Sum("amount")
-            )["total"]
-            or 0
-        )
+        total_revenue = sum(method["total_amount"] for method in revenue_methods)
+        total_expenditure = abs(sum(method["total_amount"] for method in expenditure_methods))
 
         # Process revenue methods
         revenue_data = []
@@ -490,7 +522,7 @@ class PredefinedReportGenerator:
                     "method_name": method["method__name"],
                     "total_amount": float(method["total_amount"]),
                     "payment_count": method["payment_count"],
-                    "average_payment": float(method["average_payment"]),
+                    "average_payment": float(method["total_amount"] / method["payment_count"]),
                     "percentage": round(percentage, 1),
                 }
             )
@@ -510,7 +542,7 @@ class PredefinedReportGenerator:
                         method["total_amount"]
                     ),  # This will be negative
                     "payment_count": method["payment_count"],
-                    "average_payment": float(method["average_payment"]),
+                    "average_payment": float(method["total_amount"] / method["payment_count"]),
                     "percentage": round(percentage, 1),
                 }
             )
@@ -578,28 +610,28 @@ class PredefinedReportGenerator:
         }
 
     @staticmethod
-    def generate_turnaround_time_report(period_type="weekly", date_range='last_7_days', start_date=None, end_date=None):
-        """Generate turnaround time report with individual task details and date range support."""
+    def generate_turnaround_time_report(period_type="weekly", date_range='last_7_days', start_date=None, end_date=None, page=None, page_size=None):
+        """
+        Generate turnaround time report with individual task details and date
+        range support. Passing ``page`` returns one page of ``task_details``.
+        """
         
         # Apply date filter based on intake activity timestamps
         date_filter, actual_date_range, duration_days, duration_description = PredefinedReportGenerator._get_date_filter(date_range, start_date, end_date, field='timestamp')
         
-        # Get tasks that were picked up within the date range by filtering through activities
-        timestamp_gte = date_filter.children[0][1]
-        timestamp_lte = date_filter.children[1][1]
-        
-        tasks = (
-            Task.objects.filter(
-                activities__type="picked_up",
-                activities__timestamp__gte=timestamp_gte,
-                activities__timestamp__lte=timestamp_lte
+        # Tasks that were picked up within the date range
+        picked_up_in_range = TaskActivity.objects.filter(
+            date_filter, type=TaskActivity.ActivityType.PICKED_UP
+        ).values("task_id")
+        tasks = list(
+            Task.objects.filter(pk__in=picked_up_in_range).values(
+                "id", "title", "customer__name", "assigned_to",
+                "assigned_to__first_name", "assigned_to__last_name",
             )
-            .distinct()
-            .prefetch_related("activities")
         )
 
-        if not tasks.exists():
-            return {
+        if not tasks:
+            result = {
                 "periods": [],
                 "task_details": [],
                 "summary": {
@@ -616,114 +648,70 @@ class PredefinedReportGenerator:
                 "start_date": start_date,
                 "end_date": end_date,
             }
+            if page:
+                result["pagination"] = paginate_list([], page, page_size, total_key="total_tasks")[1]
+            return result
+
+        timestamp_range = dict(date_filter.children)
+        turnarounds = PredefinedReportGenerator._scan_turnaround_activities(
+            picked_up_in_range,
+            timestamp_range.get("timestamp__gte"),
+            timestamp_range.get("timestamp__lte"),
+        )
+        report_timezone = ZoneInfo(getattr(settings, "REPORT_TIME_ZONE", settings.TIME_ZONE))
 
         grouped_tasks = {}
         task_details = []
-        tasks_with_issues = 0
 
         for task in tasks:
-            # Get all activities for this task
-            activities = task.activities.all().order_by("timestamp")
-
-            try:
-                # Find ALL picked_up activities within our date range and get the MOST RECENT one
-                pickup_activities_in_range = activities.filter(
-                    type=TaskActivity.ActivityType.PICKED_UP,
-                    timestamp__gte=timestamp_gte,
-                    timestamp__lte=timestamp_lte
-                ).order_by('-timestamp')  # Order by most recent first
-                
-                # Get the most recent pickup activity (the first one in the sorted list)
-                most_recent_pickup = pickup_activities_in_range.first()
-
-                if not most_recent_pickup:
-                    tasks_with_issues += 1
-                    continue
+            turnaround = turnarounds.get(task["id"])
+            if turnaround is None:
+                continue
+            most_recent_pickup = turnaround["most_recent_pickup"]
+            first_intake = turnaround["first_intake"]
 
-                # Find intake activity
-                first_intake = activities.filter(
-                    type=TaskActivity.ActivityType.INTAKE
-                ).first()
+            # Calculate net turnaround time (gross minus time away)
+            net_turnaround_duration = max(
+                most_recent_pickup - first_intake - turnaround["away_time"], timedelta(0)
+            )
 
-                if not first_intake:
-                    tasks_with_issues += 1
-                    continue
+            # Convert to whole number of days (rounded up to nearest whole day)
+            turnaround_days = net_turnaround_duration.total_seconds() / (24 * 3600)
+            turnaround_days_whole = int(round(turnaround_days))
 
-                # Calculate gross duration from intake to MOST RECENT pickup
-                gross_duration = most_recent_pickup.timestamp - first_intake.timestamp
+            # Group by period based on MOST RECENT pickup date
+            if period_type == "weekly":
+                period_key = most_recent_pickup.strftime("%Y-W%U")
+            elif period_type == "monthly":
+                period_key = most_recent_pickup.strftime("%Y-%m")
+            else:
+                period_key = "overall"
 
-                total_away_time = timedelta(0)
-                pickup_events = activities.filter(type=TaskActivity.ActivityType.PICKED_UP)
-                return_events = activities.filter(type=TaskActivity.ActivityType.RETURNED)
-                
-                # Count the number of times the task has been returned
-                return_count = return_events.count()
-
-                # Calculate total time the device was away from workshop (picked up but not returned)
-                for pickup in pickup_events:
-                    next_return = return_events.filter(timestamp__gt=pickup.timestamp).first()
-                    if next_return:
-                        away_time = next_return.timestamp - pickup.timestamp
-                        total_away_time += away_time
-
-                # Calculate net turnaround time (gross minus time away)
-                net_turnaround_duration = gross_duration - total_away_time
-
-                if net_turnaround_duration.total_seconds() < 0:
-                    net_turnaround_duration = timedelta(0)
-
-                # Convert to whole number of days (rounded up to nearest whole day)
-                turnaround_days = net_turnaround_duration.total_seconds() / (24 * 3600)
-                turnaround_days_whole = int(round(turnaround_days))
-
-                # Group by period based on MOST RECENT pickup date
-                end_time = most_recent_pickup.timestamp
-                if period_type == "weekly":
-                    period_key = end_time.strftime("%Y-W%U")
-                elif period_type == "monthly":
-                    period_key = end_time.strftime("%Y-%m")
-                else:
-                    period_key = "overall"
+            grouped_tasks.setdefault(period_key, []).append(turnaround_days_whole)
 
-                if period_key not in grouped_tasks:
-                    grouped_tasks[period_key] = []
-                grouped_tasks[period_key].append(turnaround_days_whole)
+            # Convert to the report timezone for display, 12-hour times
+            local_pickup_time = most_recent_pickup.astimezone(report_timezone)
+            local_intake_time = first_intake.astimezone(report_timezone)
 
-                # Convert to local timezone for display
-                import pytz
-                utc_plus_3 = pytz.timezone('Etc/GMT-3')  # UTC+3 timezone
-                
-                local_pickup_time = most_recent_pickup.timestamp.astimezone(utc_plus_3)
-                local_intake_time = first_intake.timestamp.astimezone(utc_plus_3)
-
-                # Format times in 12-hour system with local timezone
-                pickup_date_str = local_pickup_time.date().isoformat()
-                pickup_time_str = local_pickup_time.strftime("%I:%M %p")  # 12-hour format
-                intake_date_str = local_intake_time.date().isoformat()
-                intake_time_str = local_intake_time.strftime("%I:%M %p")  # 12-hour format
-
-                # Store individual task details
-                task_detail = {
-                    "title": task.title,
-                    "customer_name": task.customer.name if task.customer else "N/A",
-                    "intake_date": intake_date_str,
-                    "intake_time": intake_time_str,
-                    "pickup_date": pickup_date_str,
-                    "pickup_time": pickup_time_str,
+            # Store individual task details
+            task_details.append(
+                {
+                    "title": task["title"],
+                    "customer_name": task["customer__name"] or "N/A",
+                    "intake_date": local_intake_time.date().isoformat(),
+                    "intake_time": local_intake_time.strftime("%I:%M %p"),
+                    "pickup_date": local_pickup_time.date().isoformat(),
+                    "pickup_time": local_pickup_time.strftime("%I:%M %p"),
                     "assigned_technician": (
-                        task.assigned_to.get_full_name()
-                        if task.assigned_to
+                        f"{task['assigned_to__first_name']} {task['assigned_to__last_name']}"
+                        if task["assigned_to"]
                         else "Unassigned"
                     ),
                     "turnaround_days": turnaround_days_whole,
-                    "return_count": return_count,
-                    "pickup_count": pickup_activities_in_range.count(),
+                    "return_count": turnaround["return_count"],
+                    "pickup_count": turnaround["pickup_count"],
                 }
-                task_details.append(task_detail)
-
-            except Exception as e:
-                tasks_with_issues += 1
-                continue
+            )
 
         # Calculate period statistics
         periods_data = []
@@ -773,9 +761,15 @@ class PredefinedReportGenerator:
         tasks_with_returns = sum(1 for task in task_details if task["return_count"] > 0)
         avg_returns_per_task = total_returns / len(task_details) if task_details else 0
 
+        page_details, pagination = task_details, None
+        if page:
+            page_details, pagination = paginate_list(
+                task_details, page, page_size, total_key="total_tasks"
+            )
+
         result = {
             "periods": periods_data,
-            "task_details": task_details,
+            "task_details": page_details,
             "summary": {
                 "overall_average": int(round(overall_average)),
                 "best_period": best_period,
@@ -793,9 +787,67 @@ class PredefinedReportGenerator:
             "start_date": start_date,
             "end_date": end_date,
         }
+        if pagination:
+            result["pagination"] = pagination
         
         return result
 
+    @staticmethod
+    def _scan_turnaround_activities(task_ids, timestamp_gte, timestamp_lte=None):
+        """
+        One ordered pass over the intake, pickup and return activities of
+        ``task_ids``. Returns, per task with an intake and a pickup in range:
+        the first intake, the most recent pickup in range, the time spent away
+        (each pickup to the first return after it), and return/pickup counts.
+        """
+        activities = (
+            TaskActivity.objects.filter(
+                task_id__in=task_ids,
+                type__in=[
+                    TaskActivity.ActivityType.INTAKE,
+                    TaskActivity.ActivityType.PICKED_UP,
+                    TaskActivity.ActivityType.RETURNED,
+                ],
+            )
+            .order_by("task_id", "timestamp", "id")
+            .values_list("task_id", "type", "timestamp")
+        )
+
+        def in_range(timestamp):
+            return timestamp >= timestamp_gte and (timestamp_lte is None or timestamp <= timestamp_lte)
+
+        results = {}
+        for task_id, task_activities in groupby(activities.iterator(chunk_size=2000), key=itemgetter(0)):
+            first_intake = None
+            pickups = []
+            returns = []
+            for _, activity_type, timestamp in task_activities:
+                if activity_type == TaskActivity.ActivityType.INTAKE:
+                    first_intake = first_intake or timestamp
+                elif activity_type == TaskActivity.ActivityType.PICKED_UP:
+                    pickups.append(timestamp)
+                else:
+                    returns.append(timestamp)
+
+            pickups_in_range = [timestamp for timestamp in pickups if in_range(timestamp)]
+            if not pickups_in_range or first_intake is None:
+                continue
+
+            away_time = timedelta(0)
+            for pickup in pickups:
+                next_return = bisect_right(returns, pickup)
+                if next_return < len(returns):
+                    away_time += returns[next_return] - pickup
+
+            results[task_id] = {
+                "first_intake": first_intake,
+                "most_recent_pickup": max(pickups_in_range),
+                "away_time": away_time,
+                "return_count": len(returns),
+                "pickup_count": len(pickups_in_range),
+            }
+        return results
+
     @staticmethod
     def generate_technician_workload_report(date_range='last_7_days', start_date=None, end_date=None):
         """Generate technician workload report with date range support"""
@@ -857,4 +909,129 @@ class PredefinedReportGenerator:
             },
             "start_date": start_date,
             "end_date": end_date,
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    def generate_laptops_in_shop_by_location(date_range=None, start_date=None, end_date=None, include_tasks=True):
+        """
+        Devices currently in the shop (any status but Picked Up or Terminated)
+        grouped by where they physically are, with status and urgency
+        breakdowns. The report is cached for OCCUPANCY_CACHE_TTL seconds and
+        any Task save or delete invalidates it. It is a snapshot, so preset
+        date ranges are ignored; only an explicit start/end date narrows it
+        by ``date_in``.
+        """
+        cache_key = occupancy_cache_key(start_date, end_date, include_tasks)
+        report = cache.get(cache_key)
+        if report is None:
+            report = PredefinedReportGenerator._build_occupancy_report(start_date, end_date, include_tasks)
+            cache.set(cache_key, report, occupancy_cache_ttl())
+        return report
+
+    @staticmethod
+    def _build_occupancy_report(start_date=None, end_date=None, include_tasks=True):
+        # Served by the task_in_shop_idx partial index
+        in_shop = Task.objects.exclude(status__in=[Task.Status.PICKED_UP, Task.Status.TERMINATED])
+        if start_date and end_date:
+            date_filter = PredefinedReportGenerator._get_date_filter(None, start_date, end_date, field="date_in")[0]
+            in_shop = in_shop.filter(date_filter)
+
+        today = timezone.now().date()
+        # A device sent to the workshop is counted at the workshop
+        in_shop = in_shop.annotate(
+            location=Case(
+                When(
+                    workshop_status=Task.WorkshopStatus.IN_WORKSHOP,
+                    workshop_location__isnull=False,
+                    then=F("workshop_location__name"),
+                ),
+                default=F("current_location"),
+                output_field=CharField(),
+            )
+        )
+
+        # One GROUP BY for every count and the days-in-shop totals
+        groups = (
+            in_shop.values("location", "status", "urgency")
+            .annotate(
+                count=Count("id"),
+                days_in_shop=Sum(
+                    ExpressionWrapper(Value(today) - F("date_in"), output_field=DurationField())
+                ),
+            )
+            .order_by()
+        )
+
+        locations = {}
+        for group in groups:
+            location = locations.setdefault(
+                group["location"], {"count": 0, "days": 0, "status": {}, "urgency": {}}
+            )
+            location["count"] += group["count"]
+            location["days"] += group["days_in_shop"].total_seconds() / (24 * 3600)
+            location["status"][group["status"]] = location["status"].get(group["status"], 0) + group["count"]
+            location["urgency"][group["urgency"]] = location["urgency"].get(group["urgency"], 0) + group["count"]
+
+        tasks_by_location = {}
+        if include_tasks:
+            for task in in_shop.values(
+                "id", "title", "customer__name", "laptop_model", "brand__name", "status", "urgency",
+                "assigned_to", "assigned_to__first_name", "assigned_to__last_name", "date_in",
+                "estimated_cost", "location",
+            ).order_by("date_in", "id"):
+                tasks_by_location.setdefault(task["location"], []).append(
+                    {
+                        "task_id": task["id"],
+                        "task_title": task["title"],
+                        "customer_name": task["customer__name"] or "N/A",
+                        "laptop_model": task["laptop_model"],
+                        "brand": task["brand__name"] or "N/A",
+                        "status": task["status"],
+                        "urgency": task["urgency"],
+                        "assigned_technician": (
+                            f"{task['assigned_to__first_name']} {task['assigned_to__last_name']}"
+                            if task["assigned_to"]
+                            else "Unassigned"
+                        ),
+                        "date_in": task["date_in"].isoformat() if task["date_in"] else None,
+                        "days_in_shop": (today - task["date_in"]).days if task["date_in"] else 0,
+                        "estimated_cost": float(task["estimated_cost"] or 0),
+                    }
+                )
+
+        def breakdown(counts, key, total):
+            return [
+                {key: value, "count": count, "percentage": round(count / total * 100, 1)}
+                for value, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+            ]
+
+        locations_data = [
+            {
+                "location": name,
+                "total_tasks": location["count"],
+                "avg_days_in_shop": round(location["days"] / location["count"], 1),
+                "status_breakdown": breakdown(location["status"], "status", location["count"]),
+                "urgency_breakdown": breakdown(location["urgency"], "urgency", location["count"]),
+                "tasks": tasks_by_location.get(name, []),
+            }
+            for name, location in locations.items()
+        ]
+        locations_data.sort(key=lambda location: (-location["total_tasks"], location["location"]))
+
+        total_in_shop = sum(location["count"] for location in locations.values())
+        total_days = sum(location["days"] for location in locations.values())
+        busiest = locations_data[0] if locations_data else None
+
+        return {
+            "locations": locations_data,
+            "summary": {
+                "total_laptops_in_shop": total_in_shop,
+                "total_locations": len(locations_data),
+                "overall_avg_days_in_shop": round(total_days / total_in_shop, 1) if total_in_shop else 0,
+                "most_busy_location": busiest["location"] if busiest else "N/A",
+                "most_busy_location_count": busiest["total_tasks"] if busiest else 0,
+            },
+            "generated_at": timezone.now().isoformat(),
+            "start_date": start_date,
+            "end_date": end_date,
+        }
@@ -1,7 +1,11 @@
 # reports/services.py
-from django.db.models import Q, Sum, Count, Avg
+from django.db.models import (
+    Case, DateField, DecimalField, DurationField, Exists, ExpressionWrapper, F, OuterRef, Q,
+    Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce, Now, TruncDate
 from Eapp.models import Task, User
-from financials.models import  Payment
+from financials.models import CostBreakdown, Payment
 from datetime import datetime, timedelta
 from decimal import Decimal
 from django.utils import timezone
@@ -71,153 +75,191 @@ class ReportGenerator:
         
         if report_type in ['financial', 'revenue']:
             # For financial reports, filter by payment date or task creation date
+            # EXISTS instead of joining payments, so rows are not duplicated.
+            payments_in_range = Payment.objects.filter(
+                task=OuterRef('pk'), date__range=(start_date, end_date)
+            )
             self.queryset = self.queryset.filter(
                 Q(created_at__date__range=(start_date, end_date)) |
-                Q(payments__date__range=(start_date, end_date))
-            ).distinct()
+                Q(Exists(payments_in_range))
+            )
         else:
             # For operational reports, filter by task creation date
             self.queryset = self.queryset.filter(created_at__date__range=(start_date, end_date))
     
     def _build_queryset_data(self, fields):
         """Build report data based on selected fields"""
-        data = []
-        
-        # Select related to optimize queries
-        self.queryset = self.queryset.select_related(
-            'assigned_to', 'customer', 'brand', 'workshop_location'
-        ).prefetch_related('payments', 'cost_breakdowns')
-        
-        for task in self.queryset:
-            row = {}
-            
-            for field in fields:
-                try:
-                    if field == 'task_id':
-                        row['task_id'] = task.title
-                    
-                    elif field == 'customer_name':
-                        row['customer_name'] = task.customer.name if task.customer else 'N/A'
-                    
-                    elif field == 'laptop_model':
-                        row['laptop_model'] = task.laptop_model
-                    
-                    elif field == 'technician':
-                        # FIX: Handle technician field properly
-                        if task.assigned_to:
-                            row['technician'] = task.assigned_to.get_full_name()
-                        else:
-                            row['technician'] = 'Unassigned'
-                    
-                    elif field == 'status':
-                        row['status'] = task.get_status_display()
-                    
-                    elif field == 'date_in':
-                        row['date_in'] = task.date_in.isoformat() if task.date_in else 'N/A'
-                    
-                    elif field == 'date_completed':
-                        if task.status == 'Completed' and task.date_out:
-                            row['date_completed'] = task.date_out.date().isoformat()
-                        else:
-                            row['date_completed'] = 'N/A'
-                    
-                    elif field == 'turnaround_time':
-                        turnaround = self._calculate_turnaround_time(task)
-                        row['turnaround_time'] = turnaround
-                    
-                    elif field == 'total_cost':
-                        row['total_cost'] = str(task.calculate_total_cost())
-                    
-                    elif field == 'parts_cost':
-                        parts_cost = sum(
-                            item.amount for item in task.cost_breakdowns.filter(
-                                Q(category__icontains='part') | Q(description__icontains='part')
-                            )
-                        )
-                        row['parts_cost'] = str(parts_cost)
-                    
-                    elif field == 'labor_cost':
-                        labor_cost = sum(
-                            item.amount for item in task.cost_breakdowns.filter(
-                                Q(category__icontains='labor') | Q(description__icontains='labor')
-                            )
-                        )
-                        row['labor_cost'] = str(labor_cost)
-                    
-                    elif field == 'payment_status':
-                        row['payment_status'] = task.get_payment_status_display()
-                    
-                    elif field == 'urgency':
-                        row['urgency'] = task.get_urgency_display()
-                    
-                    elif field == 'location':
-                        row['location'] = task.current_location
-                    
-                    elif field == 'brand':
-                        row['brand'] = task.brand.name if task.brand else 'N/A'
-                    
-                    elif field == 'device_type':
-                        row['device_type'] = task.get_device_type_display()
-                    
-                    elif field == 'serial_number':
-                        row['serial_number'] = task.serial_number
-                    
-                    elif field == 'estimated_cost':
-                        row['estimated_cost'] = str(task.estimated_cost) if task.estimated_cost else '0.00'
-                    
-                    elif field == 'outstanding_balance':
-                        row['outstanding_balance'] = str(task.outstanding_balance)
-                    
-                    elif field == 'paid_amount':
-                        paid_amount = sum(p.amount for p in task.payments.all()) or Decimal('0.00')
-                        row['paid_amount'] = str(paid_amount)
-                    
-                    elif field == 'workshop_status':
-                        row['workshop_status'] = task.get_workshop_status_display() if task.workshop_status else 'N/A'
-                    
-                    elif field == 'created_by':
-                        row['created_by'] = task.created_by.get_full_name() if task.created_by else 'N/A'
-                    
-                    elif field == 'days_in_system':
-                        days_in_system = (timezone.now().date() - task.date_in).days
-                        row['days_in_system'] = str(days_in_system)
-                    
-                    else:
-                        # Try to get attribute directly
-                        if hasattr(task, field):
-                            value = getattr(task, field)
-                            if callable(value):
-                                value = value()
-                            row[field] = str(value) if value is not None else 'N/A'
-                        else:
-                            row[field] = 'N/A'
-                
-                except Exception as e:
-                    # Log the error but continue with other fields
-                    print(f"Error processing field {field} for task {task.title}: {str(e)}")
-                    row[field] = 'Error'
-            
-            data.append(row)
-        
-        return data
-    
-    def _calculate_turnaround_time(self, task):
-        """Calculate turnaround time in days, excluding workshop time."""
-        if not task.date_in:
-            return "N/A"
+        return [self._format_row(row, fields) for row in self._build_values_queryset(fields)]
 
-        end_date = task.date_out.date() if task.date_out else timezone.now().date()
-        total_duration = end_date - task.date_in
+    def iter_report_rows(self, chunk_size=2000):
+        """
+        Yield formatted rows from a server-side cursor, for exports that
+        should not hold the whole report in memory.
+        """
+        self._apply_date_filters()
+        fields = self.config.get('selectedFields', [])
+        for row in self._build_values_queryset(fields).iterator(chunk_size=chunk_size):
+            yield self._format_row(row, fields)
 
-        workshop_duration = timedelta(days=0)
-        if task.workshop_sent_at:
-            workshop_end = task.workshop_returned_at.date() if task.workshop_returned_at else timezone.now().date()
-            workshop_duration = workshop_end - task.workshop_sent_at.date()
+    def _build_values_queryset(self, fields):
+        """
+        Compile the selected fields into a single ``.values()`` query. Money
+        columns come from correlated subqueries and durations from DB date
+        arithmetic, so the query count does not depend on the number of tasks.
+        """
+        expressions = {}
+        for field in fields:
+            expressions.update(self._field_spec(field)[0])
+        return self.queryset.order_by('-created_at').values(**expressions)
 
-        turnaround_duration = total_duration - workshop_duration
-        days = turnaround_duration.days
+    def _format_row(self, row, fields):
+        return {field: self._field_spec(field)[1](row) for field in fields}
 
-        if task.status in ['Completed', 'Picked Up']:
-            return f"{days} days"
-        else:
-            return f"{days} days (ongoing)"
\ No newline at end of file
+    def _field_spec(self, field):
+        """Return ``(expressions, formatter)`` for a report field."""
+        if field in REPORT_FIELDS:
+            return REPORT_FIELDS[field]
+        # Fall back to any plain Task column.
+        model_field = next((f for f in Task._meta.concrete_fields if f.name == field), None)
+        if model_field is None:
+            return {}, lambda row: 'N/A'
+        alias = f'_{field}'
+        return {alias: F(model_field.attname)}, lambda row: _text(row[alias])
+
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+ZERO = Value(Decimal('0.00'), output_field=MONEY)
+FINISHED_STATUSES = ['Completed', 'Picked Up']
+
+
+def _today():
+    # Evaluated by the database, so the expressions in REPORT_FIELDS (built
+    # once at import) do not freeze the date the process started.
+    return TruncDate(Now())
+
+
+def _text(value, default='N/A'):
+    return str(value) if value is not None else default
+
+
+def _display(choices):
+    labels = dict(choices)
+    return lambda value: str(labels.get(value, value))
+
+
+def _full_name(row, prefix, default):
+    if row[f'{prefix}_id'] is None:
+        return default
+    return f"{row[f'{prefix}_first_name']} {row[f'{prefix}_last_name']}"
+
+
+def _user_name_expressions(prefix, relation):
+    return {
+        f'{prefix}_id': F(relation),
+        f'{prefix}_first_name': F(f'{relation}__first_name'),
+        f'{prefix}_last_name': F(f'{relation}__last_name'),
+    }
+
+
+def _cost_breakdown_sum(keyword):
+    costs = (
+        CostBreakdown.objects.filter(task=OuterRef('pk'))
+        .filter(Q(category__icontains=keyword) | Q(description__icontains=keyword))
+        .order_by()
+        .values('task')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    return Coalesce(Subquery(costs, output_field=MONEY), ZERO)
+
+
+def _payments_sum():
+    payments = (
+        Payment.objects.filter(task=OuterRef('pk'))
+        .order_by()
+        .values('task')
+        .annotate(total=Sum('amount'))
+        .values('total')
+    )
+    return Coalesce(Subquery(payments, output_field=MONEY), ZERO)
+
+
+def _turnaround_duration():
+    """Days from intake to pickup (or today), excluding time spent in the workshop."""
+    end_date = Coalesce(TruncDate('date_out'), _today())
+    workshop_duration = Case(
+        When(
+            workshop_sent_at__isnull=False,
+            then=ExpressionWrapper(
+                Coalesce(TruncDate('workshop_returned_at'), _today()) - TruncDate('workshop_sent_at'),
+                output_field=DurationField(),
+            ),
+        ),
+        default=Value(timedelta(0), output_field=DurationField()),
+    )
+    return ExpressionWrapper(
+        ExpressionWrapper(end_date - F('date_in'), output_field=DurationField()) - workshop_duration,
+        output_field=DurationField(),
+    )
+
+
+def _format_turnaround(row):
+    if row['_turnaround'] is None:
+        return 'N/A'
+    days = row['_turnaround'].days
+    if row['_turnaround_status'] in FINISHED_STATUSES:
+        return f"{days} days"
+    return f"{days} days (ongoing)"
+
+
+REPORT_FIELDS = {
+    'task_id': ({'_task_id': F('title')}, lambda row: row['_task_id']),
+    'customer_name': ({'_customer_name': F('customer__name')}, lambda row: _text(row['_customer_name'])),
+    'laptop_model': ({'_laptop_model': F('laptop_model')}, lambda row: row['_laptop_model']),
+    'technician': (
+        _user_name_expressions('_technician', 'assigned_to'),
+        lambda row: _full_name(row, '_technician', 'Unassigned'),
+    ),
+    'status': ({'_status': F('status')}, lambda row: _display(Task.Status.choices)(row['_status'])),
+    'date_in': ({'_date_in': F('date_in')}, lambda row: row['_date_in'].isoformat() if row['_date_in'] else 'N/A'),
+    'date_completed': (
+        {'_date_completed': Case(When(status='Completed', then=TruncDate('date_out')), default=None, output_field=DateField())},
+        lambda row: row['_date_completed'].isoformat() if row['_date_completed'] else 'N/A',
+    ),
+    'turnaround_time': (
+        {'_turnaround': _turnaround_duration(), '_turnaround_status': F('status')},
+        _format_turnaround,
+    ),
+    'total_cost': ({'_total_cost': F('total_cost')}, lambda row: str(row['_total_cost'])),
+    'parts_cost': ({'_parts_cost': _cost_breakdown_sum('part')}, lambda row: str(row['_parts_cost'])),
+    'labor_cost': ({'_labor_cost': _cost_breakdown_sum('labor')}, lambda row: str(row['_labor_cost'])),
+    'payment_status': (
+        {'_payment_status': F('payment_status')},
+        lambda row: _display(Task.PaymentStatus.choices)(row['_payment_status']),
+    ),
+    'urgency': ({'_urgency': F('urgency')}, lambda row: _display(Task.Urgency.choices)(row['_urgency'])),
+    'location': ({'_location': F('current_location')}, lambda row: row['_location']),
+    'brand': ({'_brand': F('brand__name')}, lambda row: _text(row['_brand'])),
+    'device_type': ({'_device_type': F('device_type')}, lambda row: _display(Task.DeviceType.choices)(row['_device_type'])),
+    'estimated_cost': (
+        {'_estimated_cost': F('estimated_cost')},
+        lambda row: str(row['_estimated_cost']) if row['_estimated_cost'] else '0.00',
+    ),
+    'paid_amount': ({'_paid_amount': _payments_sum()}, lambda row: str(row['_paid_amount'])),
+    'outstanding_balance': (
+        {'_outstanding_balance': ExpressionWrapper(F('total_cost') - _payments_sum(), output_field=MONEY)},
+        lambda row: str(row['_outstanding_balance']),
+    ),
+    'workshop_status': (
+        {'_workshop_status': F('workshop_status')},
+        lambda row: _display(Task.WorkshopStatus.choices)(row['_workshop_status']) if row['_workshop_status'] else 'N/A',
+    ),
+    'created_by': (
+        _user_name_expressions('_created_by', 'created_by'),
+        lambda row: _full_name(row, '_created_by', 'N/A'),
+    ),
+    'days_in_system': (
+        {'_days_in_system': ExpressionWrapper(_today() - F('date_in'), output_field=DurationField())},
+        lambda row: str(row['_days_in_system'].days),
+    ),
+}
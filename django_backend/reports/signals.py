@@ -0,0 +1,9 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from Eapp.models import Task
+from .occupancy import invalidate_occupancy_cache
+
+
+@receiver([post_save, post_delete], sender=Task)
+def invalidate_occupancy_on_task_change(sender, instance, **kwargs):
+    invalidate_occupancy_cache()
@@ -1,3 +1,377 @@
+import csv
+import io
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from common.models import Brand, Location
+from customers.models import Customer, PhoneNumber
+from Eapp.models import Task, TaskActivity
+from financials.models import CostBreakdown, Payment, PaymentMethod
+from users.models import User
+from .predefined_reports import PredefinedReportGenerator
+from .services import ReportGenerator
+
+
+class ReportTestData:
+    @classmethod
+    def create_users(cls):
+        cls.manager = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        cls.technician = User.objects.create_user(username='tech', password='testpassword', email='tech@gmail.com', first_name='Jane', last_name='Tech', role='Technician')
+        cls.customer = Customer.objects.create(name='Test Customer')
+        cls.method = PaymentMethod.objects.create(name='Cash')
+
+    @classmethod
+    def create_task(cls, title, **kwargs):
+        defaults = {
+            'customer': cls.customer, 'created_by': cls.manager, 'laptop_model': 'ThinkPad X1',
+            'current_location': 'Front Desk',
+        }
+        defaults.update(kwargs)
+        return Task.objects.create(title=title, **defaults)
+
+
+class CustomReportTests(ReportTestData, TestCase):
+    fields = [
+        'task_id', 'customer_name', 'technician', 'status', 'date_in', 'date_completed',
+        'turnaround_time', 'total_cost', 'parts_cost', 'labor_cost', 'paid_amount',
+        'outstanding_balance', 'brand', 'days_in_system', 'created_by', 'workshop_status',
+        'serial_number',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_users()
+        today = timezone.now().date()
+        cls.task = cls.create_task(
+            'A1-001', assigned_to=cls.technician, status='Completed', brand=Brand.objects.create(name='Lenovo'),
+            estimated_cost=Decimal('100.00'), total_cost=Decimal('100.00'), date_in=today - timedelta(days=10),
+            date_out=timezone.now() - timedelta(days=2),
+            workshop_sent_at=timezone.now() - timedelta(days=8), workshop_returned_at=timezone.now() - timedelta(days=5),
+        )
+        CostBreakdown.objects.create(task=cls.task, description='Screen part', amount=Decimal('40.00'), cost_type='Additive', category='Parts')
+        CostBreakdown.objects.create(task=cls.task, description='Labor', amount=Decimal('25.00'), cost_type='Additive', category='Service')
+        Payment.objects.create(task=cls.task, amount=Decimal('50.00'), method=cls.method)
+        cls.create_task('A1-002', date_in=today - timedelta(days=3))
+
+    def generate(self, fields):
+        return ReportGenerator({'selectedFields': fields, 'dateRange': 'last_30_days'}).generate_report()
+
+    def test_fields_are_computed_in_sql(self):
+        report = self.generate(self.fields)
+        self.assertTrue(report['success'], report.get('error'))
+        rows = {row['task_id']: row for row in report['data']}
+
+        completed = rows['A1-001']
+        self.assertEqual(completed['technician'], 'Jane Tech')
+        self.assertEqual(completed['brand'], 'Lenovo')
+        self.assertEqual(completed['total_cost'], '165.00')
+        self.assertEqual(completed['parts_cost'], '40.00')
+        self.assertEqual(completed['labor_cost'], '25.00')
+        self.assertEqual(completed['paid_amount'], '50.00')
+        self.assertEqual(completed['outstanding_balance'], '115.00')
+        self.assertEqual(completed['turnaround_time'], '5 days')
+        self.assertEqual(completed['days_in_system'], '10')
+        self.assertEqual(completed['date_completed'], (timezone.now() - timedelta(days=2)).date().isoformat())
+
+        pending = rows['A1-002']
+        self.assertEqual(pending['technician'], 'Unassigned')
+        self.assertEqual(pending['brand'], 'N/A')
+        self.assertEqual(pending['date_completed'], 'N/A')
+        self.assertEqual(pending['turnaround_time'], '3 days (ongoing)')
+        self.assertEqual(pending['workshop_status'], 'N/A')
+        self.assertEqual(pending['serial_number'], 'N/A')
+
+    def test_query_count_is_independent_of_row_count(self):
+        with self.assertNumQueries(1):
+            self.generate(self.fields)
+        for i in range(3, 30):
+            task = self.create_task(f'A1-{i:03d}')
+            CostBreakdown.objects.create(task=task, description='Part', amount=Decimal('5.00'), cost_type='Additive')
+        with self.assertNumQueries(1):
+            report = self.generate(self.fields)
+        self.assertEqual(report['metadata']['total_records'], 29)
+
+    def test_financial_reports_do_not_duplicate_tasks(self):
+        Payment.objects.create(task=self.task, amount=Decimal('10.00'), method=self.method)
+        report = ReportGenerator({
+            'selectedFields': ['task_id'], 'dateRange': 'last_30_days', 'selectedType': 'financial',
+        }).generate_report()
+        titles = [row['task_id'] for row in report['data']]
+        self.assertEqual(sorted(titles), ['A1-001', 'A1-002'])
+
+
+class ReportExportTests(ReportTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_users()
+        for i in range(1, 4):
+            cls.create_task(f'A1-{i:03d}', estimated_cost=Decimal('100.00'), total_cost=Decimal('100.00'))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+
+    def export_custom(self, export_format):
+        return self.client.post(f'/api/reports/generate/?format={export_format}', {
+            'reportName': 'Tasks', 'selectedType': 'operational',
+            'selectedFields': ['task_id', 'customer_name', 'total_cost'], 'dateRange': 'last_30_days',
+        }, format='json')
+
+    def test_custom_report_streams_csv(self):
+        response = self.export_custom('csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], ['task_id', 'customer_name', 'total_cost'])
+        self.assertEqual(sorted(row[0] for row in rows[1:]), ['A1-001', 'A1-002', 'A1-003'])
+        self.assertEqual(rows[1][1:], ['Test Customer', '100.00'])
+
+    def test_custom_report_streams_ndjson(self):
+        response = self.export_custom('ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])['customer_name'], 'Test Customer')
+
+    def test_custom_report_xlsx(self):
+        from openpyxl import load_workbook
+
+        response = self.export_custom('xlsx')
+        self.assertEqual(response.status_code, 200)
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        values = list(sheet.values)
+        self.assertEqual(values[0], ('task_id', 'customer_name', 'total_cost'))
+        self.assertEqual(len(values), 4)
+
+    def test_predefined_report_export(self):
+        response = self.client.get('/api/reports/outstanding-payments/?format=csv')
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 3)
+
+    def test_predefined_export_reads_rows_while_streaming(self):
+        response = self.client.get('/api/reports/outstanding-payments/?format=ndjson')
+        # The rows query runs as the body is consumed, not while building the report.
+        with CaptureQueriesContext(connection) as queries:
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([json.loads(line)['task_id'] for line in lines], ['A1-001', 'A1-002', 'A1-003'])
+
+    def test_json_response_is_unchanged_without_format(self):
+        response = self.client.get('/api/reports/task-status/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['success'])
+
+
+class PredefinedReportPaginationTests(ReportTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_users()
+        today = timezone.now().date()
+        for i in range(1, 8):
+            task = cls.create_task(
+                f'A1-{i:03d}', date_in=today - timedelta(days=i), estimated_cost=Decimal(100 * i),
+                total_cost=Decimal(100 * i),
+            )
+            Payment.objects.create(task=task, amount=Decimal('50.00'), method=cls.method, date=today - timedelta(days=i))
+        cls.create_task('A1-999', date_in=today, estimated_cost=Decimal('0.00'))
+
+    def outstanding(self, **kwargs):
+        return PredefinedReportGenerator.generate_outstanding_payments_report('last_30_days', **kwargs)
+
+    def test_outstanding_payments_page_is_limited_in_the_database(self):
+        report = self.outstanding(page=2, page_size=3)
+        self.assertEqual([row['task_id'] for row in report['outstanding_tasks']], ['A1-004', 'A1-003', 'A1-002'])
+        self.assertEqual(report['pagination']['total_tasks'], 7)
+        self.assertEqual(report['pagination']['total_pages'], 3)
+        self.assertTrue(report['pagination']['has_next'])
+        self.assertEqual(report['summary']['task_count'], 7)
+        self.assertEqual(report['summary']['total_outstanding'], 2450.0)
+
+    def test_outstanding_payments_cursor_continues_where_page_ended(self):
+        first = self.outstanding(page=1, page_size=3)
+        second = self.outstanding(page=2, page_size=3, cursor=first['pagination']['next_cursor'])
+        self.assertEqual([row['task_id'] for row in second['outstanding_tasks']], ['A1-004', 'A1-003', 'A1-002'])
+        self.assertEqual(second['outstanding_tasks'][0]['outstanding_balance'], 350.0)
+
+    def test_unpaginated_report_returns_every_row(self):
+        report = self.outstanding()
+        self.assertEqual(len(report['outstanding_tasks']), 7)
+        self.assertNotIn('pagination', report)
+
+    def test_outstanding_payments_query_count_is_constant(self):
+        PhoneNumber.objects.create(customer=self.customer, phone_number='0712000001')
+        PhoneNumber.objects.create(customer=self.customer, phone_number='0712000002')
+        with self.assertNumQueries(2):  # summary aggregate, rows
+            report = self.outstanding()
+        self.assertEqual(len(report['outstanding_tasks']), 7)
+        self.assertEqual({row['customer_phone'] for row in report['outstanding_tasks']}, {'0712000001'})
+        self.assertEqual(report['outstanding_tasks'][0]['days_overdue'], 7)
+
+    def test_revenue_summary_pages_by_date(self):
+        first = PredefinedReportGenerator.generate_revenue_summary_report('last_30_days', page=1, page_size=5)
+        self.assertEqual(len(first['payments_by_date']), 5)
+        self.assertEqual(first['pagination']['total_payments'], 7)
+        second = PredefinedReportGenerator.generate_revenue_summary_report(
+            'last_30_days', page=2, page_size=5, cursor=first['pagination']['next_cursor']
+        )
+        self.assertEqual(len(second['payments_by_date']), 2)
+        self.assertFalse(second['pagination']['has_next'])
+        self.assertEqual(first['monthly_totals']['payment_count'], 7)
+
+    def test_view_returns_database_page(self):
+        client = APIClient()
+        client.force_authenticate(user=self.manager)
+        response = client.get('/api/reports/outstanding-payments/?page=3&page_size=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['report']['outstanding_tasks']), 1)
+        self.assertFalse(response.data['report']['pagination']['has_next'])
+
+    def test_malformed_cursor_is_a_bad_request(self):
+        client = APIClient()
+        client.force_authenticate(user=self.manager)
+        for url in ('/api/reports/outstanding-payments/', '/api/reports/revenue-summary/'):
+            response = client.get(url, {'page_size': 3, 'cursor': 'not-a-cursor'})
+            self.assertEqual(response.status_code, 400, url)
+            self.assertIn('cursor', response.data['error'])
+
+
+class TechnicianPerformanceReportTests(ReportTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_users()
+        now = timezone.now()
+        for i, status in enumerate(['Completed', 'Completed', 'In Progress', 'Pending']):
+            task = cls.create_task(f'A1-{i:03d}', assigned_to=cls.technician, status=status, estimated_cost=Decimal('100.00'))
+            intake = TaskActivity.objects.create(task=task, type=TaskActivity.ActivityType.INTAKE, message='In')
+            TaskActivity.objects.filter(pk=intake.pk).update(timestamp=now - timedelta(days=2, hours=i))
+            if status == 'Completed':
+                TaskActivity.objects.create(task=task, type=TaskActivity.ActivityType.READY, message='Ready')
+
+    def generate(self, **kwargs):
+        return PredefinedReportGenerator.generate_technician_performance_report('last_30_days', **kwargs)
+
+    def test_metrics(self):
+        report = self.generate()
+        tech = report['technician_performance'][0]
+        self.assertEqual(tech['completed_tasks_count'], 2)
+        self.assertEqual(tech['total_revenue_generated'], 200.0)
+        self.assertEqual(tech['avg_completion_hours'], 48.5)
+        self.assertEqual(tech['current_in_progress_tasks'], 1)
+        self.assertEqual(tech['current_assigned_tasks'], 2)
+        self.assertEqual(tech['total_tasks_handled'], 4)
+        self.assertEqual(tech['completion_rate'], 50.0)
+        self.assertEqual(tech['status_counts'], {'Completed': 2, 'In Progress': 1, 'Pending': 1})
+        self.assertEqual(len(tech['tasks_by_status']['Completed']), 2)
+        self.assertEqual(tech['tasks_by_status']['Pending'][0]['customer_name'], 'Test Customer')
+
+    def test_query_count_does_not_grow_with_tasks(self):
+        with self.assertNumQueries(4):
+            self.generate()
+        other = User.objects.create_user(username='tech2', password='testpassword', email='tech2@gmail.com', first_name='Joe', last_name='Tech', role='Technician')
+        for i in range(10):
+            task = self.create_task(f'B1-{i:03d}', assigned_to=other)
+            TaskActivity.objects.create(task=task, type=TaskActivity.ActivityType.INTAKE, message='In')
+            TaskActivity.objects.create(task=task, type=TaskActivity.ActivityType.READY, message='Ready')
+        with self.assertNumQueries(4):
+            report = self.generate()
+        self.assertEqual(report['summary']['total_completed_tasks'], 12)
+
+    def test_task_lists_can_be_omitted(self):
+        with self.assertNumQueries(3):
+            report = self.generate(include_tasks=False)
+        tech = report['technician_performance'][0]
+        self.assertEqual(tech['tasks_by_status'], {})
+        self.assertEqual(tech['total_tasks_handled'], 4)
+
+
+class TurnaroundTimeReportTests(ReportTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_users()
+        cls.now = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        task = cls.create_task('A1-001', assigned_to=cls.technician)
+        # 6 days gross, 2 days away after the first pickup
+        cls.add_activity(task, TaskActivity.ActivityType.INTAKE, days_ago=6)
+        cls.add_activity(task, TaskActivity.ActivityType.PICKED_UP, days_ago=4)
+        cls.add_activity(task, TaskActivity.ActivityType.RETURNED, days_ago=2)
+        cls.add_activity(task, TaskActivity.ActivityType.PICKED_UP, days_ago=0)
+        cls.create_task('A1-002')
+
+    @classmethod
+    def add_activity(cls, task, activity_type, days_ago):
+        activity = TaskActivity.objects.create(task=task, type=activity_type, message='Event')
+        TaskActivity.objects.filter(pk=activity.pk).update(timestamp=cls.now - timedelta(days=days_ago))
+
+    def test_single_scan_computes_net_turnaround(self):
+        with self.assertNumQueries(2):
+            report = PredefinedReportGenerator.generate_turnaround_time_report('overall', 'last_30_days')
+        detail, = report['task_details']
+        self.assertEqual(detail['turnaround_days'], 4)
+        self.assertEqual(detail['return_count'], 1)
+        self.assertEqual(detail['pickup_count'], 2)
+        self.assertEqual(detail['assigned_technician'], 'Jane Tech')
+        self.assertEqual(detail['pickup_time'], '12:00 PM')  # Africa/Dar_es_Salaam
+        self.assertEqual(report['periods'], [{'period': 'overall', 'average_turnaround': 4, 'tasks_completed': 1}])
+
+
+class LaptopsInShopReportTests(ReportTestData, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_users()
+        today = timezone.now().date()
+        workshop = Location.objects.create(name='Workshop A', is_workshop=True)
+        cls.create_task('A1-001', status='Pending', date_in=today - timedelta(days=2))
+        cls.create_task('A1-002', status='In Progress', urgency='Expedited', date_in=today - timedelta(days=4))
+        cls.create_task(
+            'A1-003', status='In Progress', date_in=today - timedelta(days=6),
+            workshop_status='In Workshop', workshop_location=workshop,
+        )
+        cls.create_task('A1-004', status='Picked Up')
+        cls.create_task('A1-005', status='Terminated')
+
+    def setUp(self):
+        cache.clear()
+
+    def generate(self, **kwargs):
+        return PredefinedReportGenerator.generate_laptops_in_shop_by_location(**kwargs)
+
+    def test_groups_devices_by_location(self):
+        with self.assertNumQueries(2):  # GROUP BY counts, task lists
+            report = self.generate()
+        self.assertEqual(report['summary']['total_laptops_in_shop'], 3)
+        self.assertEqual(report['summary']['most_busy_location'], 'Front Desk')
+        self.assertEqual(report['summary']['overall_avg_days_in_shop'], 4.0)
+        front, workshop = report['locations']
+        self.assertEqual((front['location'], front['total_tasks'], front['avg_days_in_shop']), ('Front Desk', 2, 3.0))
+        self.assertEqual(
+            front['status_breakdown'],
+            [{'status': 'In Progress', 'count': 1, 'percentage': 50.0}, {'status': 'Pending', 'count': 1, 'percentage': 50.0}],
+        )
+        self.assertEqual([task['task_title'] for task in front['tasks']], ['A1-002', 'A1-001'])
+        self.assertEqual((workshop['location'], workshop['total_tasks']), ('Workshop A', 1))
+
+    def test_report_is_cached_until_a_task_changes(self):
+        self.generate(include_tasks=False)
+        with self.assertNumQueries(0):
+            self.generate(include_tasks=False)
+        Task.objects.filter(title='A1-004').get().save()
+        with self.assertNumQueries(1):
+            report = self.generate(include_tasks=False)
+        self.assertEqual(report['locations'][0]['tasks'], [])
 
-# Create your tests here.
+    def test_view(self):
+        client = APIClient()
+        client.force_authenticate(user=self.manager)
+        response = client.get('/api/reports/laptops-in-shop/?date_range=last_30_days')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['report']['summary']['total_locations'], 2)
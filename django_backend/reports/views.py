@@ -1,14 +1,13 @@
 from django.shortcuts import render
-from django.http import HttpResponse
-import csv
 
 # Create your views here.
 from rest_framework import permissions, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, content_negotiation_class, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django.utils import timezone
-from django.db.models import Sum
-from financials.models import Payment
+from django.db.models import F, Q, Sum
+from financials.models import DailyFinancialRollup, Payment
 from datetime import timedelta
 from .services import ReportGenerator
 from Eapp.serializers import ReportConfigSerializer
@@ -17,13 +16,28 @@ from users.permissions import (
     IsAdminOrManagerOrFrontDeskOrAccountant,
 )
 from .predefined_reports import PredefinedReportGenerator
+from .exports import (
+    EXPORT_CHUNK_SIZE,
+    ReportContentNegotiation,
+    export_response,
+    predefined_export_response,
+    requested_export_format,
+)
 from Eapp.models import Task
 
 
+def _query_flag(request, name, default=True):
+    value = request.GET.get(name)
+    if value is None:
+        return default
+    return value.lower() not in ("false", "0", "no")
+
+
 @api_view(["POST"])
 @permission_classes(
     [permissions.IsAuthenticated, IsAdminOrManagerOrFrontDeskOrAccountant]
 )
+@content_negotiation_class(ReportContentNegotiation)
 def generate_custom_report(request):
 
     try:
@@ -37,6 +51,15 @@ def generate_custom_report(request):
             )
 
         generator = ReportGenerator(report_config)
+        export_format = requested_export_format(request)
+        if export_format:
+            return export_response(
+                generator.iter_report_rows(chunk_size=EXPORT_CHUNK_SIZE),
+                export_format,
+                "custom-report",
+                columns=report_config.get("selectedFields", []),
+            )
+
         report_data = generator.generate_report()
 
         return Response({"success": True, "report": report_data})
@@ -117,59 +140,36 @@ def get_report_field_options(request):
 
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated, IsAdminOrManagerOrFrontDeskOrAccountant])
+@content_negotiation_class(ReportContentNegotiation)
 def get_revenue_summary(request):
     """Get revenue summary report with custom date range and pagination support"""
     
     date_range = request.GET.get("date_range", "last_30_days")
     start_date = request.GET.get("start_date")
     end_date = request.GET.get("end_date")
+    export_format = requested_export_format(request)
     page = int(request.GET.get("page", 1))
     page_size = int(request.GET.get("page_size", 10))
+    cursor = request.GET.get("cursor")
    
     try:
-        print("🔄 Calling PredefinedReportGenerator.generate_revenue_summary_report...")
-        
+        if export_format:
+            report_data = PredefinedReportGenerator.generate_revenue_summary_report(
+                date_range, start_date, end_date, chunk_size=EXPORT_CHUNK_SIZE
+            )
+            return predefined_export_response("revenue_summary", report_data, export_format)
+
+        # Only the requested page of payments_by_date is fetched from the DB
         report_data = PredefinedReportGenerator.generate_revenue_summary_report(
-            date_range, start_date, end_date
+            date_range, start_date, end_date, page=page, page_size=page_size, cursor=cursor
         )
         
-        print("✅ Report data generated successfully")
-        
-        # Add pagination to payments_by_date
-        payments_by_date = report_data.get("payments_by_date", [])
-        total_payments = len(payments_by_date)
-        start_index = (page - 1) * page_size
-        end_index = start_index + page_size
-        
-        # Handle pagination bounds
-        if start_index >= total_payments:
-            paginated_payments = []
-        else:
-            paginated_payments = payments_by_date[start_index:end_index]
-        
-        # Create paginated response
-        paginated_report = {
-            "payments_by_date": paginated_payments,
-            "monthly_totals": report_data.get("monthly_totals", {}),
-            "payment_methods": report_data.get("payment_methods", []),
-            "date_range": report_data.get("date_range"),
-            "duration_info": report_data.get("duration_info", {}),
-            "start_date": report_data.get("start_date"),
-            "end_date": report_data.get("end_date"),
-            "pagination": {
-                "current_page": page,
-                "page_size": page_size,
-                "total_payments": total_payments,
-                "total_pages": (total_payments + page_size - 1) // page_size,
-                "has_next": end_index < total_payments,
-                "has_previous": page > 1
-            }
-        }
-        
         return Response(
-            {"success": True, "report": paginated_report, "type": "revenue_summary"}
+            {"success": True, "report": report_data, "type": "revenue_summary"}
         )
-        
+
+    except ValidationError as e:
+        return Response({"success": False, "error": e.detail}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         print(f"❌ ERROR in get_revenue_summary view:")
         print(f"❌ Error type: {type(e).__name__}")
@@ -190,16 +190,20 @@ def get_revenue_summary(request):
 @permission_classes(
     [permissions.IsAuthenticated, IsAdminOrManagerOrFrontDeskOrAccountant]
 )
+@content_negotiation_class(ReportContentNegotiation)
 def get_task_status_report(request):
     """Get task status report with date range support"""
     date_range = request.GET.get("date_range", "last_30_days")
     start_date = request.GET.get("start_date")
     end_date = request.GET.get("end_date")
+    export_format = requested_export_format(request)
 
     try:
         report_data = PredefinedReportGenerator.generate_task_status_report(
             date_range, start_date, end_date
         )
+        if export_format:
+            return predefined_export_response("task_status", report_data, export_format)
         return Response({"success": True, "report": report_data, "type": "task_status"})
     except Exception as e:
         return Response(
@@ -212,16 +216,22 @@ def get_task_status_report(request):
 @permission_classes(
     [permissions.IsAuthenticated, IsAdminOrManagerOrFrontDeskOrAccountant]
 )
+@content_negotiation_class(ReportContentNegotiation)
 def get_technician_performance(request):
     """Get technician performance report with custom date range support"""
     date_range = request.GET.get("date_range", "last_30_days")
     start_date = request.GET.get("start_date")
     end_date = request.GET.get("end_date")
+    export_format = requested_export_format(request)
+    # ?include_tasks=false drops the per-status task lists from the payload
+    include_tasks = _query_flag(request, "include_tasks")
 
     try:
         report_data = PredefinedReportGenerator.generate_technician_performance_report(
-            date_range, start_date, end_date
+            date_range, start_date, end_date, include_tasks=include_tasks
         )
+        if export_format:
+            return predefined_export_response("technician_performance", report_data, export_format)
         return Response(
             {"success": True, "report": report_data, "type": "technician_performance"}
         )
@@ -236,82 +246,30 @@ def get_technician_performance(request):
 @permission_classes(
     [permissions.IsAuthenticated, IsAdminOrManagerOrFrontDeskOrAccountant]
 )
+@content_negotiation_class(ReportContentNegotiation)
 def get_turnaround_time(request):
     """Get turnaround time report with date range and pagination support"""
     date_range = request.GET.get("date_range", "last_30_days")
     start_date = request.GET.get("start_date")
     end_date = request.GET.get("end_date")
+    export_format = requested_export_format(request)
     period_type = request.GET.get("period_type", "weekly")
     page = int(request.GET.get("page", 1))
     page_size = int(request.GET.get("page_size", 10))
 
-    print(f"🔍 DEBUG - Turnaround Time Request:")
-    print(f"🔍   date_range: {date_range}")
-    print(f"🔍   start_date: {start_date}")
-    print(f"🔍   end_date: {end_date}")
-    print(f"🔍   period_type: {period_type}")
-    print(f"🔍   page: {page}")
-    print(f"🔍   page_size: {page_size}")
-
     try:
-        print(f"🔍 DEBUG - Calling PredefinedReportGenerator.generate_turnaround_time_report...")
-        
+        if export_format:
+            report_data = PredefinedReportGenerator.generate_turnaround_time_report(
+                period_type, date_range, start_date, end_date
+            )
+            return predefined_export_response("turnaround_time", report_data, export_format)
+
         report_data = PredefinedReportGenerator.generate_turnaround_time_report(
-            period_type, date_range, start_date, end_date
+            period_type, date_range, start_date, end_date, page=page, page_size=page_size
         )
         
-        print(f"🔍 DEBUG - Raw report data received:")
-        print(f"🔍   periods count: {len(report_data.get('periods', []))}")
-        print(f"🔍   task_details count: {len(report_data.get('task_details', []))}")
-        print(f"🔍   summary keys: {report_data.get('summary', {}).keys()}")
-        
-        # Add pagination to task_details
-        task_details = report_data.get("task_details", [])
-        total_tasks = len(task_details)
-        start_index = (page - 1) * page_size
-        end_index = start_index + page_size
-        
-        print(f"🔍 DEBUG - Pagination calculations:")
-        print(f"🔍   total_tasks: {total_tasks}")
-        print(f"🔍   start_index: {start_index}")
-        print(f"🔍   end_index: {end_index}")
-        
-        # Handle pagination bounds
-        if start_index >= total_tasks:
-            print(f"🔍 DEBUG - Start index out of range! Returning empty page.")
-            paginated_task_details = []
-        else:
-            print(f"🔍 DEBUG - Slicing task_details from {start_index} to {end_index}")
-            paginated_task_details = task_details[start_index:end_index]
-            print(f"🔍 DEBUG - Paginated tasks count: {len(paginated_task_details)}")
-        
-        # Create paginated response
-        paginated_report = {
-            "periods": report_data.get("periods", []),
-            "task_details": paginated_task_details,
-            "summary": report_data.get("summary", {}),
-            "date_range": report_data.get("date_range"),
-            "duration_info": report_data.get("duration_info", {}),
-            "start_date": report_data.get("start_date"),
-            "end_date": report_data.get("end_date"),
-            "pagination": {
-                "current_page": page,
-                "page_size": page_size,
-                "total_tasks": total_tasks,
-                "total_pages": (total_tasks + page_size - 1) // page_size,
-                "has_next": end_index < total_tasks,
-                "has_previous": page > 1
-            }
-        }
-
-        print(f"🔍 DEBUG - Final pagination info:")
-        print(f"🔍   current_page: {paginated_report['pagination']['current_page']}")
-        print(f"🔍   total_pages: {paginated_report['pagination']['total_pages']}")
-        print(f"🔍   has_next: {paginated_report['pagination']['has_next']}")
-        print(f"🔍   has_previous: {paginated_report['pagination']['has_previous']}")
-        
         return Response(
-            {"success": True, "report": paginated_report, "type": "turnaround_time"}
+            {"success": True, "report": report_data, "type": "turnaround_time"}
         )
     except Exception as e:
         print(f"❌ DEBUG - ERROR in get_turnaround_time:")
@@ -331,16 +289,20 @@ def get_turnaround_time(request):
 @permission_classes(
     [permissions.IsAuthenticated, IsAdminOrManagerOrFrontDeskOrAccountant]
 )
+@content_negotiation_class(ReportContentNegotiation)
 def get_technician_workload(request):
     """Get technician workload report with date range support"""
     date_range = request.GET.get("date_range", "last_30_days")
     start_date = request.GET.get("start_date")
     end_date = request.GET.get("end_date")
+    export_format = requested_export_format(request)
 
     try:
         report_data = PredefinedReportGenerator.generate_technician_workload_report(
             date_range, start_date, end_date
         )
+        if export_format:
+            return predefined_export_response("technician_workload", report_data, export_format)
         return Response(
             {"success": True, "report": report_data, "type": "technician_workload"}
         )
@@ -355,16 +317,20 @@ def get_technician_workload(request):
 @permission_classes(
     [permissions.IsAuthenticated, IsAdminOrManagerOrFrontDeskOrAccountant]
 )
+@content_negotiation_class(ReportContentNegotiation)
 def get_payment_methods_report(request):
     """Get payment methods report with custom date range support"""
     date_range = request.GET.get("date_range", "last_30_days")
     start_date = request.GET.get("start_date")
     end_date = request.GET.get("end_date")
+    export_format = requested_export_format(request)
 
     try:
         report_data = PredefinedReportGenerator.generate_payment_methods_report(
             date_range, start_date, end_date
         )
+        if export_format:
+            return predefined_export_response("payment_methods", report_data, export_format)
         return Response(
             {"success": True, "report": report_data, "type": "payment_methods"}
         )
@@ -437,45 +403,24 @@ def revenue_overview(request):
     """
     now = timezone.now()
     today = now.date()
-
-    # Opening balance
-    opening_balance = (
-        Payment.objects.filter(date__lt=today).aggregate(total=Sum("amount"))["total"]
-        or 0
-    )
-
-    # Today's revenue
-    today_revenue = (
-        Payment.objects.filter(date=today, amount__gt=0).aggregate(total=Sum("amount"))[
-            "total"
-        ]
-        or 0
-    )
-
-    # Yesterday's revenue
     yesterday = today - timedelta(days=1)
-    yesterday_revenue = (
-        Payment.objects.filter(date=yesterday, amount__gt=0).aggregate(
-            total=Sum("amount")
-        )["total"]
-        or 0
-    )
 
-    # Today's expenditure
-    today_expenditure = (
-        Payment.objects.filter(date=today, amount__lt=0).aggregate(total=Sum("amount"))[
-            "total"
-        ]
-        or 0
-    )
-
-    # Yesterday's expenditure
-    yesterday_expenditure = (
-        Payment.objects.filter(date=yesterday, amount__lt=0).aggregate(
-            total=Sum("amount")
-        )["total"]
-        or 0
+    # Everything comes from the daily rollups in one aggregate, so the opening
+    # balance costs one row per day/method/category instead of every payment.
+    net_amount = F("revenue") + F("refunds") + F("expenditure")
+    negative_amount = F("refunds") + F("expenditure")
+    totals = DailyFinancialRollup.objects.aggregate(
+        opening_balance=Sum(net_amount, filter=Q(date__lt=today)),
+        today_revenue=Sum("revenue", filter=Q(date=today)),
+        yesterday_revenue=Sum("revenue", filter=Q(date=yesterday)),
+        today_expenditure=Sum(negative_amount, filter=Q(date=today)),
+        yesterday_expenditure=Sum(negative_amount, filter=Q(date=yesterday)),
     )
+    opening_balance = totals["opening_balance"] or 0
+    today_revenue = totals["today_revenue"] or 0
+    yesterday_revenue = totals["yesterday_revenue"] or 0
+    today_expenditure = totals["today_expenditure"] or 0
+    yesterday_expenditure = totals["yesterday_expenditure"] or 0
 
     # Percentage changes
     day_over_day_change = (
@@ -504,14 +449,15 @@ def revenue_overview(request):
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated, IsAdminOrManagerOrFrontDeskOrAccountant])
 def get_laptops_in_shop_by_location(request):
-    """Get laptops in shop by location report with date range support"""
+    """Get laptops in shop by location report (cached occupancy snapshot)"""
     date_range = request.GET.get("date_range", "last_30_days")
     start_date = request.GET.get("start_date")
     end_date = request.GET.get("end_date")
+    include_tasks = _query_flag(request, "include_tasks")
 
     try:
         report_data = PredefinedReportGenerator.generate_laptops_in_shop_by_location(
-            date_range, start_date, end_date
+            date_range, start_date, end_date, include_tasks=include_tasks
         )
         return Response({
             "success": True, 
@@ -526,49 +472,38 @@ def get_laptops_in_shop_by_location(request):
         
 @api_view(["GET"])
 @permission_classes([permissions.IsAuthenticated, IsAdminOrManagerOrFrontDeskOrAccountant])
+@content_negotiation_class(ReportContentNegotiation)
 def get_outstanding_payments(request):
     """Get outstanding payments report with date range and pagination support"""
     date_range = request.GET.get("date_range", "last_30_days")
     start_date = request.GET.get("start_date")
     end_date = request.GET.get("end_date")
+    export_format = requested_export_format(request)
     page = int(request.GET.get("page", 1))
     page_size = int(request.GET.get("page_size", 10))
+    cursor = request.GET.get("cursor")
 
     try:
+        if export_format:
+            report_data = PredefinedReportGenerator.generate_outstanding_payments_report(
+                date_range, start_date, end_date, chunk_size=EXPORT_CHUNK_SIZE
+            )
+            return predefined_export_response("outstanding_payments", report_data, export_format)
+
+        # LIMIT/OFFSET (or the cursor) is applied in the DB; totals come from an aggregate
         report_data = PredefinedReportGenerator.generate_outstanding_payments_report(
-            date_range, start_date, end_date
+            date_range, start_date, end_date, page=page, page_size=page_size, cursor=cursor
         )
         
-        # Add pagination to the response
-        tasks = report_data["outstanding_tasks"]
-        total_tasks = len(tasks)
-        start_index = (page - 1) * page_size
-        end_index = start_index + page_size
-        paginated_tasks = tasks[start_index:end_index]
-        
-        paginated_report = {
-            "outstanding_tasks": paginated_tasks,
-            "summary": report_data["summary"],
-            "date_range": report_data["date_range"],
-            "start_date": report_data["start_date"],
-            "end_date": report_data["end_date"],
-            "pagination": {
-                "current_page": page,
-                "page_size": page_size,
-                "total_tasks": total_tasks,
-                "total_pages": (total_tasks + page_size - 1) // page_size,
-                "has_next": end_index < total_tasks,
-                "has_previous": page > 1
-            }
-        }
-        
         return Response({
             "success": True, 
-            "report": paginated_report, 
+            "report": report_data, 
             "type": "outstanding_payments"
         })
+    except ValidationError as e:
+        return Response({"success": False, "error": e.detail}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {"success": False, "error": str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        )
\ No newline at end of file
+        )
@@ -25,6 +25,13 @@ class UserListSerializer(serializers.ModelSerializer):
         model = User
         fields = ['full_name']
 
+class UserReferenceSerializer(UserSerializer):
+    """Just enough of a user to show who did something (activity timelines)."""
+
+    class Meta(UserSerializer.Meta):
+        fields = ('id', 'full_name', 'role', 'profile_picture_url')
+        read_only_fields = fields
+
 class UserProfileUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
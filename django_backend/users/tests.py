@@ -1,3 +1,33 @@
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from common.testing import QueryBudgetMixin
+from .models import User
+
+
+class UserQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='manager', password='testpassword', email='manager@gmail.com', first_name='Test', last_name='Manager', role='Manager')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def add_technicians(self, count):
+        start = User.objects.count()
+        User.objects.bulk_create([
+            User(
+                username=f'tech{number}', email=f'tech{number}@gmail.com',
+                first_name='Tech', last_name=str(number), role='Technician', is_workshop=True,
+            )
+            for number in range(start, start + count)
+        ])
+
+    def test_user_list(self):
+        self.assertQueryBudget(1, self.add_technicians, reverse('user-list'))
+
+    def test_user_detail(self):
+        self.assertQueryBudget(1, lambda count: None, reverse('user-detail', args=[self.user.pk]))
+
+    def test_technician_lists(self):
+        self.assertQueryBudget(1, self.add_technicians, reverse('list-list-technicians'))
+        self.assertQueryBudget(1, self.add_technicians, reverse('list-list-workshop-technicians'))
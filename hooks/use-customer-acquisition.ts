@@ -1,17 +1,41 @@
 import { useQuery } from '@tanstack/react-query';
 import { apiClient } from '@/lib/api-client';
 
-interface MonthlyAcquisitionData {
-  month: string;
+export type AcquisitionGranularity = 'day' | 'week' | 'month';
+
+interface AcquisitionBucket {
+  period: string;
   customers: number;
 }
 
-export function useCustomerAcquisition() {
-  const { data, isError, isLoading } = useQuery<MonthlyAcquisitionData[]>({
-    queryKey: ['customer-acquisition'],
+interface AcquisitionData extends AcquisitionBucket {
+  month: string;
+}
+
+interface AcquisitionOptions {
+  granularity?: AcquisitionGranularity;
+  start?: string;
+  end?: string;
+}
+
+// Periods are ISO dates; format them as local calendar dates, not UTC midnights.
+const formatPeriod = (period: string, granularity: AcquisitionGranularity) => {
+  const [year, month, day] = period.split('-').map(Number);
+  const date = new Date(year, month - 1, day);
+  return granularity === 'month'
+    ? date.toLocaleDateString(undefined, { month: 'short', year: '2-digit' })
+    : date.toLocaleDateString(undefined, { month: 'short', day: 'numeric' });
+};
+
+export function useCustomerAcquisition({ granularity = 'month', start, end }: AcquisitionOptions = {}) {
+  const { data, isError, isLoading } = useQuery<AcquisitionData[]>({
+    queryKey: ['customer-acquisition', granularity, start, end],
     queryFn: async () => {
-      const response = await apiClient.get('customers/monthly_acquisition/');
-      return response.data;
+      const response = await apiClient.get('customers/acquisition/', { params: { granularity, start, end } });
+      return (response.data as AcquisitionBucket[]).map((bucket) => ({
+        ...bucket,
+        month: formatPeriod(bucket.period, granularity),
+      }));
     },
   });
 
@@ -72,7 +72,11 @@ export const updateTask = (id: string, data: any) => apiClient.patch(`/tasks/${i
 export const deleteTask = (id: string) => apiClient.delete(`/tasks/${id}/`);
 export const createCustomer = (data: any) => apiClient.post('/customers/create/', data);
 export const getCustomers = () => apiClient.get('/customers/');
+export const resolveCustomers = (phoneNumbers: string[]) =>
+  apiClient.get('/customers/resolve/', { params: { phone: phoneNumbers.join(',') } });
 export const getCustomer = (customerId: number) => apiClient.get(`/customers/${customerId}/`);
+export const getCustomerSummary = (customerId: number, params: any = {}) =>
+  apiClient.get(`/customers/${customerId}/summary/`, { params });
 export const updateCustomer = (customerId: number, data: any) => apiClient.patch(`/customers/${customerId}/`, data);
 export const deleteCustomer = (customerId: number) => apiClient.delete(`/customers/${customerId}/`);
 
@@ -81,7 +85,17 @@ export const createReferrer = (data: any) => apiClient.post('/referrers/', data)
 export const updateReferrer = (referrerId: number, data: any) => apiClient.patch(`/referrers/${referrerId}/`, data);
 export const deleteReferrer = (referrerId: number) => apiClient.delete(`/referrers/${referrerId}/`);
 
-export const getTaskActivities = (taskId: string) => apiClient.get(`/tasks/${taskId}/activities/`);
+// The timeline is paged by cursor; this follows `next` to load every page.
+export const getTaskActivities = async (taskId: string, params: Record<string, string> = {}) => {
+  const activities: any[] = [];
+  let response = await apiClient.get(`/tasks/${taskId}/activities/`, { params });
+  activities.push(...response.data.results);
+  while (response.data.next) {
+    response = await apiClient.get(response.data.next);
+    activities.push(...response.data.results);
+  }
+  return activities;
+};
 export const addTaskActivity = (taskId: string, data: any) => apiClient.post(`/tasks/${taskId}/add-activity/`, data);
 
 
@@ -1,7 +1,7 @@
 "use client"
 
 import type React from "react"
-import { createContext, useContext, useState, useEffect } from "react"
+import { createContext, useContext, useState } from "react"
 
 export interface Notification {
   id: string
@@ -86,29 +86,6 @@ export function NotificationProvider({ children }: { children: React.ReactNode }
     setNotifications((prev) => prev.filter((n) => n.id !== id))
   }
 
-  // Simulate real-time notifications for stuck tasks
-  useEffect(() => {
-    const interval = setInterval(
-      () => {
-        // Check for tasks that might be stuck (this would normally come from your backend)
-        const now = new Date()
-        const shouldAddNotification = Math.random() < 0.1 // 10% chance every 5 minutes
-
-        if (shouldAddNotification) {
-          addNotification({
-            title: "Task Status Update",
-            message: `Task T-${Math.floor(Math.random() * 9000) + 1000} status has been updated`,
-            type: "info",
-            priority: "low",
-          })
-        }
-      },
-      5 * 60 * 1000,
-    ) // Check every 5 minutes
-
-    return () => clearInterval(interval)
-  }, [])
-
   return (
     <NotificationContext.Provider
       value={{
@@ -1,14 +1,11 @@
 "use client"
 
 import type React from "react"
-import { createContext, useContext, useEffect, useState, useCallback } from "react"
-
-interface KPIData {
-  totalActiveTasks: number
-  revenueThisMonth: number
-  tasksReadyForPickup: number
-  averageRepairTime: string
-}
+import { createContext, useContext, useEffect, useRef, useState, useCallback } from "react"
+import { useQueryClient } from "@tanstack/react-query"
+import { useAuth } from "./auth-context"
+import { useNotifications } from "./notification-context"
+import { API_CONFIG } from "./config"
 
 interface TaskStatus {
   name: string
@@ -16,35 +13,49 @@ interface TaskStatus {
   color: string
 }
 
-interface TechnicianWorkload {
-  name: string
-  tasks: number
-}
-
 interface Activity {
   id: number
   type: string
   message: string
-  customer: string
+  task: string
   time: string
   icon: string
   color: string
 }
 
+// Events pushed by the backend (django_backend/common/events.py). They only
+// say what changed; listeners re-fetch the records they display.
+export interface ServerEvent {
+  type: string
+  task?: string | null
+  id?: number
+  status?: string
+  assigned_to?: number | null
+  amount?: string
+  activity?: {
+    id: number
+    type: string
+    message: string
+    user: number | null
+    timestamp: string | null
+  }
+}
+
 interface WebSocketData {
-  kpiData: KPIData
-  taskStatuses: TaskStatus[]
-  technicianWorkload: TechnicianWorkload[]
+  taskStatuses?: TaskStatus[]
   recentActivities: Activity[]
   lastUpdated: Date
 }
 
+type EventListener = (event: ServerEvent) => void
+
 interface WebSocketContextType {
   data: WebSocketData | null
   isConnected: boolean
   isConnecting: boolean
   error: string | null
   reconnect: () => void
+  subscribe: (listener: EventListener) => () => void
 }
 
 const WebSocketContext = createContext<WebSocketContextType | undefined>(undefined)
@@ -57,159 +68,177 @@ export function useWebSocket() {
   return context
 }
 
-// Mock WebSocket server simulation
-class MockWebSocketServer {
-  private callbacks: ((data: WebSocketData) => void)[] = []
-  private interval: NodeJS.Timeout | null = null
-  private activityCounter = 6
-
-  private generateRandomData(): WebSocketData {
-    const activities = [
-      {
-        type: "task_created",
-        message: "New repair task created",
-        customers: ["John Doe", "Sarah Wilson", "Mike Johnson"],
-        icon: "Plus",
-        color: "text-green-600",
-      },
-      {
-        type: "payment_received",
-        message: "Payment received",
-        customers: ["Lisa Brown", "David Chen", "Emma Davis"],
-        icon: "CreditCard",
-        color: "text-blue-600",
-      },
-      {
-        type: "task_completed",
-        message: "Repair task completed",
-        customers: ["Alex Smith", "Maria Garcia", "Tom Wilson"],
-        icon: "CheckCircle",
-        color: "text-green-600",
-      },
-      {
-        type: "parts_needed",
-        message: "Parts required",
-        customers: ["Jane Doe", "Bob Johnson", "Carol White"],
-        icon: "AlertTriangle",
-        color: "text-orange-600",
-      },
-    ]
-
-    return {
-      kpiData: {
-        totalActiveTasks: Math.floor(Math.random() * 10) + 45,
-        revenueThisMonth: Math.floor(Math.random() * 2000) + 12000,
-        tasksReadyForPickup: Math.floor(Math.random() * 5) + 6,
-        averageRepairTime: `${(Math.random() * 2 + 2.5).toFixed(1)} days`,
-      },
-      taskStatuses: [
-        { name: "In Progress", value: Math.floor(Math.random() * 5) + 20, color: "#dc2626" },
-        { name: "Ready for Pickup", value: Math.floor(Math.random() * 3) + 7, color: "#f97316" },
-        { name: "Awaiting Parts", value: Math.floor(Math.random() * 4) + 10, color: "#eab308" },
-        { name: "Completed", value: Math.floor(Math.random() * 3) + 3, color: "#22c55e" },
-      ],
-      technicianWorkload: [
-        { name: "John Smith", tasks: Math.floor(Math.random() * 4) + 6 },
-        { name: "Sarah Johnson", tasks: Math.floor(Math.random() * 4) + 10 },
-        { name: "Mike Chen", tasks: Math.floor(Math.random() * 3) + 5 },
-        { name: "Lisa Brown", tasks: Math.floor(Math.random() * 4) + 7 },
-        { name: "David Wilson", tasks: Math.floor(Math.random() * 3) + 6 },
-      ],
-      recentActivities: [
-        {
-          id: this.activityCounter++,
-          type: activities[Math.floor(Math.random() * activities.length)].type,
-          message: activities[Math.floor(Math.random() * activities.length)].message,
-          customer: activities[Math.floor(Math.random() * activities.length)].customers[Math.floor(Math.random() * 3)],
-          time: "Just now",
-          icon: activities[Math.floor(Math.random() * activities.length)].icon,
-          color: activities[Math.floor(Math.random() * activities.length)].color,
-        },
-      ],
-      lastUpdated: new Date(),
-    }
-  }
+// Calls `listener` for every pushed event while the component is mounted.
+export function useServerEvents(listener: EventListener) {
+  const { subscribe } = useWebSocket()
+  const listenerRef = useRef(listener)
+  listenerRef.current = listener
+
+  useEffect(() => subscribe((event) => listenerRef.current(event)), [subscribe])
+}
 
-  connect(callback: (data: WebSocketData) => void) {
-    this.callbacks.push(callback)
+const MAX_RECENT_ACTIVITIES = 5
+const MAX_RECONNECT_DELAY = 30000
 
-    // Send initial data
-    callback(this.generateRandomData())
+const activityIcons: Record<string, { icon: string; color: string }> = {
+  intake: { icon: "Plus", color: "text-green-600" },
+  ready: { icon: "CheckCircle", color: "text-green-600" },
+  picked_up: { icon: "CheckCircle", color: "text-green-600" },
+  rejected: { icon: "AlertTriangle", color: "text-orange-600" },
+  returned: { icon: "AlertTriangle", color: "text-orange-600" },
+}
+
+const getSocketUrl = (token: string) => {
+  const url = new URL(API_CONFIG.BASE_URL)
+  url.protocol = url.protocol === "https:" ? "wss:" : "ws:"
+  url.pathname = "/ws/events/"
+  url.search = `token=${encodeURIComponent(token)}`
+  return url.toString()
+}
 
-    // Start sending updates every 5 seconds
-    this.interval = setInterval(() => {
-      const data = this.generateRandomData()
-      this.callbacks.forEach((cb) => cb(data))
-    }, 5000)
+const getAccessToken = (): string | null => {
+  const authTokens = localStorage.getItem("auth_tokens")
+  if (!authTokens) return null
+  try {
+    return JSON.parse(authTokens).access || null
+  } catch {
+    return null
   }
+}
 
-  disconnect(callback: (data: WebSocketData) => void) {
-    this.callbacks = this.callbacks.filter((cb) => cb !== callback)
-    if (this.callbacks.length === 0 && this.interval) {
-      clearInterval(this.interval)
-      this.interval = null
-    }
+// Queries to refresh for each kind of event; only active queries re-fetch.
+const invalidatedQueries = (event: ServerEvent): unknown[][] => {
+  const taskQuery = event.task ? [["task", event.task]] : []
+  if (event.type.startsWith("task.")) {
+    return [...taskQuery, ["tasks"], ["inProgressTasks"], ["inWorkshopTasks"], ["completedTasks"]]
+  }
+  if (event.type.startsWith("payment.")) {
+    return [...taskQuery, ["payments"], ["accounts"]]
   }
+  return taskQuery
 }
 
-const mockServer = new MockWebSocketServer()
+const toActivity = (event: ServerEvent): Activity | null => {
+  if (event.type !== "activity.created" || !event.activity) return null
+  const style = activityIcons[event.activity.type] || { icon: "Clock", color: "text-blue-600" }
+  return {
+    id: event.activity.id,
+    type: event.activity.type,
+    message: event.activity.message,
+    task: event.task || "",
+    time: "Just now",
+    ...style,
+  }
+}
 
 export function WebSocketProvider({ children }: { children: React.ReactNode }) {
+  const { user } = useAuth()
+  const queryClient = useQueryClient()
+  const { addNotification } = useNotifications()
   const [data, setData] = useState<WebSocketData | null>(null)
   const [isConnected, setIsConnected] = useState(false)
   const [isConnecting, setIsConnecting] = useState(false)
   const [error, setError] = useState<string | null>(null)
+  const socketRef = useRef<WebSocket | null>(null)
+  const listenersRef = useRef(new Set<EventListener>())
+  const retryRef = useRef<{ attempts: number; timer: ReturnType<typeof setTimeout> | null }>({ attempts: 0, timer: null })
+
+  const subscribe = useCallback((listener: EventListener) => {
+    listenersRef.current.add(listener)
+    return () => {
+      listenersRef.current.delete(listener)
+    }
+  }, [])
+
+  const handleEvent = useCallback((event: ServerEvent) => {
+    const activity = toActivity(event)
+    setData((prevData) => {
+      const recentActivities = prevData?.recentActivities || []
+      return {
+        ...prevData,
+        recentActivities: activity
+          ? [activity, ...recentActivities.filter((a) => a.id !== activity.id)].slice(0, MAX_RECENT_ACTIVITIES)
+          : recentActivities,
+        lastUpdated: new Date(),
+      }
+    })
+    if (activity && event.activity?.user !== user?.id) {
+      addNotification({
+        title: `Task ${activity.task}`,
+        message: activity.message,
+        type: "info",
+        priority: "low",
+        taskId: activity.task,
+        actionUrl: `/dashboard/tasks/${activity.task}`,
+      })
+    }
+    invalidatedQueries(event).forEach((queryKey) => queryClient.invalidateQueries({ queryKey }))
+    listenersRef.current.forEach((listener) => listener(event))
+  }, [queryClient, addNotification, user])
+  // The socket reads the latest handler, so re-renders do not reconnect it.
+  const handleEventRef = useRef(handleEvent)
+  handleEventRef.current = handleEvent
+
+  const disconnect = useCallback(() => {
+    if (retryRef.current.timer) {
+      clearTimeout(retryRef.current.timer)
+      retryRef.current.timer = null
+    }
+    const socket = socketRef.current
+    socketRef.current = null
+    if (socket) {
+      socket.onclose = null
+      socket.close()
+    }
+    setIsConnected(false)
+  }, [])
 
   const connect = useCallback(() => {
+    const token = getAccessToken()
+    if (!token) return
+
     setIsConnecting(true)
     setError(null)
+    const socket = new WebSocket(getSocketUrl(token))
+    socketRef.current = socket
 
-    try {
-      // Simulate connection delay
-      setTimeout(() => {
-        mockServer.connect((newData) => {
-          setData((prevData) => {
-            if (prevData) {
-              // Merge new activities with existing ones, keeping only the latest 5
-              const allActivities = [...newData.recentActivities, ...prevData.recentActivities]
-              const uniqueActivities = allActivities
-                .filter((activity, index, self) => index === self.findIndex((a) => a.id === activity.id))
-                .slice(0, 5)
-
-              return {
-                ...newData,
-                recentActivities: uniqueActivities,
-              }
-            }
-            return newData
-          })
-        })
-        setIsConnected(true)
-        setIsConnecting(false)
-      }, 1000)
-    } catch (err) {
-      setError("Failed to connect to WebSocket")
+    socket.onopen = () => {
+      retryRef.current.attempts = 0
+      setIsConnected(true)
       setIsConnecting(false)
+      setData((prevData) => prevData || { recentActivities: [], lastUpdated: new Date() })
     }
-  }, [])
-
-  const disconnect = useCallback(() => {
-    if (data) {
-      mockServer.disconnect(() => {})
+    socket.onmessage = (message) => {
+      try {
+        handleEventRef.current(JSON.parse(message.data))
+      } catch {
+        // Ignore frames that are not events.
+      }
     }
-    setIsConnected(false)
-    setData(null)
-  }, [data])
+    socket.onclose = () => {
+      setIsConnected(false)
+      setIsConnecting(false)
+      if (socketRef.current !== socket) return
+      setError("Real-time updates disconnected")
+      // Back off so a server restart does not get a burst of reconnects.
+      const delay = Math.min(1000 * 2 ** retryRef.current.attempts, MAX_RECONNECT_DELAY)
+      retryRef.current.attempts += 1
+      retryRef.current.timer = setTimeout(connect, delay)
+    }
+  }, [])
 
   const reconnect = useCallback(() => {
     disconnect()
-    setTimeout(connect, 1000)
+    retryRef.current.attempts = 0
+    connect()
   }, [connect, disconnect])
 
+  // (Re)connect whenever someone signs in, with their token.
   useEffect(() => {
+    if (!user) return
     connect()
     return () => disconnect()
-  }, [connect, disconnect])
+  }, [user, connect, disconnect])
 
   return (
     <WebSocketContext.Provider
@@ -219,6 +248,7 @@ export function WebSocketProvider({ children }: { children: React.ReactNode }) {
         isConnecting,
         error,
         reconnect,
+        subscribe,
       }}
     >
       {children}